@@ -0,0 +1,118 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import logs
+
+
+class ConnectionStats:
+    """Contadores thread-safe de reutilização de conexões e tempo de handshake."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.requests = 0
+        self.new_connections = 0
+        self.handshake_times = []
+
+    def record_handshake(self, seconds):
+        with self._lock:
+            self.new_connections += 1
+            self.handshake_times.append(seconds)
+        # Permite ao adapter saber se a requisição corrente abriu conexão nova
+        self._local.last_handshake = seconds
+
+    def begin_request(self):
+        self._local.last_handshake = None
+
+    def end_request(self):
+        with self._lock:
+            self.requests += 1
+        return getattr(self._local, "last_handshake", None)
+
+    def snapshot(self):
+        with self._lock:
+            times = list(self.handshake_times)
+            requests_count = self.requests
+            new_connections = self.new_connections
+        return {
+            "requests": requests_count,
+            "new_connections": new_connections,
+            "reused_connections": max(0, requests_count - new_connections),
+            "handshake_total_ms": round(sum(times) * 1000, 1),
+            "handshake_avg_ms": round(sum(times) / len(times) * 1000, 1) if times else 0.0,
+            "handshake_max_ms": round(max(times) * 1000, 1) if times else 0.0,
+        }
+
+
+def _make_pool_classes(stats):
+    """Cria classes de pool/conexão que medem o tempo de connect (TCP + TLS)."""
+
+    class TimedHTTPConnection(HTTPConnection):
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            stats.record_handshake(time.perf_counter() - start)
+
+    class TimedHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            stats.record_handshake(time.perf_counter() - start)
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    return {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    """HTTPAdapter com pool keep-alive que registra reutilização de conexões."""
+
+    def __init__(self, stats, pool_size, **kwargs):
+        self.stats = stats
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = _make_pool_classes(self.stats)
+
+    def send(self, request, **kwargs):
+        self.stats.begin_request()
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            handshake = self.stats.end_request()
+            if handshake is not None:
+                logs.debug(f"Nova conexão HTTP para {request.url} (handshake {handshake * 1000:.0f} ms)")
+            else:
+                logs.debug(f"Conexão HTTP reutilizada para {request.url}")
+
+
+def create_session(api_key, pool_size=10):
+    """
+    Cria uma requests.Session com keep-alive e pool dimensionado para a
+    concorrência usada, já com os headers do OpenRouter.
+
+    Returns:
+        (session, stats) onde stats é o ConnectionStats associado.
+    """
+    stats = ConnectionStats()
+    session = requests.Session()
+    session.headers.update({
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://github.com/PLC_Ai_Code",  # OpenRouter pode exigir este header
+        "X-Title": "PLC Benchmark"  # Identificação opcional
+    })
+    adapter = InstrumentedAdapter(stats, pool_size=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session, stats
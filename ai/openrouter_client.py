@@ -2,18 +2,42 @@ import requests
 import yaml
 import json
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from dotenv import load_dotenv
 
+from ai.http_session import create_session
+from ai.rate_limit import RateLimiter, RateLimitError
+from ai.response_cache import ResponseCache
+from ai.result_sink import ResultSink
+from ai.streaming import ST_FENCE_TAGS, FenceExtractor, iter_sse_data
+import logs
+import tracing
+
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
 
+# Linguagens de bloco ST aceitas (as mesmas do streaming), as mais longas primeiro
+_ST_TAG_PATTERN = "|".join(re.escape(tag) for tag in sorted(ST_FENCE_TAGS, key=len, reverse=True) if tag)
+
+
+class GenerationError(RuntimeError):
+    """Geração de um modelo que não produziu código (a mensagem é o motivo gravado no manifesto)."""
+
+
 class OpenRouterClient:
-    def __init__(self, config_path="config/models.yaml"):
+    def __init__(self, config_path="config/models.yaml", pool_size=None, cache_dir=None, refresh_cache=False,
+                 stream=None):
         with open(config_path, "r", encoding='utf-8') as f:
             cfg = yaml.safe_load(f)
 
         self.models = cfg["models"]
+
+        # Número máximo de requisições simultâneas por tarefa (None = todos os modelos)
+        self.concurrency = cfg.get("concurrency")
         
         # Prioriza variável de ambiente, depois arquivo de configuração
         self.api_key = os.getenv("OPENROUTER_API_KEY") or cfg.get("openrouter_api_key")
@@ -25,33 +49,186 @@ class OpenRouterClient:
             )
         
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.models_url = "https://openrouter.ai/api/v1/models"
 
-    def call_model(self, model_name, prompt, max_retries=3):
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://github.com/PLC_Ai_Code",  # OpenRouter pode exigir este header
-            "X-Title": "PLC Benchmark"  # Identificação opcional
-        }
+        # Sessão HTTP persistente (keep-alive) compartilhada por todas as chamadas.
+        # O pool é dimensionado para a concorrência máxima usada na execução.
+        pool_size = pool_size or max(self.concurrency or 0, len(self.models), 1)
+        self.session, self.connection_stats = create_session(self.api_key, pool_size)
+
+        # Streaming SSE: encerra a resposta assim que o bloco de código ST fecha
+        self.stream = cfg.get("stream", False) if stream is None else stream
+        self.stream_metrics = {}
+        self._metrics_lock = threading.Lock()
+
+        # Limitador de requisições por chave e por modelo (modelos :free têm limites baixos)
+        rate_cfg = cfg.get("rate_limits") or {}
+        self.max_rate_limit_retries = rate_cfg.get("max_rate_limit_retries", 6)
+        self.rate_limiter = None
+        if rate_cfg.get("enabled", True):
+            self.rate_limiter = RateLimiter(
+                key_requests_per_minute=rate_cfg.get("key_requests_per_minute", 20),
+                model_requests_per_minute=rate_cfg.get("model_requests_per_minute", 20),
+                burst=rate_cfg.get("burst", 5),
+                model_overrides={
+                    m["name"]: m["requests_per_minute"] for m in self.models if "requests_per_minute" in m
+                }
+            )
+
+        # Cache de respostas em disco (desativado se cache_dir for None)
+        self.temperature = 0.0
+        self.cache = None
+        if cache_dir:
+            cache_cfg = cfg.get("cache") or {}
+            self.cache = ResponseCache(
+                cache_dir,
+                max_size_mb=cache_cfg.get("max_size_mb", 100),
+                ttl_days=cache_cfg.get("ttl_days", 30),
+                refresh=refresh_cache
+            )
+
+        # Gravação dos códigos gerados (o benchmark troca por um com pacote/resume)
+        self.result_sink = ResultSink(verify=logs.verify_writes())
+
+    def cache_stats(self):
+        """Contadores do cache de respostas (para o summary.json)."""
+        if not self.cache:
+            return {"enabled": False, "hits": 0, "misses": 0}
+        return self.cache.stats()
+
+    def rate_limit_stats(self):
+        """Contadores do limitador de requisições (para o summary.json)."""
+        if not self.rate_limiter:
+            return {"enabled": False}
+        return dict(self.rate_limiter.stats(), enabled=True)
+
+    def _model_config(self, model_name):
+        for model in self.models:
+            if model["name"] == model_name:
+                return model
+        return {}
+
+    def log_connection_stats(self):
+        """Imprime contadores de reutilização de conexões HTTP e tempo de handshake."""
+        stats = self.connection_stats.snapshot()
+        logs.info(
+            f"Conexões HTTP: {stats['requests']} requisições, "
+            f"{stats['new_connections']} novas, {stats['reused_connections']} reutilizadas, "
+            f"handshake médio {stats['handshake_avg_ms']} ms (máx {stats['handshake_max_ms']} ms)"
+        )
+        return stats
+
+    def call_model(self, model_name, prompt, max_retries=3, max_tokens=None):
+        """
+        Gera o código ST de um modelo para o prompt dado.
+
+        Consulta primeiro o cache de respostas: um acerto dispensa a rede.
+        """
+        cache_key = None
+        if self.cache:
+            cache_key = ResponseCache.make_key(model_name, prompt, self.temperature, max_tokens)
+            content = self.cache.get(cache_key)
+            if content is not None:
+                logs.debug(f"Resposta de {model_name} obtida do cache")
+                with tracing.span("code_extraction", model=model_name, cached=True):
+                    return self.extract_code(content)
 
+        content = self._request_completion(model_name, prompt, max_retries, max_tokens)
+
+        if self.cache and content:
+            self.cache.put(
+                cache_key, content,
+                model=model_name, temperature=self.temperature, max_tokens=max_tokens
+            )
+
+        with tracing.span("code_extraction", model=model_name):
+            return self.extract_code(content)
+
+    @staticmethod
+    def extract_code(content):
+        """Extrai o primeiro bloco de código markdown da resposta, se houver."""
+        if not content:
+            return content
+
+        # Muitas IAs retornam código dentro de ```st ou ```structuredtext; as
+        # linguagens aceitas são as mesmas do streaming (ST_FENCE_TAGS), para a
+        # linha da cerca nunca virar a primeira linha do .st
+        code_patterns = [
+            r'```(?:' + _ST_TAG_PATTERN + r')\s*\n(.*?)```',
+            r'```\s*\n(.*?)```',  # Qualquer bloco de código
+            r'```(.*?)```',  # Bloco sem quebra de linha
+        ]
+        
+        for pattern in code_patterns:
+            matches = re.findall(pattern, content, re.DOTALL | re.IGNORECASE)
+            if matches:
+                # Pega o primeiro match e remove espaços em branco
+                extracted = matches[0].strip()
+                if extracted:
+                    logs.debug(f"Código extraído de bloco markdown ({len(extracted)} caracteres)")
+                    return extracted
+        
+        # Se não encontrou blocos markdown, retorna o conteúdo original
+        return content
+
+    def _request_completion(self, model_name, prompt, max_retries=3, max_tokens=None):
+        """Chama a API do OpenRouter e retorna o conteúdo bruto da resposta."""
         body = {
             "model": model_name,
             "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.0
+            "temperature": self.temperature
         }
+        if max_tokens:
+            body["max_tokens"] = max_tokens
+        if self.stream:
+            body["stream"] = True
+
+        attempt = 0
+        rate_limited = 0
+        while True:
+            # Respeita os limites da chave e do modelo antes de cada tentativa
+            if self.rate_limiter:
+                waited = self.rate_limiter.acquire(model_name)
+                if waited > 0.5:
+                    logs.debug(f"{model_name} aguardou {waited:.1f}s pelo limitador de requisições")
 
-        for attempt in range(max_retries):
             try:
-                r = requests.post(self.base_url, json=body, headers=headers, timeout=60)
+                started = time.perf_counter()
+                r = self.session.post(self.base_url, json=body, timeout=60, stream=self.stream)
+                # Sem streaming o corpo já foi baixado; com streaming o span vai até os cabeçalhos
+                tracing.record("http_request", started, time.perf_counter(),
+                               model=model_name, status=r.status_code, attempt=attempt + rate_limited + 1)
                 
                 # Tenta obter detalhes do erro antes de fazer raise_for_status
+                error_metadata = None
                 if r.status_code != 200:
                     try:
                         error_data = r.json()
                         error_msg = error_data.get("error", {}).get("message", r.text)
+                        error_metadata = error_data.get("error", {}).get("metadata")
                     except:
                         error_msg = r.text
-                    
+
+                if self.rate_limiter:
+                    delay = self.rate_limiter.on_response(model_name, r.status_code, r.headers, error_metadata)
+                else:
+                    delay = None
+
+                if r.status_code == 429:
+                    # Limite de requisições: aguarda e tenta de novo sem consumir as tentativas normais
+                    rate_limited += 1
+                    if rate_limited > self.max_rate_limit_retries:
+                        raise RateLimitError(
+                            f"Limite de requisições excedido para {model_name} "
+                            f"após {rate_limited} respostas 429: {error_msg}"
+                        )
+                    if delay is None:
+                        delay = min(60, 2 ** rate_limited)
+                        time.sleep(delay)
+                    logs.warning(f"{model_name} recebeu 429, nova tentativa em {delay:.1f}s")
+                    continue
+
+                if r.status_code != 200:
                     if r.status_code == 404:
                         raise ValueError(
                             f"Modelo '{model_name}' não encontrado (404). "
@@ -70,132 +247,197 @@ class OpenRouterClient:
                         )
                 
                 r.raise_for_status()
+
+                if self.stream:
+                    with tracing.span("http_stream", model=model_name):
+                        return self._read_stream(r, model_name, started)
+
                 response_data = r.json()
                 
                 if "choices" not in response_data or len(response_data["choices"]) == 0:
                     raise ValueError("Resposta da API não contém choices válidas")
                 
-                content = response_data["choices"][0]["message"]["content"]
-                
-                # Tenta extrair código de blocos markdown se presente
-                # Muitas IAs retornam código dentro de ```st ou ```structuredtext
-                import re
-                code_patterns = [
-                    r'```(?:st|structuredtext|structured_text|plc|openplc)\s*\n(.*?)```',
-                    r'```\s*\n(.*?)```',  # Qualquer bloco de código
-                    r'```(.*?)```',  # Bloco sem quebra de linha
-                ]
-                
-                for pattern in code_patterns:
-                    matches = re.findall(pattern, content, re.DOTALL | re.IGNORECASE)
-                    if matches:
-                        # Pega o primeiro match e remove espaços em branco
-                        extracted = matches[0].strip()
-                        if extracted:
-                            print(f"[DEBUG] Código extraído de bloco markdown ({len(extracted)} caracteres)")
-                            return extracted
-                
-                # Se não encontrou blocos markdown, retorna o conteúdo original
-                return content
+                return response_data["choices"][0]["message"]["content"]
                 
             except (ValueError, RuntimeError) as e:
                 # Erros de validação ou HTTP não devem ser retentados
                 raise
             except requests.exceptions.RequestException as e:
-                if attempt == max_retries - 1:
+                attempt += 1
+                if attempt >= max_retries:
                     raise RuntimeError(f"Erro ao chamar modelo {model_name} após {max_retries} tentativas: {e}") from e
-                print(f"[WARN] Tentativa {attempt + 1} falhou, tentando novamente...")
-                import time
-                time.sleep(2 ** attempt)  # Backoff exponencial
-
-    def run_all_models(self, task_prompt, save_dir):
-        Path(save_dir).mkdir(parents=True, exist_ok=True)
+                logs.warning(f"Tentativa {attempt} falhou, tentando novamente...")
+                time.sleep(2 ** (attempt - 1))  # Backoff exponencial
 
-        outputs = {}
+    def _read_stream(self, r, model_name, started):
+        """
+        Consome uma resposta SSE acumulando o conteúdo.
 
-        for model in self.models:
-            name = model["name"]
-            print(f"[INFO] Rodando modelo: {name}")
+        Assim que o primeiro bloco de código ST é fechado o stream é encerrado,
+        economizando tokens e latência de modelos que continuam explicando o código.
+        Registra time-to-first-token e time-to-code do modelo.
+        """
+        r.encoding = "utf-8"
+        extractor = FenceExtractor()
+        parts = []
+        first_token_at = None
+        code_at = None
 
-            try:
-                result = self.call_model(name, task_prompt)
-                
-                # Debug: mostra tamanho da resposta
-                print(f"[DEBUG] Resposta recebida: {len(result) if result else 0} caracteres")
-                
-                # Validação do resultado
-                if not result:
-                    print(f"[AVISO] Modelo {name} retornou resposta vazia (None ou string vazia)")
+        try:
+            for event in iter_sse_data(r):
+                if "error" in event:
+                    raise RuntimeError(f"Erro no stream de {model_name}: {event['error'].get('message', event['error'])}")
+                choices = event.get("choices") or []
+                if not choices:
                     continue
-                
-                if not isinstance(result, str):
-                    print(f"[AVISO] Modelo {name} retornou tipo inválido: {type(result)}, convertendo para string")
-                    result = str(result)
-                
-                # Remove espaços em branco no início/fim
-                result_original = result
-                result = result.strip()
-                
-                if not result:
-                    print(f"[AVISO] Modelo {name} retornou apenas espaços em branco")
-                    print(f"[DEBUG] Conteúdo original (primeiros 100 chars): {repr(result_original[:100])}")
+                delta = choices[0].get("delta", {}).get("content")
+                if not delta:
                     continue
-                
-                outputs[name] = result
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(delta)
+                if extractor.feed(delta):
+                    code_at = time.perf_counter()
+                    break
+        finally:
+            r.close()
 
-                # Sanitiza o nome do arquivo removendo caracteres inválidos para Windows
-                safe_name = name.replace('/', '_').replace(':', '_').replace('\\', '_')
-                out_path = Path(save_dir) / f"{safe_name}.st"
-                out_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Debug: mostra caminho do arquivo
-                print(f"[DEBUG] Salvando em: {out_path}")
-                
-                try:
-                    # Debug: mostra o que será escrito (primeiros 200 caracteres)
-                    print(f"[DEBUG] Conteúdo a ser salvo (primeiros 200 chars): {repr(result[:200])}")
-                    
-                    with open(out_path, "w", encoding='utf-8') as f:
-                        chars_written = f.write(result)
-                        f.flush()  # Força escrita imediata
-                        os.fsync(f.fileno())  # Garante que foi escrito no disco
-                    
-                    print(f"[DEBUG] {chars_written} caracteres escritos no arquivo")
-                    
-                except Exception as write_error:
-                    print(f"[ERRO] Falha ao escrever arquivo: {write_error}")
-                    import traceback
-                    traceback.print_exc()
-                    raise
-                
-                # Verifica se o arquivo foi escrito corretamente
-                if not out_path.exists():
-                    print(f"[ERRO] Arquivo não foi criado: {out_path}")
-                    continue
-                
-                file_size = out_path.stat().st_size
-                if file_size > 0:
-                    # Lê o arquivo para verificar o conteúdo
-                    saved_content = out_path.read_text(encoding='utf-8')
-                    print(f"[DEBUG] Arquivo salvo com sucesso. Tamanho: {file_size} bytes, Conteúdo (primeiros 200 chars): {repr(saved_content[:200])}")
-                    print(f"[OK] Modelo {name} concluído ({file_size} bytes salvos em {out_path.name})")
-                else:
-                    print(f"[ERRO] Arquivo criado mas está vazio: {out_path}")
-                    print(f"[DEBUG] Caminho absoluto: {out_path.absolute()}")
-                    print(f"[DEBUG] Conteúdo original tinha {len(result)} caracteres")
-                    # Tenta ler o arquivo mesmo vazio
-                    try:
-                        content = out_path.read_text(encoding='utf-8')
-                        print(f"[DEBUG] Conteúdo lido do arquivo: {repr(content[:200])}")
-                    except Exception as e:
-                        print(f"[DEBUG] Erro ao ler arquivo: {e}")
-                    
-            except Exception as e:
-                print(f"[ERRO] Falha ao processar modelo {name}: {e}")
-                import traceback
-                print(f"[DEBUG] Traceback completo:")
-                traceback.print_exc()
-                # Continua com os outros modelos mesmo se um falhar
-                continue
-
-        return outputs
\ No newline at end of file
+        finished = time.perf_counter()
+        content = "".join(parts)
+        if extractor.complete:
+            # Descarta o que veio depois da cerca de fechamento
+            content = content[:extractor.end]
+
+        metrics = {
+            "ttft_s": round(first_token_at - started, 3) if first_token_at else None,
+            "time_to_code_s": round(code_at - started, 3) if code_at else None,
+            "total_s": round(finished - started, 3),
+            "closed_early": extractor.complete,
+            "chars": len(content),
+        }
+        with self._metrics_lock:
+            self.stream_metrics.setdefault(model_name, []).append(metrics)
+        logs.debug(
+            f"Stream de {model_name}: TTFT {metrics['ttft_s']}s, "
+            f"código em {metrics['time_to_code_s']}s, total {metrics['total_s']}s"
+        )
+
+        if not content:
+            raise ValueError("Stream da API terminou sem conteúdo")
+        return content
+
+    def stream_stats(self):
+        """Médias de time-to-first-token e time-to-code por modelo (para o summary.json)."""
+        with self._metrics_lock:
+            metrics = {name: list(items) for name, items in self.stream_metrics.items()}
+
+        def avg(values):
+            values = [v for v in values if v is not None]
+            return round(sum(values) / len(values), 3) if values else None
+
+        return {
+            name: {
+                "requests": len(items),
+                "avg_ttft_s": avg(m["ttft_s"] for m in items),
+                "avg_time_to_code_s": avg(m["time_to_code_s"] for m in items),
+                "avg_total_s": avg(m["total_s"] for m in items),
+                "closed_early": sum(1 for m in items if m["closed_early"]),
+            }
+            for name, items in metrics.items()
+        }
+
+    @staticmethod
+    def output_path(save_dir, model_name):
+        """Caminho do arquivo .st de um modelo dentro de save_dir."""
+        # Sanitiza o nome do arquivo removendo caracteres inválidos para Windows
+        safe_name = model_name.replace('/', '_').replace(':', '_').replace('\\', '_')
+        return Path(save_dir) / f"{safe_name}.st"
+
+    def run_all_models(self, task_prompt, save_dir, max_workers=None):
+        """
+        Envia o prompt da tarefa para todos os modelos configurados.
+
+        As requisições são disparadas em paralelo por um pool de threads limitado
+        por max_workers (ou pela chave 'concurrency' do models.yaml). Com
+        max_workers=1 o comportamento é o sequencial original. Cada modelo
+        continua gerando um arquivo .st próprio em save_dir (via result_sink).
+        """
+        names = [model["name"] for model in self.models]
+        workers = max_workers or self.concurrency or len(names)
+        workers = max(1, min(workers, len(names))) if names else 1
+
+        results = {}
+        if workers == 1:
+            for name in names:
+                results[name] = self.run_model(name, task_prompt, save_dir)
+        else:
+            logs.info(f"Enviando {len(names)} requisições em paralelo (concorrência: {workers})")
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(self.run_model, name, task_prompt, save_dir): name
+                    for name in names
+                }
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+
+        # Mantém a ordem do models.yaml no dicionário retornado
+        return {name: results[name] for name in names if results.get(name)}
+
+    def run_model(self, name, task_prompt, save_dir, raise_errors=False):
+        """
+        Gera e salva a resposta de um único modelo.
+
+        Retorna None em caso de falha ou, com raise_errors=True, levanta
+        GenerationError com o motivo (usado pelo escalonador para o manifesto).
+        """
+        logs.info(f"Rodando modelo: {name}")
+
+        try:
+            result = self.call_model(name, task_prompt, max_tokens=self._model_config(name).get("max_tokens"))
+            logs.debug("Resposta recebida: %d caracteres", len(result) if result else 0)
+            
+            # Validação do resultado
+            if not result:
+                raise GenerationError("resposta vazia (None ou string vazia)")
+            
+            if not isinstance(result, str):
+                logs.warning(f"Modelo {name} retornou tipo inválido: {type(result)}, convertendo para string")
+                result = str(result)
+            
+            # Remove espaços em branco no início/fim
+            result_original = result
+            result = result.strip()
+            
+            if not result:
+                logs.debug("Conteúdo original (primeiros 100 chars): %r", result_original[:100])
+                raise GenerationError("resposta com apenas espaços em branco")
+            
+            out_path = self.output_path(save_dir, name)
+            logs.debug("Salvando em: %s", out_path)
+
+            # Escrita atômica; o fsync fica para o sync() do fim da execução
+            # (ou é feito na hora, com releitura, em --verify-writes)
+            try:
+                with tracing.span("file_write", model=name):
+                    chars_written = self.result_sink.write(out_path, result)
+            except Exception as write_error:
+                logs.error(f"Falha ao escrever arquivo: {write_error}", exc_info=True)
+                raise
+
+            logs.ok(f"Modelo {name} concluído ({chars_written} caracteres salvos em {out_path.name})")
+
+        except GenerationError as e:
+            logs.warning(f"Modelo {name} retornou {e}")
+            if raise_errors:
+                raise
+            return None
+
+        except Exception as e:
+            logs.error(f"Falha ao processar modelo {name}: {e}")
+            logs.debug("Traceback completo:", exc_info=True)
+            if raise_errors:
+                raise GenerationError(f"{type(e).__name__}: {e}") from e
+            # Continua com os outros modelos mesmo se um falhar
+            return None
+
+        return result
@@ -0,0 +1,216 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+class RateLimitError(RuntimeError):
+    """Limite de requisições excedido mesmo após as novas tentativas."""
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe com pausa explícita e ajuste adaptativo da taxa.
+
+    A taxa nominal vem da configuração; após um 429 ela é reduzida pela
+    metade (até um piso) e volta a crescer aos poucos a cada sucesso.
+    """
+
+    def __init__(self, requests_per_minute, burst=1, min_rate_fraction=0.1):
+        self.base_rate = requests_per_minute / 60.0
+        self.rate = self.base_rate
+        self.min_rate_fraction = min_rate_fraction
+        self.min_rate = self.base_rate * min_rate_fraction
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self._last:
+            self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    def wait_time(self):
+        """Segundos até um token estar disponível (0 se já estiver)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.tokens >= 1:
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Bloqueia até obter um token. Retorna o tempo total de espera."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """
+        Bloqueia o bucket por 'seconds'. Os tokens acumulados são descartados e
+        apenas uma requisição é liberada quando a pausa termina.
+        """
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 1.0
+            self._last = self.blocked_until
+
+    def penalize(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * 0.5)
+
+    def recover(self):
+        with self._lock:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+    def set_limit(self, limit, window_seconds=60.0):
+        """Ajusta a taxa nominal a partir do limite informado pelo servidor."""
+        new_base = limit / window_seconds
+        with self._lock:
+            if new_base <= 0 or abs(new_base - self.base_rate) < 1e-9:
+                return
+            # Mantém a redução adaptativa em curso, proporcional à nova taxa
+            ratio = self.rate / self.base_rate
+            self.base_rate = new_base
+            self.rate = new_base * ratio
+            self.min_rate = new_base * self.min_rate_fraction
+
+
+class RateLimiter:
+    """
+    Limitador de requisições por chave de API e por modelo.
+
+    Antes de cada requisição é preciso obter um token do bucket do modelo e
+    do bucket da chave. As respostas alimentam os buckets: um 429 pausa o
+    modelo pelo tempo de Retry-After (ou backoff exponencial) e reduz sua
+    taxa; os headers X-RateLimit-* ajustam o bucket da chave.
+    """
+
+    def __init__(self, key_requests_per_minute=20, model_requests_per_minute=20, burst=5, model_overrides=None):
+        self.key_bucket = TokenBucket(key_requests_per_minute, burst)
+        self.model_rpm = model_requests_per_minute
+        self.burst = burst
+        self.model_overrides = model_overrides or {}
+        self._model_buckets = {}
+        self._consecutive_429 = {}
+        self._lock = threading.Lock()
+        self.rate_limited_responses = 0
+        self.total_wait = 0.0
+
+    def _bucket(self, model_name):
+        with self._lock:
+            bucket = self._model_buckets.get(model_name)
+            if bucket is None:
+                rpm = self.model_overrides.get(model_name, self.model_rpm)
+                bucket = self._model_buckets[model_name] = TokenBucket(rpm, self.burst)
+            return bucket
+
+    def wait_time(self, model_name):
+        return max(self._bucket(model_name).wait_time(), self.key_bucket.wait_time())
+
+    def acquire(self, model_name):
+        # Primeiro o modelo, depois a chave: não segura um token da chave
+        # enquanto espera por um modelo pausado
+        waited = self._bucket(model_name).acquire()
+        waited += self.key_bucket.acquire()
+        with self._lock:
+            self.total_wait += waited
+        return waited
+
+    def on_response(self, model_name, status_code, headers, error_metadata=None):
+        """
+        Atualiza os buckets a partir da resposta.
+
+        Returns:
+            Tempo de pausa aplicado ao modelo em caso de 429, senão None.
+        """
+        headers = dict(headers or {})
+        # O OpenRouter às vezes repassa os headers do provedor no corpo do erro
+        if error_metadata and isinstance(error_metadata.get("headers"), dict):
+            headers = {**error_metadata["headers"], **headers}
+        headers = {k.lower(): v for k, v in headers.items()}
+
+        limit = _to_float(headers.get("x-ratelimit-limit"))
+        if limit:
+            self.key_bucket.set_limit(limit)
+
+        remaining = _to_float(headers.get("x-ratelimit-remaining"))
+        reset_delay = _reset_delay(headers.get("x-ratelimit-reset"))
+        if remaining is not None and remaining <= 0 and reset_delay:
+            self.key_bucket.pause(reset_delay)
+
+        bucket = self._bucket(model_name)
+        if status_code != 429:
+            with self._lock:
+                self._consecutive_429[model_name] = 0
+            bucket.recover()
+            return None
+
+        with self._lock:
+            self.rate_limited_responses += 1
+            count = self._consecutive_429.get(model_name, 0) + 1
+            self._consecutive_429[model_name] = count
+
+        delay = _retry_after(headers.get("retry-after")) or reset_delay or min(60.0, 2.0 ** count)
+        bucket.penalize()
+        bucket.pause(delay)
+        return delay
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate_limited_responses": self.rate_limited_responses,
+                "total_wait_s": round(self.total_wait, 2),
+                "model_rates_rpm": {
+                    name: round(bucket.rate * 60, 2) for name, bucket in self._model_buckets.items()
+                },
+            }
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(value):
+    """Retry-After em segundos ou como data HTTP."""
+    if value is None:
+        return None
+    seconds = _to_float(value)
+    if seconds is not None:
+        return max(0.0, seconds)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _reset_delay(value):
+    """X-RateLimit-Reset: timestamp epoch (s ou ms) ou segundos restantes."""
+    reset = _to_float(value)
+    if reset is None:
+        return None
+    now = time.time()
+    if reset > 1e12:  # epoch em milissegundos (formato do OpenRouter)
+        return max(0.0, reset / 1000.0 - now)
+    if reset > 1e9:  # epoch em segundos
+        return max(0.0, reset - now)
+    return max(0.0, reset)
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class ResponseCache:
+    """
+    Cache em disco das respostas dos modelos, endereçado por conteúdo.
+
+    A chave é o SHA-256 de (modelo, prompt, temperature, max_tokens). Cada
+    entrada é um arquivo JSON em <cache_dir>/<2 primeiros hex>/<hash>.json.
+    A remoção combina TTL (entradas expiradas são ignoradas e apagadas) com
+    limite de tamanho total, descartando primeiro as entradas usadas há mais
+    tempo (LRU pelo mtime, atualizado a cada acerto).
+    """
+
+    def __init__(self, cache_dir, max_size_mb=100, ttl_days=30, refresh=False):
+        """
+        Args:
+            cache_dir: Diretório raiz do cache.
+            max_size_mb: Tamanho máximo do cache em MB (None = sem limite).
+            ttl_days: Validade das entradas em dias (None = não expiram).
+            refresh: Se True, ignora entradas existentes e regrava as respostas novas.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.ttl_seconds = ttl_days * 86400 if ttl_days else None
+        self.refresh = refresh
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._total_size = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.json"))
+
+    @staticmethod
+    def make_key(model_name, prompt, temperature, max_tokens):
+        raw = json.dumps([model_name, prompt, temperature, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        """Retorna o conteúdo armazenado para a chave ou None (miss)."""
+        path = self._entry_path(key)
+        if self.refresh or not path.exists():
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            entry = None
+
+        expired = entry is not None and self.ttl_seconds and time.time() - entry.get("created_at", 0) > self.ttl_seconds
+        if entry is None or expired:
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Atualiza o mtime para a política LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return entry["content"]
+
+    def put(self, key, content, **metadata):
+        """Grava uma resposta no cache (escrita atômica) e aplica o limite de tamanho."""
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = dict(metadata, content=content, created_at=time.time())
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        old_size = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.writes += 1
+            self._total_size += len(data) - old_size
+            over_limit = self.max_size_bytes is not None and self._total_size > self.max_size_bytes
+        if over_limit:
+            self._evict()
+
+    def _remove(self, path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self._total_size -= size
+            self.evictions += 1
+
+    def _evict(self):
+        """Remove as entradas menos usadas até voltar ao limite de tamanho."""
+        entries = []
+        for p in self.cache_dir.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, p))
+        entries.sort()
+
+        for _, path in entries:
+            with self._lock:
+                if self._total_size <= self.max_size_bytes:
+                    break
+            self._remove(path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": True,
+                "refresh": self.refresh,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "size_bytes": self._total_size,
+            }
@@ -0,0 +1,259 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import logs
+
+
+class ResultSink:
+    """
+    Destino dos códigos gerados (results/raw_responses/<tarefa>/<modelo>.st).
+
+    Cada resposta é gravada em um arquivo temporário e renomeada sobre o
+    destino (os.replace), então um .st nunca fica pela metade. Os diretórios
+    são criados uma vez por execução e o fsync não é feito por resposta:
+    sync() confirma de uma vez os arquivos pendentes e seus diretórios (o
+    benchmark chama ao fim da execução). Com verify=True (--verify-writes)
+    cada arquivo é confirmado na hora e relido para conferência.
+
+    Com pack=True as respostas não viram arquivos separados: são anexadas a
+    um único pacote JSONL (<root>.pack.jsonl) com índice caminho -> (offset,
+    tamanho) em <root>.pack.idx.json. Os caminhos continuam os mesmos .st
+    (chave relativa a root), e read()/exists() os resolvem pelo índice.
+    """
+
+    def __init__(self, root=None, pack=False, resume=False, verify=False):
+        if pack and root is None:
+            raise ValueError("O pacote de respostas precisa do diretório raiz (root)")
+        self.root = Path(root) if root else None
+        self.verify = verify
+        self.pack = ResultPack(self.root, resume=resume) if pack else None
+        self._lock = threading.Lock()
+        self._dirs = set()
+        self._unsynced = {}
+        self.writes = 0
+        self.syncs = 0
+
+    def write(self, path, content):
+        """Grava o código de uma resposta. Retorna o número de caracteres gravados."""
+        path = Path(path)
+        if self.pack:
+            self.pack.append(self._key(path), content)
+            if self.verify:
+                self.pack.sync()
+                self._check(path, content)
+            with self._lock:
+                self.writes += 1
+            return len(content)
+
+        directory = path.parent
+        if directory not in self._dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                self._dirs.add(directory)
+
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            chars = f.write(content)
+            if self.verify:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.writes += 1
+            if not self.verify:
+                # fsync adiado: agrupado por diretório (tarefa) até o próximo sync()
+                self._unsynced.setdefault(directory, []).append(path)
+        if self.verify:
+            _fsync(directory)
+            self._check(path, content)
+        return chars
+
+    def _check(self, path, content):
+        saved = self.read(path)
+        logs.debug("Arquivo salvo: %s, conteúdo (primeiros 200 chars): %r", path, (saved or "")[:200])
+        if saved != content:
+            raise OSError(f"Conteúdo salvo em {path} difere do gerado")
+
+    def read(self, path):
+        """Conteúdo salvo para o caminho, ou None se não existir."""
+        path = Path(path)
+        if self.pack:
+            return self.pack.read(self._key(path))
+        try:
+            return path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def exists(self, path):
+        """True se há um código salvo e não vazio para o caminho."""
+        path = Path(path)
+        if self.pack:
+            return self.pack.contains(self._key(path))
+        return path.exists() and path.stat().st_size > 0
+
+    def sync(self):
+        """Confirma no disco (fsync) tudo o que foi gravado desde o último sync()."""
+        if self.pack:
+            self.pack.sync()
+            with self._lock:
+                self.syncs += 1
+            return
+        with self._lock:
+            pending, self._unsynced = self._unsynced, {}
+        for directory, paths in pending.items():
+            for path in paths:
+                _fsync(path)
+            _fsync(directory)
+        if pending:
+            with self._lock:
+                self.syncs += 1
+
+    def close(self):
+        self.sync()
+        if self.pack:
+            self.pack.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": "pack" if self.pack else "files",
+                "writes": self.writes,
+                "syncs": self.syncs,
+                "pack": str(self.pack.path) if self.pack else None,
+            }
+
+    def _key(self, path):
+        if self.root is None:
+            return path.as_posix()
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+
+class ResultPack:
+    """
+    Pacote JSONL de respostas, só anexado.
+
+    Cada linha é {"path", "chars", "written_at", "content"}; o índice guarda
+    (offset, tamanho) da última linha de cada caminho. O índice é regravado
+    (escrita atômica) no close() junto com o tamanho do pacote; se não bater
+    com o pacote (execução interrompida), ele é reconstruído lendo as linhas,
+    e uma última linha truncada é descartada.
+    """
+
+    def __init__(self, root, resume=False):
+        root = Path(root)
+        self.path = root.with_name(f"{root.name}.pack.jsonl")
+        self.index_path = root.with_name(f"{root.name}.pack.idx.json")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.index = {}
+
+        if resume and self.path.exists():
+            self._load()
+        else:
+            self.path.write_bytes(b"")
+            self._remove_index()
+        self._file = open(self.path, "ab")
+        self._reader = open(self.path, "rb")
+
+    def _load(self):
+        size = self.path.stat().st_size
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if index.get("pack_size") == size:
+                self.index = {key: tuple(entry) for key, entry in index["entries"].items()}
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("linha sem terminador")
+                    record = json.loads(line)
+                except ValueError:
+                    # Linha truncada por uma interrupção no meio da escrita
+                    logs.warning(f"Registro inválido no offset {offset} de {self.path.name}, descartando o restante")
+                    break
+                self.index[record["path"]] = (offset, len(line))
+                offset += len(line)
+        if offset != size:
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+
+    def append(self, key, content):
+        record = {
+            "path": key,
+            "chars": len(content),
+            "written_at": datetime.now().isoformat(),
+            "content": content,
+        }
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(line)
+            self._file.flush()
+            self.index[key] = (offset, len(line))
+
+    def read(self, key):
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            self._reader.seek(entry[0])
+            line = self._reader.read(entry[1])
+        return json.loads(line)["content"]
+
+    def contains(self, key):
+        with self._lock:
+            entry = self.index.get(key)
+        return entry is not None and entry[1] > 0
+
+    def sync(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._reader.close()
+            index = {
+                "pack_size": self.path.stat().st_size,
+                "entries": {key: list(entry) for key, entry in self.index.items()},
+            }
+        tmp = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.index_path)
+        _fsync(self.index_path.parent)
+
+    def _remove_index(self):
+        try:
+            self.index_path.unlink()
+        except OSError:
+            pass
+
+
+def _fsync(path):
+    """fsync de um arquivo ou diretório já gravado; ignorado onde não há suporte (diretórios no Windows)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
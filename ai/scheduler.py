@@ -0,0 +1,158 @@
+import heapq
+import itertools
+import threading
+import time
+from pathlib import Path
+
+import logs
+import tracing
+
+
+class GenerationScheduler:
+    """
+    Escalonador global de jobs (tarefa, modelo).
+
+    Cada par tarefa × modelo vira um job independente em uma única fila de
+    prioridade. Um conjunto de threads consome a fila respeitando o limite de
+    requisições simultâneas de cada modelo ('max_concurrency' no models.yaml),
+    de forma que um modelo lento não segura a geração das demais tarefas.
+
+    A geração em si continua sendo feita por OpenRouterClient.run_model, que
+    grava results/raw_responses/<tarefa>/<modelo>.st pelo ResultSink do cliente.
+    """
+
+    def __init__(self, client, max_workers=None, default_model_limit=1):
+        self.client = client
+        self.model_limits = {}
+        self.model_priorities = {}
+        for model in client.models:
+            name = model["name"]
+            self.model_limits[name] = max(1, int(model.get("max_concurrency", default_model_limit)))
+            self.model_priorities[name] = int(model.get("priority", 0))
+
+        self.max_workers = max_workers or client.concurrency or sum(self.model_limits.values())
+        self.max_workers = max(1, self.max_workers)
+
+        # Modelos que só aceitam nova requisição depois deste tempo (s) são pulados
+        self.paused_threshold = 1.0
+
+        self._pending = []
+        self._counter = itertools.count()
+        self._active = {}
+        self._cond = threading.Condition()
+        self._results = {}
+
+    def add_job(self, task_name, prompt, model_name, save_dir, priority=0):
+        """
+        Enfileira um job. Menor prioridade é executada primeiro; empates são
+        desfeitos pela prioridade do modelo e depois pela ordem de inserção.
+        """
+        job = {
+            "task": task_name,
+            "model": model_name,
+            "prompt": prompt,
+            "save_dir": Path(save_dir),
+        }
+        sort_key = (priority, self.model_priorities.get(model_name, 0), next(self._counter))
+        with self._cond:
+            heapq.heappush(self._pending, (sort_key, job))
+            self._cond.notify()
+
+    def add_task(self, task_name, prompt, save_dir, priority=0):
+        """Enfileira um job para cada modelo configurado."""
+        for model in self.client.models:
+            self.add_job(task_name, prompt, model["name"], save_dir, priority)
+
+    def _take_runnable_job(self):
+        """
+        Retira da fila o job de maior prioridade cujo modelo tem vaga livre e
+        não está pausado pelo limitador de requisições.
+
+        Returns:
+            (job, espera) onde job pode ser None e espera é o menor tempo até
+            algum modelo pausado voltar a aceitar requisições.
+        """
+        limiter = getattr(self.client, "rate_limiter", None)
+        skipped = []
+        job = None
+        min_wait = None
+        while self._pending:
+            entry = heapq.heappop(self._pending)
+            model = entry[1]["model"]
+            skipped.append(entry)
+            if self._active.get(model, 0) >= self.model_limits.get(model, 1):
+                continue
+            wait = limiter.wait_time(model) if limiter else 0.0
+            if wait > self.paused_threshold:
+                # Modelo em pausa (ex.: após 429): deixa a vaga para outro modelo
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+                continue
+            job = entry[1]
+            skipped.pop()
+            break
+        for entry in skipped:
+            heapq.heappush(self._pending, entry)
+        return job, min_wait
+
+    def _worker(self, on_complete):
+        while True:
+            with self._cond:
+                while True:
+                    job, wait = self._take_runnable_job()
+                    if job:
+                        self._active[job["model"]] = self._active.get(job["model"], 0) + 1
+                        break
+                    if not self._pending:
+                        return
+                    # Há jobs, mas todos os modelos estão no limite ou pausados: aguarda
+                    self._cond.wait(timeout=wait)
+
+            start = time.perf_counter()
+            result = None
+            error = None
+            try:
+                with tracing.context(task=job["task"], model=job["model"]), tracing.span("generation"):
+                    result = self.client.run_model(job["model"], job["prompt"], job["save_dir"], raise_errors=True)
+            except Exception as e:
+                error = str(e)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._cond:
+                    self._active[job["model"]] -= 1
+                    if result:
+                        self._results.setdefault(job["task"], {})[job["model"]] = result
+                    self._cond.notify_all()
+
+            if on_complete:
+                try:
+                    on_complete(job, result, elapsed, error)
+                except Exception as e:
+                    logs.error(f"Callback de conclusão falhou para {job['task']}/{job['model']}: {e}")
+
+    def run(self, on_complete=None):
+        """
+        Executa todos os jobs enfileirados e bloqueia até o fim.
+
+        Args:
+            on_complete: callback opcional chamado como on_complete(job, result, elapsed, error)
+                         assim que cada job termina (em caso de falha result é None e
+                         error traz o motivo).
+
+        Returns:
+            dict {tarefa: {modelo: código}} apenas com as gerações bem-sucedidas.
+        """
+        with self._cond:
+            total = len(self._pending)
+        workers = min(self.max_workers, total) if total else 0
+        logs.info(f"Escalonando {total} jobs (tarefa × modelo) com {workers} workers")
+
+        threads = [
+            threading.Thread(target=self._worker, args=(on_complete,), name=f"gen-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        return self._results
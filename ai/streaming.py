@@ -0,0 +1,83 @@
+import json
+
+
+# Linguagens aceitas como bloco de código ST (mesmas da extração sem streaming)
+ST_FENCE_TAGS = {"", "st", "structuredtext", "structured_text", "plc", "openplc", "iecst", "iec"}
+
+
+class FenceExtractor:
+    """
+    Detecta incrementalmente o primeiro bloco ```st (ou sem linguagem) completo.
+
+    O texto é acumulado a cada chunk recebido e a varredura continua de onde
+    parou. Blocos de outras linguagens (```python, ```json...) são pulados.
+    Quando o fechamento do bloco chega, 'complete' vira True e 'end' aponta
+    para o fim da cerca de fechamento, permitindo encerrar o stream.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.complete = False
+        self.code = None
+        self.end = None
+        self._scan_pos = 0
+        self._content_start = None
+        self._skip_block = False
+
+    def feed(self, text):
+        if self.complete or not text:
+            return self.complete
+        self.buffer += text
+
+        while not self.complete:
+            if self._content_start is None:
+                # Procurando a abertura de um bloco: precisa da linha inteira da cerca
+                start = self.buffer.find("```", self._scan_pos)
+                if start < 0:
+                    # Mantém os 2 últimos caracteres: a cerca pode estar dividida entre chunks
+                    self._scan_pos = max(0, len(self.buffer) - 2)
+                    return False
+                newline = self.buffer.find("\n", start + 3)
+                if newline < 0:
+                    self._scan_pos = start
+                    return False
+                tag = self.buffer[start + 3:newline].strip().lower()
+                self._content_start = newline + 1
+                self._skip_block = tag not in ST_FENCE_TAGS
+                self._scan_pos = self._content_start
+            else:
+                close = self.buffer.find("```", self._scan_pos)
+                if close < 0:
+                    self._scan_pos = max(self._content_start, len(self.buffer) - 2)
+                    return False
+                if self._skip_block:
+                    # Bloco de outra linguagem: continua depois dele
+                    self._content_start = None
+                    self._scan_pos = close + 3
+                    continue
+                self.code = self.buffer[self._content_start:close].strip()
+                self.end = close + 3
+                self.complete = True
+
+        return self.complete
+
+
+def iter_sse_data(response):
+    """
+    Itera sobre os payloads JSON de um stream SSE do OpenRouter.
+
+    Linhas de comentário (ex.: ': OPENROUTER PROCESSING') são ignoradas e o
+    stream termina em 'data: [DONE]'.
+    """
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or line.startswith(":"):
+            continue
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            yield json.loads(data)
+        except ValueError:
+            continue
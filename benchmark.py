@@ -5,6 +5,41 @@ from pathlib import Path
 from datetime import datetime
 
 from ai.openrouter_client import OpenRouterClient
+from ai.result_sink import ResultSink
+from ai.scheduler import GenerationScheduler
+from manifest import RunManifest
+import logs
+import tracing
+
+
+def summarize_evaluations(evaluations):
+    """Resume as avaliações automáticas por tarefa e a média de score por modelo."""
+    by_task = {}
+    scores_by_model = {}
+    expanded_by_model = {}
+    for task, models in sorted(evaluations.items()):
+        by_task[task] = {}
+        for model, evaluation in models.items():
+            by_task[task][model] = {
+                "compiles": evaluation["compiles"],
+                "executes": evaluation["executes"],
+                "score": evaluation["score"],
+            }
+            scores_by_model.setdefault(model, []).append(evaluation["score"])
+            if evaluation.get("expanded_score") is not None:
+                by_task[task][model]["expanded_score"] = evaluation["expanded_score"]
+                expanded_by_model.setdefault(model, []).append(evaluation["expanded_score"])
+
+    models = {
+        model: {
+            "evaluated": len(scores),
+            "avg_score": round(sum(scores) / len(scores), 3),
+        }
+        for model, scores in scores_by_model.items()
+    }
+    for model, scores in expanded_by_model.items():
+        models[model]["avg_expanded_score"] = round(sum(scores) / len(scores), 3)
+    return {"tasks": by_task, "models": models}
 
 
 def main():
@@ -23,78 +58,324 @@ def main():
         default="results",
         help="Diretório para salvar resultados (padrão: results)"
     )
+    parser.add_argument(
+        "--openplc-path",
+        type=str,
+        default=None,
+        help="Caminho para instalação do OpenPLC (opcional, tenta detectar automaticamente)"
+    )
+    parser.add_argument(
+        "--compiler-path",
+        type=str,
+        default=None,
+        help="Caminho direto para o compilador (iec2c/openplc), sobrescreve a detecção"
+    )
+    parser.add_argument(
+        "--runtime-path",
+        type=str,
+        default=None,
+        help="Caminho direto para o webserver.py do OpenPLC, sobrescreve a detecção"
+    )
+    parser.add_argument(
+        "--evaluate",
+        action="store_true",
+        help="Compila e executa cada código gerado no OpenPLC enquanto a geração continua"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["openplc", "sim"],
+        default="openplc",
+        help="Backend de execução do --evaluate: 'openplc' (compilador + runtime reais) ou 'sim' (interpretador ST em Python, sem OpenPLC)"
+    )
+    parser.add_argument(
+        "--sim-engine",
+        choices=["compiled", "interpreted"],
+        default="compiled",
+        help="Engine do backend 'sim': 'compiled' traduz o ST para funções Python uma vez por código; 'interpreted' percorre a árvore a cada scan (padrão: compiled)"
+    )
+    parser.add_argument(
+        "--expand-tests",
+        action="store_true",
+        help="Com --backend sim, gera testes ampliados (tabela verdade ou traços aleatórios) a partir de tasks/reference e registra o expanded_score de cada código"
+    )
+    parser.add_argument(
+        "--runtimes",
+        type=int,
+        default=0,
+        help="Com --evaluate, mantém N runtimes OpenPLC quentes, cada um com suas portas, e executa os testes em paralelo (padrão: 0 = runtime único)"
+    )
+    parser.add_argument(
+        "--async-io",
+        action="store_true",
+        help="Com --runtimes, executa os passos dos testes com o cliente Modbus assíncrono: um único event loop intercala as esperas de todos os runtimes"
+    )
+    parser.add_argument(
+        "--base-port",
+        type=int,
+        default=5020,
+        help="Primeira porta (não privilegiada) reservada para os runtimes de --runtimes (padrão: 5020)"
+    )
+    parser.add_argument(
+        "--modbus-port",
+        type=int,
+        default=502,
+        help="Porta Modbus/TCP do runtime único (padrão: 502)"
+    )
+    parser.add_argument(
+        "--web-port",
+        type=int,
+        default=8080,
+        help="Porta do webserver do runtime único (padrão: 8080)"
+    )
+    parser.add_argument(
+        "--step-mode",
+        choices=["sleep", "settle", "match"],
+        default="sleep",
+        help="Avanço entre passos dos testes: 'sleep' espera o 'wait' fixo; 'settle'/'match' leem as saídas até estabilizarem/baterem com o esperado (padrão: sleep)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Máximo de requisições simultâneas aos modelos (padrão: 'concurrency' do models.yaml ou soma dos limites por modelo)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Desativa o cache de respostas (toda geração vai à rede)"
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignora respostas em cache e regrava o cache com as novas respostas"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Usa streaming SSE e encerra cada resposta assim que o bloco de código ST fecha"
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Registra spans de tempo por fase (HTTP, extração, gravação, compilação, runtime, Modbus, passos) em results/trace.jsonl e results/trace.json (Chrome) e a tabela de latências no summary.json"
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=sorted(logs.LEVELS, key=logs.LEVELS.get),
+        default="info",
+        help="Nível mínimo das mensagens no console; 'debug' mostra os detalhes de cada resposta, gravação e compilação e liga --verify-writes (padrão: info)"
+    )
+    parser.add_argument(
+        "--verify-writes",
+        action="store_true",
+        help="Confirma cada código salvo com fsync e releitura do arquivo (desligado por padrão: só torna a gravação mais lenta)"
+    )
+    parser.add_argument(
+        "--pack",
+        action="store_true",
+        help="Grava todas as respostas da execução em um único pacote append-only (results/raw_responses.pack.jsonl, com índice) em vez de um .st por resposta"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Retoma a execução anterior pulando jobs já concluídos em results/manifest.jsonl"
+    )
     
     args = parser.parse_args()
     
     tasks_path = Path(args.tasks_dir)
     results_dir = Path(args.results_dir)
+    tracer = tracing.enable() if args.trace else None
+    # Mensagens escritas por uma thread própria: os workers não esperam o terminal
+    logs.configure(args.log_level, buffered=True, verify=args.verify_writes)
 
     if not tasks_path.exists():
-        print(f"[ERRO] Diretório de tarefas não encontrado: {tasks_path}")
+        logs.error(f"Diretório de tarefas não encontrado: {tasks_path}")
         sys.exit(1)
 
     # Validação de pré-requisitos
     try:
-        print("[INFO] Inicializando cliente OpenRouter...")
-        ai = OpenRouterClient()
-        print(f"[OK] {len(ai.models)} IAs configuradas")
+        logs.info("Inicializando cliente OpenRouter...")
+        ai = OpenRouterClient(
+            pool_size=args.concurrency,
+            cache_dir=None if args.no_cache else results_dir / "cache" / "responses",
+            refresh_cache=args.refresh,
+            stream=True if args.stream else None
+        )
+        logs.ok(f"{len(ai.models)} IAs configuradas")
     except Exception as e:
-        print(f"[ERRO] Falha ao inicializar OpenRouter: {e}")
+        logs.error(f"Falha ao inicializar OpenRouter: {e}")
         sys.exit(1)
 
     task_files = sorted(list(tasks_path.glob("task_*.json")))
     if not task_files:
-        print(f"[ERRO] Nenhuma tarefa encontrada em: {tasks_path}")
+        logs.error(f"Nenhuma tarefa encontrada em: {tasks_path}")
         sys.exit(1)
 
     # Processar apenas as primeiras 5 tarefas
     task_files = task_files[:5]
     
     if len(task_files) < 5:
-        print(f"[AVISO] Apenas {len(task_files)} tarefas encontradas (esperado: 5)")
+        logs.warning(f"Apenas {len(task_files)} tarefas encontradas (esperado: 5)")
 
-    print(f"[INFO] Processando {len(task_files)} tarefas:")
+    logs.info(f"Processando {len(task_files)} tarefas:")
     for task_file in task_files:
-        print(f"  - {task_file.name}")
-    print(f"[INFO] Total de tarefas disponíveis: {len(list(tasks_path.glob('task_*.json')))}")
+        logs.plain(f"  - {task_file.name}")
+    logs.info(f"Total de tarefas disponíveis: {len(list(tasks_path.glob('task_*.json')))}")
 
-    for task_file in task_files:
-        print(f"\n{'='*60}")
-        print(f"[INFO] Executando tarefa: {task_file.name}")
-        print(f"{'='*60}")
+    # Manifesto da execução: registra cada job (tarefa, modelo) concluído
+    manifest = RunManifest(results_dir / "manifest.jsonl", resume=args.resume)
 
+    # Códigos gerados: escrita atômica com fsync agrupado no fim da execução (ou pacote único)
+    result_sink = ResultSink(
+        results_dir / "raw_responses", pack=args.pack, resume=args.resume, verify=logs.verify_writes()
+    )
+    ai.result_sink = result_sink
+
+    # Estágio de avaliação (opcional): compila e executa em paralelo à geração
+    pipeline = None
+    if args.evaluate:
+        try:
+            from openplc.evaluation import EvaluationPipeline
+
+            runtime_pool = None
+            if args.backend == "sim":
+                from openplc.simulator import SimulatedRunner
+
+                logs.info("Usando o interpretador ST simulado (sem OpenPLC)")
+                runner = SimulatedRunner(engine=args.sim_engine)
+            else:
+                from openplc.runner import OpenPLCRunner
+
+                logs.info("Inicializando runner do OpenPLC...")
+                runner = OpenPLCRunner(
+                    openplc_path=args.openplc_path,
+                    compiler_path=args.compiler_path,
+                    runtime_path=args.runtime_path,
+                    step_mode=args.step_mode,
+                    modbus_port=args.modbus_port,
+                    web_port=args.web_port
+                )
+                if not args.no_cache:
+                    from openplc.compile_cache import CompileCache
+                    runner.compile_cache = CompileCache(results_dir / "cache" / "compile", runner.compile_spec())
+                if args.runtimes:
+                    from openplc.runtime_pool import RuntimePool
+                    from openplc.ports import PortAllocator
+                    runtime_pool = RuntimePool(
+                        runner, size=args.runtimes, port_allocator=PortAllocator(args.base_port),
+                        async_io=args.async_io
+                    ).start()
+                elif args.async_io:
+                    logs.warning("--async-io só é usado com --runtimes")
+            test_expander = None
+            if args.expand_tests:
+                if args.backend == "sim":
+                    from openplc.expansion import TestExpander
+                    test_expander = TestExpander(
+                        tasks_path / "reference",
+                        cache_dir=None if args.no_cache else results_dir / "cache" / "tests"
+                    )
+                else:
+                    logs.warning("--expand-tests só é usado com --backend sim")
+            pipeline = EvaluationPipeline(
+                runner, results_dir, runtime_pool=runtime_pool, test_expander=test_expander
+            ).start()
+            logs.ok("Avaliação automática ativada")
+        except Exception as e:
+            logs.error(f"Falha ao inicializar OpenPLC, avaliação automática desativada: {e}")
+
+    # 1. Carregar tarefas e enfileirar um job por (tarefa, modelo)
+    scheduler = GenerationScheduler(ai, max_workers=args.concurrency)
+    skipped_jobs = 0
+    task_tests = {}
+
+    for priority, task_file in enumerate(task_files):
         try:
             task = json.loads(task_file.read_text(encoding='utf-8'))
             prompt = task["prompt"]
             cases = task["tests"]
-
-            # 1. gerar códigos ST das IAs
-            print("\n[FASE 1] Gerando códigos ST com IAs...")
-            st_outputs = ai.run_all_models(
-                task_prompt=prompt,
-                save_dir=results_dir / "raw_responses" / task_file.stem
-            )
-
-            if not st_outputs:
-                print(f"[AVISO] Nenhum código ST gerado para {task_file.name}, pulando...")
-                continue
-
-            print(f"[OK] {len(st_outputs)} códigos ST gerados para {task_file.name}")
-
         except json.JSONDecodeError as e:
-            print(f"[ERRO] Erro ao ler JSON da tarefa {task_file.name}: {e}")
+            logs.error(f"Erro ao ler JSON da tarefa {task_file.name}: {e}")
             continue
         except KeyError as e:
-            print(f"[ERRO] Campo obrigatório ausente em {task_file.name}: {e}")
+            logs.error(f"Campo obrigatório ausente em {task_file.name}: {e}")
             continue
         except Exception as e:
-            print(f"[ERRO] Erro inesperado ao processar {task_file.name}: {e}")
+            logs.error(f"Erro inesperado ao processar {task_file.name}: {e}")
             continue
 
+        task_tests[task_file.stem] = cases
+        if pipeline and pipeline.test_expander:
+            try:
+                pipeline.test_expander.expand(task_file.stem, task)
+            except Exception as e:
+                logs.warning(f"Falha ao ampliar os testes de {task_file.name}: {e}")
+        for model in ai.models:
+            if args.resume and manifest.is_complete(task_file.stem, model["name"], exists=result_sink.exists):
+                skipped_jobs += 1
+                # Avalia códigos de execuções anteriores que ainda não foram avaliados
+                st_path = ai.output_path(results_dir / "raw_responses" / task_file.stem, model["name"])
+                if pipeline and not pipeline.evaluation_path(task_file.stem, st_path).exists():
+                    pipeline.submit(task_file.stem, model["name"], st_path, cases, source=result_sink.read(st_path))
+                continue
+            scheduler.add_job(
+                task_name=task_file.stem,
+                prompt=prompt,
+                model_name=model["name"],
+                save_dir=results_dir / "raw_responses" / task_file.stem,
+                priority=priority
+            )
+
+    if skipped_jobs:
+        logs.info(f"Retomando execução: {skipped_jobs} jobs já concluídos serão pulados")
+
+    # 2. Gerar códigos ST das IAs (fila global de jobs)
+    logs.plain(f"\n{'='*60}")
+    logs.plain("[FASE 1] Gerando códigos ST com IAs...")
+    logs.plain(f"{'='*60}")
+
+    def report_job(job, result, elapsed, error=None):
+        status = "ok" if result else "failed"
+        st_path = ai.output_path(job["save_dir"], job["model"])
+        manifest.record(
+            job["task"], job["model"], status,
+            file=st_path if result else None,
+            elapsed=elapsed,
+            chars=len(result) if result else None,
+            error=None if result else (error or "geração sem código")
+        )
+        if pipeline and result:
+            pipeline.submit(job["task"], job["model"], st_path, task_tests[job["task"]], source=result)
+        logs.info(f"{job['task']} / {job['model']}: {status.upper()} em {elapsed:.1f}s")
+
+    scheduler.run(on_complete=report_job)
+    # Um único fsync por arquivo/diretório (ou do pacote) para toda a geração
+    result_sink.close()
+
+    evaluations = {}
+    if pipeline:
+        logs.info("Aguardando avaliações pendentes...")
+        evaluations = pipeline.close()
+        if pipeline.runtime_pool:
+            pipeline.runtime_pool.close()
+    http_stats = ai.log_connection_stats()
+    cache_stats = ai.cache_stats()
+    if cache_stats["enabled"]:
+        logs.info(f"Cache de respostas: {cache_stats['hits']} acertos, {cache_stats['misses']} falhas")
+
+    task_results = manifest.task_results([f.stem for f in task_files])
+    for task_file in task_files:
+        generated = task_results.get(task_file.stem, {}).get("codes_generated", 0)
+        if generated:
+            logs.ok(f"{generated} códigos ST gerados para {task_file.name}")
+        else:
+            logs.warning(f"Nenhum código ST gerado para {task_file.name}")
+
     # Gerar relatório resumo para avaliação manual
-    print(f"\n{'='*60}")
-    print("[INFO] Gerando relatório resumo...")
-    print(f"{'='*60}")
+    logs.plain(f"\n{'='*60}")
+    logs.info("Gerando relatório resumo...")
+    logs.plain(f"{'='*60}")
     
     summary = {
         "timestamp": datetime.now().isoformat(),
@@ -104,26 +385,34 @@ def main():
             "models": [m["name"] for m in ai.models],
             "tasks": [f.name for f in task_files]
         },
-        "results": {}
+        "http": http_stats,
+        "cache": cache_stats,
+        "storage": result_sink.stats(),
+        "rate_limit": ai.rate_limit_stats(),
+        "streaming": ai.stream_stats(),
+        "results": task_results
     }
-    
-    # Contar códigos gerados por tarefa
-    for task_file in task_files:
-        task_stem = task_file.stem
-        task_dir = results_dir / "raw_responses" / task_stem
-        if task_dir.exists():
-            st_files = list(task_dir.glob("*.st"))
-            summary["results"][task_stem] = {
-                "codes_generated": len(st_files),
-                "files": [f.name for f in st_files]
-            }
+
+    if pipeline:
+        summary["evaluation"] = summarize_evaluations(evaluations)
+        if pipeline.runner.compile_cache:
+            summary["evaluation"]["compile_cache"] = pipeline.runner.compile_cache.stats()
+        if pipeline.runtime_pool:
+            summary["evaluation"]["runtimes"] = pipeline.runtime_pool.stats()
+
+    if tracer:
+        results_dir.mkdir(parents=True, exist_ok=True)
+        tracer.export_jsonl(results_dir / "trace.jsonl")
+        tracer.export_chrome(results_dir / "trace.json")
+        summary["latency"] = tracer.latency_summary()
+        logs.ok(f"{len(tracer.spans)} spans salvos em {results_dir / 'trace.jsonl'} e {results_dir / 'trace.json'}")
     
     # Salvar resumo
     summary_file = results_dir / "summary.json"
     with open(summary_file, "w", encoding='utf-8') as f:
         json.dump(summary, f, indent=2, ensure_ascii=False)
     
-    print(f"[OK] Relatório salvo em: {summary_file}")
+    logs.ok(f"Relatório salvo em: {summary_file}")
     
     # Criar arquivo README para avaliação manual
     readme_content = f"""# Resultados do Benchmark - Avaliação Manual
@@ -200,13 +489,16 @@ Após a avaliação manual, os resultados podem ser consolidados em um relatóri
     with open(readme_file, "w", encoding='utf-8') as f:
         f.write(readme_content)
     
-    print(f"[OK] Guia de avaliação salvo em: {readme_file}")
+    logs.ok(f"Guia de avaliação salvo em: {readme_file}")
     
-    print(f"\n{'='*60}")
-    print("[INFO] Benchmark concluído!")
-    print(f"[INFO] Códigos ST gerados e prontos para avaliação manual")
-    print(f"[INFO] Verifique a pasta: {results_dir / 'raw_responses'}")
-    print(f"{'='*60}")
+    logs.plain(f"\n{'='*60}")
+    logs.info("Benchmark concluído!")
+    logs.info(f"Códigos ST gerados e prontos para avaliação manual")
+    if result_sink.pack:
+        logs.info(f"Verifique o pacote de respostas: {result_sink.pack.path}")
+    else:
+        logs.info(f"Verifique a pasta: {results_dir / 'raw_responses'}")
+    logs.plain(f"{'='*60}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+"""
+Microbenchmark do ciclo de varredura simulado.
+
+Mede scans por segundo de cada programa ST no interpretador (percorre a
+árvore a cada scan) e no código Python gerado por openplc/st_compiler.py.
+O runtime OpenPLC real executa um scan por ciclo da tarefa (T#20ms = 50
+scans/s de relógio, a taxa nominal); com --runtime o programa roda no
+runtime de verdade com um contador de scans em %MD998, e a taxa é o
+avanço desse contador lido pelo Modbus, junto com a latência de uma
+leitura Modbus e de um passo de teste. Com --lanes, mede também o engine vetorizado
+(openplc/batch_sim.py) executando N vetores de teste por scan.
+
+Uso:
+    python benchmark_scan.py [arquivos.st ...] [--scans N] [--runtime] [--lanes N]
+"""
+import argparse
+import re
+import time
+from pathlib import Path
+
+from openplc.st_compiler import CompiledSimulation, compile_source
+from openplc.st_interpreter import STProgram, Simulation
+
+# Contador de scans acrescentado ao programa medido no runtime (--runtime)
+SCAN_COUNTER_ADDRESS = "%MD998"
+SCAN_COUNTER_NAME = "BENCH_SCAN_COUNT"
+
+# Programa padrão: o laço FOR da task_09 (soma de um array)
+SAMPLE_PROGRAM = """
+PROGRAM SumArray
+VAR
+  values : ARRAY[0..9] OF INT := [10, 20, 30, 40, 50, 5(60)];
+  i : INT;
+  soma : INT;
+  led AT %QX0.0 : BOOL;
+END_VAR
+soma := 0;
+FOR i := 0 TO 9 BY 1 DO
+  soma := soma + values[i];
+END_FOR;
+led := soma > 1000;
+END_PROGRAM
+"""
+
+
+def measure(simulation, scans):
+    """Executa 'scans' ciclos e retorna scans por segundo."""
+    simulation.scan()  # aquecimento
+    start = time.perf_counter()
+    for _ in range(scans):
+        simulation.scan()
+    return scans / (time.perf_counter() - start)
+
+
+def measure_lanes(source, lanes, scans):
+    """Scans de lane por segundo no engine vetorizado (um scan avança todas as lanes)."""
+    from openplc.batch_sim import VectorProgram, VectorSimulation, vectorize_source
+
+    program = vectorize_source(source)
+    if not isinstance(program, VectorProgram):
+        return "vetorizado: programa sem tradução vetorial (usa o engine compilado)"
+    rate = measure(VectorSimulation(program, lanes), max(1, scans // 10))
+    return f"vetorizado ({lanes} lanes): {rate * lanes:.0f} scans de lane/s"
+
+
+def instrument_scan_counter(source):
+    """
+    Acrescenta ao primeiro PROGRAM um contador de scans em SCAN_COUNTER_ADDRESS,
+    incrementado no fim do corpo (um RETURN antes dele deixa o scan sem contar).
+    """
+    from openplc.address_map import mask_comments
+
+    masked = mask_comments(source)
+    header = re.search(r"\bPROGRAM\s+\w+", masked, re.IGNORECASE)
+    end = re.search(r"\bEND_PROGRAM\b", masked[header.end():], re.IGNORECASE) if header else None
+    if end is None:
+        raise ValueError("programa sem PROGRAM ... END_PROGRAM")
+    end = header.end() + end.start()
+    declaration = f"\nVAR\n  {SCAN_COUNTER_NAME} AT {SCAN_COUNTER_ADDRESS} : UDINT;\nEND_VAR"
+    increment = f"{SCAN_COUNTER_NAME} := {SCAN_COUNTER_NAME} + 1;\n"
+    return source[:header.end()] + declaration + source[header.end():end] + increment + source[end:]
+
+
+def measure_runtime(args, path, scan_cycle_ms, steps=20, scans_per_step=10, reads=50):
+    """
+    Roda o programa em um runtime OpenPLC e mede, pelo Modbus:
+
+    - scans_per_s: avanço do contador de scans (instrument_scan_counter) por
+      segundo de relógio, durante as leituras e os passos;
+    - request_ms: latência média de uma leitura Modbus;
+    - step_ms: duração média de um passo de teste (escrita, espera e leitura).
+    """
+    from openplc.address_map import AddressMap
+    from openplc.modbus_io import ModbusIOPlan
+    from openplc.ports import PortAllocator
+    from openplc.runner import OpenPLCRunner
+    from openplc.runtime_pool import RuntimeInstance
+
+    runner = OpenPLCRunner(
+        openplc_path=args.openplc_path,
+        compiler_path=args.compiler_path,
+        runtime_path=args.runtime_path
+    )
+    wait = scan_cycle_ms * scans_per_step / 1000
+    test_cases = [{"inputs": {}, "expected_outputs": {"0": False}, "wait": wait} for _ in range(steps)]
+
+    ports = PortAllocator()
+    instance = RuntimeInstance(runner, 0, ports.allocate(), ports.allocate(), ports.allocate())
+    try:
+        # A partida do processo fica fora da medição
+        instance.start()
+        # Código instrumentado: a marca do programa confirma a carga no runtime
+        source = instrument_scan_counter(Path(path).read_text(encoding="utf-8"))
+        address_map = AddressMap(source, test_cases)
+        instance.load(runner.compile_program(path, address_map.source), address_map.program_id)
+
+        def read_counter():
+            value = runner.read_value(instance.client, SCAN_COUNTER_ADDRESS, "UDINT")
+            if value is None:
+                raise RuntimeError(f"contador de scans ({SCAN_COUNTER_ADDRESS}) não pôde ser lido")
+            return value, time.perf_counter()
+
+        first, start = read_counter()
+        for _ in range(reads):
+            read_counter()
+        request_s = (time.perf_counter() - start) / (reads + 1)
+
+        steps_start = time.perf_counter()
+        instance.run(test_cases, ModbusIOPlan(test_cases, address_map))
+        step_s = (time.perf_counter() - steps_start) / steps
+
+        last, end = read_counter()
+        return {
+            "scans_per_s": ((last - first) & 0xFFFFFFFF) / (end - start),
+            "request_ms": request_s * 1000,
+            "step_ms": step_s * 1000,
+        }
+    finally:
+        instance.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara scans/s do interpretador ST, do ST compilado para Python e do runtime OpenPLC"
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="Arquivos .st a medir (padrão: programa de exemplo com o laço FOR da task_09)"
+    )
+    parser.add_argument(
+        "--scans",
+        type=int,
+        default=20000,
+        help="Número de scans medidos por engine (padrão: 20000)"
+    )
+    parser.add_argument(
+        "--runtime",
+        action="store_true",
+        help="Também mede o programa no runtime OpenPLC real (precisa do compilador e do webserver)"
+    )
+    parser.add_argument(
+        "--lanes",
+        type=int,
+        default=0,
+        help="Também mede o engine vetorizado (NumPy) com N vetores de teste por scan"
+    )
+    parser.add_argument("--openplc-path", type=str, default=None, help="Caminho para instalação do OpenPLC")
+    parser.add_argument("--compiler-path", type=str, default=None, help="Caminho direto para o compilador")
+    parser.add_argument("--runtime-path", type=str, default=None, help="Caminho direto para o webserver.py")
+    args = parser.parse_args()
+
+    programs = [(Path(f).name, Path(f).read_text(encoding="utf-8"), Path(f)) for f in args.files]
+    if not programs:
+        programs = [("exemplo (task_09)", SAMPLE_PROGRAM, None)]
+
+    print(f"{'Programa':<28} {'Ciclo':>7} {'Runtime':>10} {'Interpretado':>13} {'Compilado':>11} {'Ganho':>7}")
+    for name, source, path in programs:
+        start = time.perf_counter()
+        compiled = compile_source(source)
+        compile_ms = (time.perf_counter() - start) * 1000
+        cycle = compiled.program.scan_cycle_ms
+
+        interpreted = measure(Simulation(STProgram(source)), args.scans)
+        generated = measure(CompiledSimulation(compiled), args.scans)
+
+        runtime = None
+        if args.runtime:
+            if path is None:
+                print("[AVISO] --runtime precisa de um arquivo .st; mostrando só a taxa nominal do ciclo")
+            else:
+                try:
+                    runtime = measure_runtime(args, path, cycle)
+                except Exception as e:
+                    print(f"[AVISO] {name}: runtime real indisponível ({e}); mostrando só a taxa nominal do ciclo")
+
+        scans = runtime["scans_per_s"] if runtime else 1000 / cycle
+        print(f"{name:<28} {cycle:>5}ms {scans:>10.0f} {interpreted:>13.0f} {generated:>11.0f} "
+              f"{generated / interpreted:>6.1f}x")
+        print(f"{'':<28} tradução para Python: {compile_ms:.1f} ms")
+        if runtime:
+            print(f"{'':<28} runtime medido: {runtime['scans_per_s']:.1f} scans/s (contador), "
+                  f"leitura Modbus {runtime['request_ms']:.2f} ms, passo de teste {runtime['step_ms']:.1f} ms; "
+                  f"compilado = {generated / runtime['scans_per_s']:.0f}x o runtime em tempo real")
+        else:
+            print(f"{'':<28} runtime: taxa nominal do ciclo (não medida; use --runtime com um arquivo .st)")
+        if args.lanes:
+            print(f"{'':<28} {measure_lanes(source, args.lanes, args.scans)}")
+
+
+if __name__ == "__main__":
+    main()
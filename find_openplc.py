@@ -1,9 +1,16 @@
 """
 Script para ajudar a encontrar a instalação do OpenPLC e seus componentes
+
+Uso:
+    python find_openplc.py [--refresh]
+
+Ao final mostra o que o OpenPLCRunner vai usar e grava o cache de
+descoberta compartilhado com ele (--refresh ignora o cache existente).
 """
-import os
+import argparse
 import platform
-from pathlib import Path
+
+from openplc.discovery import base_candidates, default_cache_path, discover, scan_components
 
 def find_openplc_components():
     """Procura instalações do OpenPLC e lista os componentes encontrados"""
@@ -12,42 +19,8 @@ def find_openplc_components():
     print("Buscando instalação do OpenPLC...")
     print("=" * 70)
     
-    # Caminhos possíveis
-    if platform.system() == "Windows":
-        # Obter username do sistema
-        username = os.environ.get("USERNAME", "Matheus")
-        
-        search_paths = [
-            # Webserver rodando (estrutura específica)
-            Path(f"C:/OpenPLC_Runtime/home/{username}/OpenPLC_v3"),
-            Path("C:/OpenPLC_Runtime/home/Matheus/OpenPLC_v3"),  # Caminho específico mencionado
-            Path("C:/OpenPLC_Runtime"),  # Instalação comum do Runtime
-            Path("C:/OpenPLC_Editor"),  # Instalação comum do Editor
-            Path("C:/OpenPLC"),
-            Path("C:/OpenPLC_v3"),
-            Path("C:/Program Files/OpenPLC"),
-            Path("C:/Program Files/OpenPLC_Runtime"),
-            Path("C:/Program Files/OpenPLC_Editor"),
-            Path("C:/Program Files (x86)/OpenPLC"),
-            Path("C:/Program Files (x86)/OpenPLC_Runtime"),
-            Path("C:/Program Files (x86)/OpenPLC_Editor"),
-            Path(os.environ.get("OPENPLC_PATH", "")),
-            Path.home() / "OpenPLC",
-            Path.home() / "OpenPLC_Runtime",
-            Path.home() / "OpenPLC_Editor",
-            Path.home() / "Documents" / "OpenPLC",
-            Path(".") / "OpenPLC",
-        ]
-    else:
-        search_paths = [
-            Path("/usr/local/openplc"),
-            Path("/opt/openplc"),
-            Path("/usr/openplc"),
-            Path(os.environ.get("OPENPLC_PATH", "")),
-            Path.home() / "openplc",
-            Path.home() / "OpenPLC",
-            Path(".") / "openplc",
-        ]
+    # Mesmos caminhos usados pelo OpenPLCRunner (openplc/discovery.py) + pastas do Editor
+    search_paths = base_candidates(include_editor=True)
     
     found_installations = []
     
@@ -57,75 +30,7 @@ def find_openplc_components():
         
         print(f"\nVerificando: {base_path}")
         
-        # Procura componentes
-        components = {
-            "Runtime": [],
-            "Compiler": [],
-            "Editor": [],
-            "MatIEC": [],
-        }
-        
-        # Runtime
-        runtime_names = ["openplc_runtime.exe", "openplc_runtime", "runtime.exe", "runtime", "OpenPLC_Runtime.exe"]
-        for name in runtime_names:
-            for path in [
-                base_path / "runtime" / name,
-                base_path / name,  # Pode estar diretamente na raiz
-                base_path / "webserver" / name,
-                base_path / "bin" / name,  # Algumas instalações têm bin/
-            ]:
-                if path.exists():
-                    components["Runtime"].append(path)
-        
-        # Compilador
-        compiler_names = ["openplc.exe", "openplc", "compiler.exe", "compiler"]
-        for name in compiler_names:
-            for path in [
-                base_path / "compiler" / name,
-                base_path / name,
-                base_path / "editor" / "compiler" / name,
-                base_path / "editor" / name,
-            ]:
-                if path.exists():
-                    components["Compiler"].append(path)
-        
-        # MatIEC
-        matiec_names = ["iec2c.exe", "iec2c", "matiec.exe", "matiec"]
-        for name in matiec_names:
-            for path in [
-                base_path / "webserver" / "core" / "matiec" / name,
-                base_path / "webserver" / name,
-                base_path / "matiec" / name,
-                base_path / name,
-            ]:
-                if path.exists():
-                    components["MatIEC"].append(path)
-        
-        # Editor (pasta ou executável)
-        editor_paths = [
-            base_path / "editor",
-            base_path / "OpenPLC_Editor.exe",
-            base_path / "editor.exe",
-        ]
-        for path in editor_paths:
-            if path.exists():
-                components["Editor"].append(path)
-                # Se o Editor existe, procura compilador dentro dele
-                if path.is_dir():
-                    # Procura compilador dentro do editor
-                    for comp_name in compiler_names + matiec_names:
-                        editor_compiler_paths = [
-                            path / "compiler" / comp_name,
-                            path / comp_name,
-                            path / "bin" / comp_name,
-                            path / "tools" / comp_name,
-                        ]
-                        for comp_path in editor_compiler_paths:
-                            if comp_path.exists():
-                                if "iec2c" in comp_name.lower() or "matiec" in comp_name.lower():
-                                    components["MatIEC"].append(comp_path)
-                                else:
-                                    components["Compiler"].append(comp_path)
+        components = scan_components(base_path)
         
         # Se encontrou algum componente, adiciona à lista
         has_components = any(components.values())
@@ -168,6 +73,24 @@ def find_openplc_components():
     
     print("=" * 70)
 
+
+def show_discovery(refresh=False):
+    """Mostra a instalação escolhida pelo OpenPLCRunner e atualiza o cache de descoberta"""
+    result = discover(refresh=refresh)
+    origin = "cache" if result["cached"] else "busca completa"
+    print(f"Instalação usada pelo runner ({origin}; cache em {default_cache_path()}):")
+    if not result["openplc_path"]:
+        print("  (nenhuma)")
+        return
+    for key in ("openplc_path", "compiler_path", "webserver_script", "compile_script", "lib_path"):
+        print(f"  {key}: {result[key] or '-'}")
+    print("=" * 70)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Procura instalações do OpenPLC e seus componentes")
+    parser.add_argument("--refresh", action="store_true", help="Refaz a descoberta ignorando o cache")
+    args = parser.parse_args()
     find_openplc_components()
+    show_discovery(refresh=args.refresh)
 
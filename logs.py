@@ -0,0 +1,131 @@
+"""
+Log com níveis no formato "[NÍVEL] mensagem" usado em todo o projeto.
+
+Níveis, do mais ao menos detalhado: DEBUG, INFO, OK, AVISO e ERRO. O
+nível padrão é INFO, então as mensagens [DEBUG] do caminho quente
+(geração, gravação, compilação, Modbus) custam só a checagem do nível.
+Para adiar também a formatação, passe os argumentos no estilo do logging
+(logs.debug("conteúdo: %r", texto)) em vez de montar uma f-string.
+
+Com buffered=True as mensagens vão para uma fila e uma thread as escreve
+no terminal, tirando o I/O de console das threads de trabalho. flush()
+espera a fila esvaziar (antes de separadores impressos direto, por
+exemplo) e ela também é esvaziada na saída do processo.
+
+verify_writes() indica se as gravações devem ser confirmadas (fsync e
+releitura do arquivo); fica ligado com --verify-writes ou no nível DEBUG.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+OK = 25
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+PREFIXES = {DEBUG: "DEBUG", INFO: "INFO", OK: "OK", WARNING: "AVISO", ERROR: "ERRO"}
+
+logging.addLevelName(OK, "OK")
+
+_logger = logging.getLogger("plc_benchmark")
+_logger.propagate = False
+_listener = None
+_verify = False
+
+
+class _PrefixFormatter(logging.Formatter):
+    """"[NÍVEL] mensagem"; registros com extra={"plain": True} saem sem prefixo."""
+
+    def format(self, record):
+        text = record.getMessage()
+        if not getattr(record, "plain", False):
+            text = f"[{PREFIXES.get(record.levelno, record.levelname)}] {text}"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+def configure(level="info", buffered=False, verify=False, stream=None):
+    """
+    (Re)configura o log do processo.
+
+    Args:
+        level: 'debug', 'info', 'warning' ou 'error'.
+        buffered: escreve as mensagens em uma thread própria (fila).
+        verify: liga verify_writes() mesmo fora do nível DEBUG.
+        stream: destino (padrão: sys.stdout).
+    """
+    global _listener, _verify
+    _stop_listener()
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(_PrefixFormatter())
+    _logger.handlers.clear()
+    if buffered:
+        messages = queue.SimpleQueue()
+        _logger.addHandler(logging.handlers.QueueHandler(messages))
+        _listener = logging.handlers.QueueListener(messages, handler)
+        _listener.start()
+    else:
+        _logger.addHandler(handler)
+
+    _logger.setLevel(LEVELS[level] if isinstance(level, str) else level)
+    _verify = verify or _logger.level <= DEBUG
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        # stop() escreve o que ainda está na fila antes de encerrar a thread
+        _listener.stop()
+        _listener = None
+
+
+def flush():
+    """Espera as mensagens pendentes da fila serem escritas."""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def is_enabled(level):
+    return _logger.isEnabledFor(level)
+
+
+def verify_writes():
+    return _verify
+
+
+def debug(msg, *args, **kwargs):
+    _logger.log(DEBUG, msg, *args, **kwargs)
+
+
+def info(msg, *args, **kwargs):
+    _logger.log(INFO, msg, *args, **kwargs)
+
+
+def ok(msg, *args, **kwargs):
+    _logger.log(OK, msg, *args, **kwargs)
+
+
+def warning(msg, *args, **kwargs):
+    _logger.log(WARNING, msg, *args, **kwargs)
+
+
+def error(msg, *args, **kwargs):
+    _logger.log(ERROR, msg, *args, **kwargs)
+
+
+def plain(msg, level=INFO):
+    """Linha sem prefixo (separadores e listas do relatório de console)."""
+    _logger.log(level, msg, extra={"plain": True})
+
+
+# Padrão para scripts e uso como biblioteca: INFO, escrita direta
+configure()
+atexit.register(_stop_listener)
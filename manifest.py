@@ -0,0 +1,99 @@
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import logs
+
+
+class RunManifest:
+    """
+    Manifesto da execução em JSONL (results/manifest.jsonl).
+
+    Cada linha registra um job (tarefa, modelo) concluído, com status,
+    arquivo gerado, tempos e, nas falhas, o motivo (error). O arquivo é apenas anexado, então o último
+    registro de cada par é o que vale. Com resume=True o manifesto existente
+    é mantido e os jobs já concluídos podem ser pulados; caso contrário ele
+    é reiniciado.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._records = {}
+
+        if resume and self.path.exists():
+            for line_no, line in enumerate(self.path.read_text(encoding="utf-8").splitlines(), 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Linha truncada por uma interrupção no meio da escrita
+                    logs.warning(f"Linha {line_no} inválida no manifesto, ignorando")
+                    continue
+                self._records[(record["task"], record["model"])] = record
+        else:
+            self.path.write_text("", encoding="utf-8")
+
+    def record(self, task, model, status, file=None, elapsed=None, chars=None, error=None):
+        """Anexa o resultado de um job ao manifesto."""
+        record = {
+            "task": task,
+            "model": model,
+            "status": status,
+            "file": str(file) if file else None,
+            "chars": chars,
+            "elapsed_s": round(elapsed, 3) if elapsed is not None else None,
+            "finished_at": datetime.now().isoformat(),
+            "error": error,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._records[(task, model)] = record
+        return record
+
+    def is_complete(self, task, model, exists=None):
+        """
+        True se o job terminou com sucesso e o arquivo .st ainda existe e não está vazio.
+
+        exists: função caminho -> bool que substitui a checagem no disco
+        (ResultSink.exists, quando as respostas estão em um pacote).
+        """
+        with self._lock:
+            record = self._records.get((task, model))
+        if not record or record["status"] != "ok" or not record["file"]:
+            return False
+        path = Path(record["file"])
+        if exists is not None:
+            return exists(path)
+        return path.exists() and path.stat().st_size > 0
+
+    def records(self):
+        with self._lock:
+            return list(self._records.values())
+
+    def task_results(self, task_names):
+        """Resumo por tarefa (códigos gerados, arquivos e status por modelo) para o summary.json."""
+        results = {}
+        by_task = {}
+        for record in self.records():
+            by_task.setdefault(record["task"], []).append(record)
+
+        for task in task_names:
+            records = by_task.get(task)
+            if not records:
+                continue
+            ok = [r for r in records if r["status"] == "ok"]
+            results[task] = {
+                "codes_generated": len(ok),
+                "files": [Path(r["file"]).name for r in ok],
+                "models": {
+                    r["model"]: {"status": r["status"], "elapsed_s": r["elapsed_s"], "chars": r["chars"]}
+                    for r in records
+                },
+            }
+        return results
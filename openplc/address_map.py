@@ -0,0 +1,292 @@
+"""
+Mapeamento das chaves dos testes para endereços Modbus do programa.
+
+Os testes usam três tipos de chave: números ('0' -> %IX0.0 na entrada,
+%QX0.0 na saída), 'A<n>' (%IW<n> na entrada, %QW<n> na saída)/'DI<n>' e
+nomes de variáveis ('input1'). O Modbus não escreve %IX nem %IW, então as
+entradas nessas áreas são expostas: as referências do programa ao
+endereço (declarações AT e acessos diretos no corpo) são reescritas para
+um endereço da faixa reservada ao teste (%QX90.0+ para bits, %MW900+ para
+palavras). Os nomes são resolvidos pelas declarações do PROGRAM:
+
+- variável declarada com AT em endereço acessível (%QX, %QW, %MW, %MD, ou
+  %IX/%IW quando só é lida) usa esse endereço;
+- variável com AT somente leitura usada como entrada tem o endereço
+  exposto como acima;
+- variável local sem AT é exposta: a declaração é reescrita com um
+  endereço da faixa reservada (%QX90.0+ para BOOL, %MW900+ para 16 bits,
+  %MD900+ para 32 bits).
+
+O AddressMap é calculado uma vez por programa; o código instrumentado
+(AddressMap.source) é o que vai para o compilador, e o ModbusIOPlan monta
+a tabela de E/S de cada passo a partir dele. O código instrumentado também
+grava uma marca do programa (program_id, derivada do código) em %MD999:
+lendo esse endereço o runner confirma que o runtime executa o programa
+recém-carregado, e não o anterior.
+"""
+import re
+import zlib
+
+from openplc.compile_cache import normalize_st_source
+from openplc.modbus_io import (
+    COIL, DISCRETE_INPUT, HOLDING_REGISTER, INPUT_REGISTER, MEMORY_DWORD_BASE, MEMORY_WORD_BASE, Location,
+    address_location, key_address,
+)
+
+# Faixas de endereços reservadas para variáveis expostas ao teste
+HARNESS_COIL_START = 720        # %QX90.0 .. %QX99.7
+HARNESS_WORD_START = 900        # %MW900.. (registrador 1024 + n)
+HARNESS_DWORD_START = 900       # %MD900.. (registradores 2048 + 2n)
+PROGRAM_ID_ADDRESS = "%MD999"   # marca do programa carregado (fora das faixas alocadas)
+PROGRAM_ID_NAME = "BENCH_PROGRAM_ID"
+
+BOOL_TYPES = {"BOOL"}
+WORD_TYPES = {"INT", "UINT", "WORD", "SINT", "USINT", "BYTE"}
+DWORD_TYPES = {"DINT", "UDINT", "DWORD", "REAL", "TIME"}
+
+# Endereço direto em qualquer ponto do código (para reescrever acessos a %IX/%IW)
+_DIRECT_ADDRESS = re.compile(r"%I[XW]?\d+(?:\.\d+)?\b", re.IGNORECASE)
+_PROGRAM = re.compile(r"\bPROGRAM\s+\w+(.*?)\bEND_PROGRAM\b", re.IGNORECASE | re.DOTALL)
+_PROGRAM_HEADER = re.compile(r"\bPROGRAM\s+\w+", re.IGNORECASE)
+_VAR_BLOCK = re.compile(
+    r"\b(VAR(?:_INPUT|_OUTPUT|_IN_OUT|_TEMP|_EXTERNAL|_GLOBAL)?)\b((?:\s+(?:CONSTANT|RETAIN|NON_RETAIN))*)(.*?)\bEND_VAR\b",
+    re.IGNORECASE | re.DOTALL,
+)
+_DECL = re.compile(
+    r"^\s*(?P<names>[A-Za-z_]\w*(?:\s*,\s*[A-Za-z_]\w*)*)\s*"
+    r"(?:AT\s+(?P<address>%[IQM][XBWDL]?[\d.]+)\s*)?"
+    r":\s*(?P<type>[A-Za-z_]\w*)(?P<rest>.*)$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def mask_comments(source):
+    """Troca comentários (* *) e // por espaços, preservando as posições do texto."""
+    out = list(source)
+    i, n = 0, len(source)
+    while i < n:
+        if source[i] in ("'", '"'):
+            end = source.find(source[i], i + 1)
+            i = n if end < 0 else end + 1
+        elif source.startswith("(*", i):
+            end = source.find("*)", i + 2)
+            end = n if end < 0 else end + 2
+            for j in range(i, end):
+                if out[j] != "\n":
+                    out[j] = " "
+            i = end
+        elif source.startswith("//", i):
+            end = source.find("\n", i)
+            end = n if end < 0 else end
+            for j in range(i, end):
+                out[j] = " "
+            i = end
+        else:
+            i += 1
+    return "".join(out)
+
+
+def _slot(location):
+    """(tipo Modbus, endereço) de uma Location, sem o tipo IEC: identifica o endereço físico."""
+    return (location.kind, location.address) if location else None
+
+
+class Declaration:
+    """Declaração de variável do PROGRAM e sua posição no código fonte."""
+
+    def __init__(self, names, address, type_name, rest, block, start, end, leading):
+        self.names = names
+        self.address = address
+        self.type_name = type_name
+        self.rest = rest
+        self.block = block
+        self.start = start
+        self.end = end
+        # Espaços e comentários antes da declaração, preservados na reescrita
+        self.leading = leading
+
+
+def scan_declarations(source):
+    """Declarações das seções VAR de cada PROGRAM (sem comentários)."""
+    masked = mask_comments(source)
+    declarations = []
+    for program in _PROGRAM.finditer(masked):
+        for block in _VAR_BLOCK.finditer(masked, program.start(1), program.end(1)):
+            kind = block.group(1).upper()
+            constant = "CONSTANT" in block.group(2).upper()
+            offset = block.start(3)
+            for part in block.group(3).split(";"):
+                match = _DECL.match(part)
+                if match:
+                    names = [n.strip() for n in match.group("names").split(",")]
+                    prefix = len(part) - len(part.lstrip())
+                    declarations.append(Declaration(
+                        names, match.group("address"), match.group("type").upper(), match.group("rest"),
+                        "CONSTANT" if constant else kind, offset, offset + len(part), source[offset:offset + prefix],
+                    ))
+                offset += len(part) + 1
+    return declarations
+
+
+class AddressMap:
+    """
+    Tabela chave do teste -> Location de um programa (por direção: entrada
+    ou saída), com o código instrumentado para expor as variáveis locais e
+    as entradas %IX/%IW usadas pelos testes.
+    """
+
+    def __init__(self, source, test_cases):
+        self.original_source = source
+        inputs, outputs = set(), set()
+        for step in test_cases:
+            inputs.update(str(k) for k in step.get("inputs", {}))
+            outputs.update(str(k) for k in step.get("expected_outputs", {}))
+
+        self.input_locations = {}
+        self.output_locations = {}
+        self.exposed = {}
+        self.unresolved = []
+        self._next = {"coil": HARNESS_COIL_START, "word": HARNESS_WORD_START, "dword": HARNESS_DWORD_START}
+        names = sorted(k for k in inputs | outputs if key_address(k, "input") is None)
+
+        declared = {}
+        located = {}
+        for decl in scan_declarations(source):
+            for name in decl.names:
+                declared.setdefault(name.upper(), (decl, name))
+            if decl.address:
+                located.setdefault(_slot(address_location(decl.address)), decl.type_name)
+        used = {_slot(address_location(m.group(0))) for m in _DIRECT_ADDRESS.finditer(mask_comments(source))}
+
+        rewrites = {}
+        replaced = {}
+        for key in names:
+            entry = declared.get(key.upper())
+            if entry is None:
+                self.unresolved.append(key)
+                continue
+            decl, name = entry
+            location = address_location(decl.address, decl.type_name) if decl.address else None
+            writable = location is not None and location.kind in (COIL, HOLDING_REGISTER)
+            if location is not None and (writable or key not in inputs):
+                self._set(key, location)
+                continue
+            if location is not None and location.width == 1:
+                # AT %IX/%IW usada como entrada: expõe o endereço em todo o programa
+                address = self._expose_address(location, decl.type_name, replaced)
+            elif decl.block not in ("VAR", "VAR_OUTPUT", "VAR_INPUT"):
+                address = None
+            else:
+                # Variável sem endereço: a declaração ganha um AT da faixa reservada
+                address = self._allocate(decl.type_name)
+                if address:
+                    rewrites.setdefault(id(decl), (decl, {}))[1][name] = address
+            if address is None:
+                self.unresolved.append(key)
+                continue
+            self._set(key, address_location(address, decl.type_name))
+            self.exposed[name] = address
+
+        for key in sorted(inputs):
+            address = key_address(key, "input")
+            if address is None:
+                continue
+            location = address_location(address)
+            if location.kind in (COIL, HOLDING_REGISTER):
+                self.input_locations[key] = location._replace(type_name=None)
+            elif _slot(location) in used:
+                # Entrada %IX/%IW que o programa lê: passa a ser um endereço gravável
+                type_name = located.get(_slot(location), "BOOL" if location.kind == DISCRETE_INPUT else "INT")
+                harness = self._expose_address(location, type_name, replaced)
+                # Mantém o tipo: valores negativos de INT são escritos em complemento de dois
+                self.input_locations[key] = address_location(harness, type_name)
+                self.exposed[address] = harness
+        for key in sorted(outputs):
+            address = key_address(key, "output")
+            if address is not None:
+                self.output_locations[key] = address_location(address)._replace(type_name=None)
+
+        self.source = self._replace_addresses(self._rewrite(source, rewrites.values()), replaced)
+        self.program_id = None
+        self.source = self._stamp(self.source)
+
+    def _set(self, key, location):
+        self.input_locations[key] = location
+        self.output_locations[key] = location
+
+    def _allocate(self, type_name):
+        """Próximo endereço livre da faixa reservada para o tipo (None se o tipo não é suportado)."""
+        if type_name in BOOL_TYPES:
+            n = self._next["coil"]
+            self._next["coil"] += 1
+            return f"%QX{n // 8}.{n % 8}"
+        if type_name in WORD_TYPES:
+            self._next["word"] += 1
+            return f"%MW{self._next['word'] - 1}"
+        if type_name in DWORD_TYPES:
+            self._next["dword"] += 1
+            return f"%MD{self._next['dword'] - 1}"
+        return None
+
+    def _expose_address(self, location, type_name, replaced):
+        """Endereço gravável que substitui um %IX/%IW (o mesmo para todas as chaves que o usam)."""
+        slot = _slot(location)
+        if slot not in replaced:
+            replaced[slot] = self._allocate("BOOL" if location.kind == DISCRETE_INPUT else "INT")
+        return replaced[slot]
+
+    @staticmethod
+    def _replace_addresses(source, replaced):
+        """Troca cada acesso direto (declarações AT e corpo) aos endereços expostos, fora de comentários."""
+        if not replaced:
+            return source
+        masked = mask_comments(source)
+        parts, last = [], 0
+        for match in _DIRECT_ADDRESS.finditer(masked):
+            harness = replaced.get(_slot(address_location(match.group(0))))
+            if harness:
+                parts.append(source[last:match.start()] + harness)
+                last = match.end()
+        return "".join(parts) + source[last:]
+
+    @staticmethod
+    def _rewrite(source, rewrites):
+        """Reescreve as declarações: cada variável exposta vira uma declaração com AT própria."""
+        for decl, addresses in sorted(rewrites, key=lambda item: item[0].start, reverse=True):
+            parts = []
+            kept = [n for n in decl.names if n not in addresses]
+            if kept:
+                parts.append(f"{', '.join(kept)} : {decl.type_name}{decl.rest.rstrip()}")
+            for name in decl.names:
+                if name in addresses:
+                    parts.append(f"{name} AT {addresses[name]} : {decl.type_name}{decl.rest.rstrip()}")
+            source = source[:decl.start] + decl.leading + ";\n  ".join(parts) + source[decl.end:]
+        return source
+
+    def _stamp(self, source):
+        """
+        Declara no primeiro PROGRAM a marca do programa (UDINT em
+        PROGRAM_ID_ADDRESS com o CRC32 do código normalizado, nunca 0, que é
+        o valor de um runtime recém-iniciado). Códigos que só diferem em
+        comentários e espaços recebem a mesma marca e continuam com a mesma
+        chave no CompileCache. Sem PROGRAM, o código fica como está.
+        """
+        header = _PROGRAM_HEADER.search(mask_comments(source))
+        if header is None:
+            return source
+        self.program_id = zlib.crc32(normalize_st_source(source).encode("utf-8")) or 1
+        block = f"\nVAR\n  {PROGRAM_ID_NAME} AT {PROGRAM_ID_ADDRESS} : UDINT := {self.program_id};\nEND_VAR"
+        return source[:header.end()] + block + source[header.end():]
+
+    def location(self, key, direction="output"):
+        """Location da chave na direção dada ('input' ou 'output'), ou None se o programa não a usa."""
+        table = self.input_locations if direction == "input" else self.output_locations
+        return table.get(str(key))
+
+    @property
+    def signature(self):
+        """Identifica a tabela: programas com a mesma assinatura compartilham o ModbusIOPlan."""
+        return (
+            tuple(sorted((k, tuple(v)) for k, v in self.input_locations.items())),
+            tuple(sorted((k, tuple(v)) for k, v in self.output_locations.items())),
+        )
@@ -0,0 +1,200 @@
+"""
+Execução assíncrona dos testes via Modbus/TCP (cliente asyncio do pymodbus).
+
+O AsyncModbusDriver mantém um único event loop em uma thread própria e uma
+conexão AsyncModbusTcpClient por runtime. As esperas dos passos viram
+asyncio.sleep, então as suítes de vários runtimes avançam ao mesmo tempo no
+mesmo loop em vez de cada thread bloquear em time.sleep. Cada suíte tem um
+prazo próprio (soma das esperas + margem); ao vencer, a suíte é cancelada e
+o runtime é marcado para reinício.
+"""
+import asyncio
+import threading
+import time
+
+from openplc.runner import time_dependent
+
+import tracing
+
+try:
+    from pymodbus.client import AsyncModbusTcpClient
+except ImportError:
+    AsyncModbusTcpClient = None
+
+
+class AsyncModbusDriver:
+    """Event loop compartilhado que executa as suítes de testes de vários runtimes."""
+
+    def __init__(self, runner, timeout_margin=5.0, connect_timeout=3.0):
+        if AsyncModbusTcpClient is None:
+            raise RuntimeError("Cliente Modbus assíncrono indisponível: requer pymodbus>=3")
+        # Modo de avanço e constantes de polling vêm do runner (OpenPLCRunner)
+        self.runner = runner
+        self.timeout_margin = timeout_margin
+        self.connect_timeout = connect_timeout
+        self.clients = {}
+        self._tasks = {}
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="modbus-async-loop", daemon=True)
+        self._thread.start()
+
+    def _call(self, coro, timeout=None):
+        """Executa a corrotina no loop do driver e espera o resultado (chamado de outras threads)."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    # -- conexões -------------------------------------------------------------
+
+    def connect(self, instance):
+        """Abre (ou reabre) a conexão assíncrona de um RuntimeInstance."""
+        self._call(self._connect(instance))
+
+    async def _connect(self, instance):
+        old = self.clients.pop(instance.index, None)
+        if old is not None:
+            old.close()
+        client = AsyncModbusTcpClient("127.0.0.1", port=instance.modbus_port, timeout=self.connect_timeout)
+        started = time.perf_counter()
+        connected = await client.connect()
+        tracing.record("modbus_connect", started, time.perf_counter(), port=instance.modbus_port)
+        if not connected:
+            raise ConnectionError(f"{instance.name}: não foi possível conectar via Modbus/TCP assíncrono")
+        self.clients[instance.index] = client
+
+    def disconnect(self, instance):
+        client = self.clients.pop(instance.index, None)
+        if client is not None:
+            self.loop.call_soon_threadsafe(client.close)
+
+    # -- execução -------------------------------------------------------------
+
+    def suite_timeout(self, test_cases):
+        """Prazo da suíte: soma das esperas (ou do prazo de cada passo nos modos settle/match) + margem."""
+        if self.runner.step_mode == "sleep":
+            budget = sum(step.get("wait", 0.1) for step in test_cases)
+        else:
+            budget = sum(max(self.runner.STEP_TIMEOUT, 2 * step.get("wait", 0.1)) for step in test_cases)
+        return budget + self.timeout_margin
+
+    def run(self, instance, test_cases, io_plan, timeout=None):
+        """
+        Executa a suíte no runtime e bloqueia até terminar (para as threads do pool).
+
+        io_plan é o ModbusIOPlan montado com o AddressMap do programa carregado.
+        """
+        # O loop roda em outra thread: os atributos do tracing (tarefa, modelo) vão junto
+        attrs = tracing.get_tracer().current_attrs()
+        return self._call(self._run_suite(instance, test_cases, io_plan, timeout, **attrs))
+
+    def run_many(self, jobs, timeout=None):
+        """
+        Executa várias suítes ao mesmo tempo, uma por runtime.
+
+        jobs: lista de (instance, test_cases, io_plan). Retorna, na mesma
+        ordem, a lista de resultados ou a exceção de cada suíte.
+        """
+        async def gather():
+            return await asyncio.gather(
+                *(self._run_suite(inst, cases, plan, timeout) for inst, cases, plan in jobs),
+                return_exceptions=True
+            )
+        return self._call(gather())
+
+    def cancel(self, instance):
+        """Cancela a suíte em andamento no runtime (se houver)."""
+        task = self._tasks.get(instance.index)
+        if task is not None:
+            self.loop.call_soon_threadsafe(task.cancel)
+
+    async def _run_suite(self, instance, test_cases, io_plan, timeout, **attrs):
+        client = self.clients.get(instance.index)
+        if client is None or not client.connected:
+            await self._connect(instance)
+            client = self.clients[instance.index]
+        timeout = timeout or self.suite_timeout(test_cases)
+
+        task = asyncio.ensure_future(self.run_steps(client, test_cases, io_plan, runtime=instance.index, **attrs))
+        self._tasks[instance.index] = task
+        try:
+            results = await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            # Conexão pode ter ficado com requisições pendentes: força reinício do runtime
+            instance.needs_restart = True
+            raise TimeoutError(f"{instance.name}: testes não terminaram em {timeout:.1f}s")
+        except asyncio.CancelledError:
+            instance.needs_restart = True
+            raise RuntimeError(f"{instance.name}: execução dos testes cancelada")
+        finally:
+            self._tasks.pop(instance.index, None)
+        instance.programs_run += 1
+        return results
+
+    async def run_steps(self, client, test_cases, io_plan, **attrs):
+        """Versão assíncrona de OpenPLCRunner.run_steps (mesmo formato de resultado)."""
+        results = []
+        timed = time_dependent(test_cases)
+        for index, step in enumerate(test_cases):
+            await io_plan.write_inputs_async(client, index, step["inputs"])
+
+            step_start = time.perf_counter()
+            if self.runner.step_mode == "sleep":
+                await asyncio.sleep(step.get("wait", 0.1))
+                got = await io_plan.read_outputs_async(client, index)
+            else:
+                got = await self._poll_outputs(client, io_plan, index, step, timed)
+            step_end = time.perf_counter()
+            # Os passos de várias suítes se intercalam no loop: o span leva o runtime como atributo
+            tracing.record("test_step", step_start, step_end, step=index, **attrs)
+            results.append(self.runner.step_record(step, got, step_end - step_start))
+        return results
+
+    async def _poll_outputs(self, client, io_plan, index, step, timed=False):
+        """Mesma regra de OpenPLCRunner._poll_outputs, sem bloquear o loop entre leituras."""
+        runner = self.runner
+        expected = step["expected_outputs"]
+        minimum, limit = runner.poll_window(step, timed)
+        if minimum:
+            await asyncio.sleep(minimum)
+        deadline = time.perf_counter() - minimum + limit
+        previous = None
+        streak = 0
+        streak_start = None
+
+        while True:
+            got = await io_plan.read_outputs_async(client, index)
+            now = time.perf_counter()
+            if runner.step_mode == "match":
+                holds = all(got[k] == expected[k] for k in expected)
+            else:
+                holds = got == previous
+            previous = got
+
+            if holds:
+                if streak == 0:
+                    streak_start = now
+                streak += 1
+                if streak >= runner.SETTLE_POLLS and now - streak_start >= runner.SCAN_CYCLE:
+                    return got
+            else:
+                streak = 0
+
+            if now >= deadline:
+                return got
+            await asyncio.sleep(runner.POLL_INTERVAL)
+
+    def close(self):
+        """Cancela as suítes pendentes, fecha as conexões e encerra o loop."""
+        async def shutdown():
+            for task in list(self._tasks.values()):
+                task.cancel()
+            for client in self.clients.values():
+                client.close()
+            self.clients.clear()
+
+        if self.loop.is_running():
+            try:
+                self._call(shutdown(), timeout=5)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+        self.loop.close()
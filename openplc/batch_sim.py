@@ -0,0 +1,1059 @@
+"""
+Simulação vetorizada (NumPy) de muitos candidatos e vetores de teste.
+
+Cada candidato é traduzido uma vez para uma função Python sobre arrays
+NumPy: cada variável guarda um valor por vetor de teste (lane), e IF/CASE
+viram máscaras booleanas em vez de desvios. Um scan executa o programa em
+todas as lanes de uma vez. O BatchSimulator mantém a imagem de E/S de B
+candidatos × T vetores em arrays (B, T) (bool para %IX/%QX, int16 para
+%IW/%QW) e avança todos juntos, passo a passo.
+
+Construções sem tradução vetorial (arrays, estruturas, FUNCTION/FUNCTION_BLOCK
+do usuário, WHILE/REPEAT, EXIT/RETURN) fazem o candidato rodar no engine
+escalar (st_compiler) lane por lane, com os mesmos resultados.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from openplc.runner import CompilationError
+from openplc.simulator import SimulatedRunner, key_address
+from openplc.st_compiler import CompiledProgram, _CodeGen, _static_kind, compile_source
+from openplc.st_interpreter import (
+    INT_TYPES, REAL_TYPES, STANDARD_FBS, TIME_TYPES, Node, STRuntimeError, Simulation, StandardFB,
+    address_type, conversion_target,
+)
+
+
+class VectorizeError(ValueError):
+    """Construção ST sem tradução vetorial: o candidato usa o engine escalar."""
+
+
+def _dtype(type_name):
+    """dtype NumPy das variáveis de um tipo ST (None se não vetorizável)."""
+    if type_name == "BOOL":
+        return np.bool_
+    if type_name in INT_TYPES or type_name in TIME_TYPES:
+        return np.int64
+    if type_name in REAL_TYPES:
+        return np.float64
+    return None
+
+
+# Imagem de E/S: o tipo do endereço define o dtype (bit -> bool, palavra -> int16)
+_IMAGE_DTYPES = {"X": np.bool_, "B": np.uint8, "W": np.int16, "D": np.int32, "L": np.int64}
+
+
+def image_dtype(address):
+    return _IMAGE_DTYPES[address[2]]
+
+
+# ---------------------------------------------------------------------------
+# Funções auxiliares usadas pelo código gerado
+# ---------------------------------------------------------------------------
+
+def _put(dst, value, mask):
+    """Atribuição mascarada: só as lanes ativas recebem o valor."""
+    if mask is None:
+        np.copyto(dst, value, casting="unsafe")
+    else:
+        np.copyto(dst, value, casting="unsafe", where=mask)
+
+
+def _mask(cond, mask, lanes):
+    """Lanes ativas em que cond é verdadeira (array novo)."""
+    cond = np.broadcast_to(np.asarray(cond, dtype=np.bool_), (lanes,))
+    return cond.copy() if mask is None else mask & cond
+
+
+def _word(value):
+    """Leitura de palavra da imagem: sobe para int64 antes das contas."""
+    return value.astype(np.int64)
+
+
+def _nonzero_divisor(b, mask, message):
+    zero = np.asarray(b) == 0
+    if mask is not None:
+        zero = zero & mask
+    if np.any(zero):
+        raise STRuntimeError(message)
+    return np.where(np.asarray(b) == 0, 1, b)
+
+
+def _div(a, b, mask, integer):
+    b = _nonzero_divisor(b, mask, "divisão por zero")
+    if integer:
+        q = np.abs(a) // np.abs(b)
+        return np.where((np.asarray(a) >= 0) == (np.asarray(b) >= 0), q, -q)
+    return np.true_divide(a, b)
+
+
+def _mod(a, b, mask, integer):
+    b = _nonzero_divisor(b, mask, "MOD por zero")
+    return a - b * _div(a, b, None, integer)
+
+
+def _round_half_away(value):
+    value = np.asarray(value, dtype=np.float64)
+    return (np.sign(value) * np.floor(np.abs(value) + 0.5)).astype(np.int64)
+
+
+def _wrap(type_name, value):
+    """Estouro de inteiros como no CLP (mesma regra de coerce)."""
+    bits, signed = INT_TYPES[type_name]
+    value = np.asarray(value).astype(np.int64)
+    if bits >= 64:
+        return value
+    mask = (1 << bits) - 1
+    if signed:
+        half = 1 << (bits - 1)
+        return ((value + half) & mask) - half
+    return value & mask
+
+
+def _vcoerce(type_name, value):
+    """coerce() para arrays."""
+    if type_name == "BOOL":
+        return np.asarray(value) != 0
+    if type_name in INT_TYPES:
+        return _wrap(type_name, np.trunc(value) if np.asarray(value).dtype.kind == "f" else value)
+    if type_name in REAL_TYPES:
+        return np.asarray(value, dtype=np.float64)
+    if type_name in TIME_TYPES:
+        return np.trunc(np.asarray(value)).astype(np.int64)
+    return value
+
+
+def _vconvert(target, value):
+    """convert() para arrays: REAL -> inteiro arredonda."""
+    if (target in INT_TYPES or target in TIME_TYPES) and np.asarray(value).dtype.kind == "f":
+        value = _round_half_away(value)
+    return _vcoerce(target, value)
+
+
+_FUNCTIONS = {
+    "ABS": np.abs,
+    "MIN": lambda *values: _reduce(np.minimum, values),
+    "MAX": lambda *values: _reduce(np.maximum, values),
+    "LIMIT": lambda mn, value, mx: np.maximum(mn, np.minimum(value, mx)),
+    "SEL": lambda g, in0, in1: np.where(g, in1, in0),
+    "MOVE": lambda value: value,
+    "TRUNC": lambda value: np.trunc(value).astype(np.int64),
+    "ADD": lambda *values: _reduce(np.add, values),
+    "MUL": lambda *values: _reduce(np.multiply, values),
+    "SUB": lambda a, b: np.subtract(a, b),
+    "SHL": lambda value, n: np.left_shift(value, n),
+    "SHR": lambda value, n: np.right_shift(value, n),
+}
+
+
+def _reduce(func, values):
+    result = values[0]
+    for value in values[1:]:
+        result = func(result, value)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Blocos funcionais padrão vetorizados
+# ---------------------------------------------------------------------------
+
+class VectorFB:
+    """
+    Bloco padrão com um estado por lane. execute(now, mask) reproduz o
+    execute() do bloco escalar apenas nas lanes ativas.
+    """
+
+    NAME = None
+    STATE = {}
+
+    def __init__(self, scalar, lanes):
+        self.vars = {}
+        self.types = dict(scalar.types)
+        for name, value in scalar.vars.items():
+            self.vars[name] = np.full(lanes, value, dtype=_dtype(scalar.types[name]))
+        self.state = {}
+        for name, dtype in self.STATE.items():
+            initial = getattr(scalar, name)
+            self.state[name] = np.full(lanes, -1 if initial is None else initial, dtype=dtype)
+
+    def commit(self, mask, values):
+        for name, value in values.items():
+            dst = self.vars[name] if name in self.vars else self.state[name]
+            _put(dst, value, mask)
+
+
+class VTON(VectorFB):
+    NAME = "TON"
+    STATE = {"_start": np.int64}
+
+    def execute(self, now, mask):
+        v, s = self.vars, self.state
+        start = np.where(v["IN"], np.where(s["_start"] < 0, now, s["_start"]), -1)
+        et = np.where(v["IN"], np.minimum(now - start, v["PT"]), 0)
+        self.commit(mask, {"_start": start, "ET": et, "Q": v["IN"] & (et >= v["PT"])})
+
+
+class VTOF(VectorFB):
+    NAME = "TOF"
+    STATE = {"_start": np.int64}
+
+    def execute(self, now, mask):
+        v, s = self.vars, self.state
+        start = np.where(v["IN"], -1, np.where((s["_start"] < 0) & v["Q"], now, s["_start"]))
+        running = ~v["IN"] & (start >= 0)
+        et = np.where(v["IN"], 0, np.where(running, np.minimum(now - start, v["PT"]), v["ET"]))
+        q = v["IN"] | (v["Q"] & ~(running & (et >= v["PT"])))
+        self.commit(mask, {"_start": start, "ET": et, "Q": q})
+
+
+class VTP(VectorFB):
+    NAME = "TP"
+    STATE = {"_start": np.int64, "_prev_in": np.bool_}
+
+    def execute(self, now, mask):
+        v, s = self.vars, self.state
+        running = s["_start"] >= 0
+        trigger = ~running & v["IN"] & ~s["_prev_in"]
+        elapsed = np.minimum(now - s["_start"], v["PT"])
+        done = running & (elapsed >= v["PT"])
+        release = done & ~v["IN"]
+        start = np.where(trigger, now, np.where(release, -1, s["_start"]))
+        et = np.where(trigger | release, 0, np.where(running, elapsed, v["ET"]))
+        q = np.where(trigger, True, v["Q"] & ~done)
+        self.commit(mask, {"_start": start, "ET": et, "Q": q, "_prev_in": v["IN"]})
+
+
+class VCTU(VectorFB):
+    NAME = "CTU"
+    STATE = {"_prev_cu": np.bool_}
+
+    def execute(self, now, mask):
+        v, s = self.vars, self.state
+        up = ~v["R"] & v["CU"] & ~s["_prev_cu"] & (v["CV"] < 32767)
+        cv = np.where(v["R"], 0, v["CV"] + up)
+        self.commit(mask, {"CV": cv, "_prev_cu": v["CU"], "Q": cv >= v["PV"]})
+
+
+class VCTD(VectorFB):
+    NAME = "CTD"
+    STATE = {"_prev_cd": np.bool_}
+
+    def execute(self, now, mask):
+        v, s = self.vars, self.state
+        down = ~v["LD"] & v["CD"] & ~s["_prev_cd"] & (v["CV"] > -32768)
+        cv = np.where(v["LD"], v["PV"], v["CV"] - down)
+        self.commit(mask, {"CV": cv, "_prev_cd": v["CD"], "Q": cv <= 0})
+
+
+class VCTUD(VectorFB):
+    NAME = "CTUD"
+    STATE = {"_prev_cu": np.bool_, "_prev_cd": np.bool_}
+
+    def execute(self, now, mask):
+        v, s = self.vars, self.state
+        up = v["CU"] & ~s["_prev_cu"]
+        down = v["CD"] & ~s["_prev_cd"]
+        inc = up & ~down & (v["CV"] < 32767)
+        dec = down & ~up & (v["CV"] > -32768)
+        cv = np.where(v["R"], 0, np.where(v["LD"], v["PV"], v["CV"] + inc - dec))
+        self.commit(mask, {"CV": cv, "_prev_cu": v["CU"], "_prev_cd": v["CD"],
+                           "QU": cv >= v["PV"], "QD": cv <= 0})
+
+
+class VSR(VectorFB):
+    NAME = "SR"
+
+    def execute(self, now, mask):
+        v = self.vars
+        self.commit(mask, {"Q1": v["S1"] | (~v["R"] & v["Q1"])})
+
+
+class VRS(VectorFB):
+    NAME = "RS"
+
+    def execute(self, now, mask):
+        v = self.vars
+        self.commit(mask, {"Q1": ~v["R1"] & (v["S"] | v["Q1"])})
+
+
+class VR_TRIG(VectorFB):
+    NAME = "R_TRIG"
+    STATE = {"_m": np.bool_}
+
+    def execute(self, now, mask):
+        v, s = self.vars, self.state
+        self.commit(mask, {"Q": v["CLK"] & ~s["_m"], "_m": v["CLK"]})
+
+
+class VF_TRIG(VectorFB):
+    NAME = "F_TRIG"
+    STATE = {"_m": np.bool_}
+
+    def execute(self, now, mask):
+        v, s = self.vars, self.state
+        self.commit(mask, {"Q": ~v["CLK"] & ~s["_m"], "_m": ~v["CLK"]})
+
+
+VECTOR_FBS = {cls.NAME: cls for cls in (VTON, VTOF, VTP, VCTU, VCTD, VCTUD, VSR, VRS, VR_TRIG, VF_TRIG)}
+
+
+# ---------------------------------------------------------------------------
+# Tradução
+# ---------------------------------------------------------------------------
+
+class _VectorCodeGen(_CodeGen):
+    """
+    Gera 'vec_scan(sim, v, g, img, lanes)' para a unidade principal.
+
+    Reaproveita as tabelas de símbolos e a inferência de tipos de _CodeGen;
+    os comandos recebem a máscara das lanes ativas ('None' = todas).
+    """
+
+    def __init__(self, program):
+        super().__init__(program)
+        self.enum_types = {t.name for t in program.unit.types if t.kind == "enum"}
+        self.enum_codes = {}
+        for t in program.unit.types:
+            if t.kind == "enum":
+                for value in t.values:
+                    self.enum_codes.setdefault(value, len(self.enum_codes))
+        self.addresses = set()
+
+    def generate(self):
+        pou = self.program.entry
+        self.pou = pou
+        self.symbols = self.pou_symbols(pou)
+        for decl in list(pou.decls) + list(self.program.unit.globals):
+            if decl.address:
+                self.addresses.add(decl.address)
+        self.emit(0, "def vec_scan(sim, v, g, img, lanes):")
+        self.emit(1, "pass")
+        self.block(pou.body, 1, "None")
+        return "\n".join(self.lines) + "\n"
+
+    @staticmethod
+    def check_enum_mix(left_kind, right_kind):
+        """
+        Enumerados viram códigos inteiros aqui, mas são valores distintos no
+        st_compiler: um nome declarado como variável tem precedência sobre o
+        valor de enumerado de mesmo nome (ex.: fault e FAULT), e o valor
+        BOOL/INT resultante nunca é igual a um enumerado. Misturar ENUM com
+        outro tipo iria comparar códigos com números, então o programa fica
+        no engine escalar.
+        """
+        if (left_kind == "ENUM") != (right_kind == "ENUM"):
+            raise VectorizeError("enumerado misturado com valor de outro tipo")
+
+    def kind_of(self, expr):
+        if expr.kind == "var":
+            sym = self.symbol(expr.name)
+            if sym is None and expr.name in self.enum_codes:
+                return "ENUM"
+            if sym is not None and sym["type"] in self.enum_types:
+                return "ENUM"
+        return super().kind_of(expr)
+
+    # -- expressões -----------------------------------------------------------
+
+    def expr(self, e, mask="None"):
+        k = e.kind
+        if k == "lit":
+            value = e.value
+            if isinstance(value, bool):
+                return f"np.bool_({value})"
+            if isinstance(value, (int, float)):
+                return repr(value)
+            raise VectorizeError("literal de texto")
+        if k == "var":
+            return self.read_var(e.name)
+        if k == "addr":
+            return self.read_address(e.address)
+        if k == "unop":
+            inner = self.expr(e.operand, mask)
+            return f"(~{inner})" if e.op == "NOT" else f"(-{inner})"
+        if k == "binop":
+            return self.vbinop(e, mask)
+        if k == "member":
+            return f"{self.fb_ref(e.obj)}.vars[{e.name!r}]"
+        if k == "bit":
+            return f"((({self.expr(e.obj, mask)}) >> {e.bit}) & 1 != 0)"
+        if k == "call":
+            return self.vcall(e, mask)
+        raise VectorizeError(f"expressão {k}")
+
+    def read_address(self, address):
+        self.addresses.add(address)
+        if address[2] == "X":
+            return f"img[{address!r}]"
+        return f"_word(img[{address!r}])"
+
+    def read_var(self, name):
+        sym = self.symbol(name)
+        if sym is None:
+            if name in self.enum_codes:
+                return repr(self.enum_codes[name])
+            raise VectorizeError(f"variável não declarada: {name}")
+        if sym["where"] == "located":
+            return self.read_address(sym["address"])
+        if sym["spec"].kind == "array_type":
+            raise VectorizeError("array")
+        container = "v" if name in self.symbols else "g"
+        return f"{container}[{name!r}]"
+
+    def fb_ref(self, obj):
+        """Instância de bloco padrão (apenas variáveis simples declaradas com o tipo do bloco)."""
+        type_name = self.static_type(obj)
+        if type_name not in STANDARD_FBS:
+            raise VectorizeError("membro de estrutura ou bloco do usuário")
+        return self.read_var(obj.name)
+
+    def vbinop(self, e, mask):
+        left, right = self.expr(e.left, mask), self.expr(e.right, mask)
+        op = e.op
+        if op in ("=", "<>", "<", ">", "<=", ">="):
+            self.check_enum_mix(self.kind_of(e.left), self.kind_of(e.right))
+            py = {"=": "==", "<>": "!="}.get(op, op)
+            return f"({left} {py} {right})"
+        if op in ("+", "-", "*"):
+            return f"({left} {op} {right})"
+        if op in ("AND", "OR", "XOR"):
+            return f"({left} {dict(AND='&', OR='|', XOR='^')[op]} {right})"
+        integer = self.kind_of(e.left) == "INT" and self.kind_of(e.right) == "INT"
+        if op == "/":
+            return f"_div({left}, {right}, {mask}, {integer})"
+        if op == "MOD":
+            return f"_mod({left}, {right}, {mask}, {integer})"
+        if op == "**":
+            return f"np.power(np.asarray({left}, dtype=np.float64), {right})"
+        raise VectorizeError(f"operador {op}")
+
+    def vcall(self, e, mask):
+        func = e.func
+        if func.kind != "var" or self.symbol(func.name) is not None:
+            raise VectorizeError("bloco funcional usado como expressão")
+        name = func.name
+        if name in self.program.pous:
+            raise VectorizeError("FUNCTION do usuário")
+        if any(arg_name is not None or output for arg_name, _, output in e.args):
+            raise VectorizeError("argumentos nomeados em função padrão")
+        args = ", ".join(self.expr(value, mask) for _, value, _ in e.args)
+        if name in _FUNCTIONS:
+            return f"FN[{name!r}]({args})"
+        target = conversion_target(name)
+        if target and _dtype(target) is not None and len(e.args) == 1:
+            return f"_vconvert({target!r}, {args})"
+        raise VectorizeError(f"função {name}")
+
+    def vcoerce_code(self, type_name, code, kind):
+        if type_name in self.enum_types or kind == "ENUM":
+            return code
+        if _dtype(type_name) is None:
+            raise VectorizeError(f"tipo {type_name}")
+        if type_name == "BOOL":
+            return code if kind == "BOOL" else f"_vcoerce('BOOL', {code})"
+        if type_name in INT_TYPES and kind == "INT":
+            return f"_wrap({type_name!r}, {code})"
+        if kind == _static_kind(type_name) and type_name not in INT_TYPES:
+            return code
+        return f"_vcoerce({type_name!r}, {code})"
+
+    # -- comandos -------------------------------------------------------------
+
+    def block(self, body, depth, mask):
+        for stmt in body:
+            self.stmt(stmt, depth, mask)
+
+    def vassign(self, target, code, kind, depth, mask):
+        k = target.kind
+        if k == "var":
+            sym = self.symbol(target.name)
+            if sym is None:
+                raise VectorizeError(f"variável não declarada: {target.name}")
+            if sym["where"] == "located":
+                self.vassign_address(sym["address"], code, kind, depth, mask)
+                return
+            dst = self.read_var(target.name)
+            self.emit(depth, f"_put({dst}, {self.vcoerce_code(sym['type'], code, kind)}, {mask})")
+        elif k == "addr":
+            self.vassign_address(target.address, code, kind, depth, mask)
+        elif k == "member":
+            fb = STANDARD_FBS.get(self.static_type(target.obj))
+            if fb is None or target.name not in fb.INPUTS:
+                raise VectorizeError("atribuição a membro")
+            type_name = fb.INPUTS[target.name]
+            self.emit(depth, f"_put({self.fb_ref(target.obj)}.vars[{target.name!r}], "
+                             f"{self.vcoerce_code(type_name, code, kind)}, {mask})")
+        else:
+            raise VectorizeError(f"atribuição a {k}")
+
+    def vassign_address(self, address, code, kind, depth, mask):
+        self.addresses.add(address)
+        type_name = address_type(address)
+        self.emit(depth, f"_put(img[{address!r}], {self.vcoerce_code(type_name, code, kind)}, {mask})")
+
+    def branch(self, depth, cond_code, mask, body):
+        """Executa body nas lanes em que cond vale; retorna o nome da máscara do restante."""
+        hit, rest = self.tmp("m"), self.tmp("r")
+        self.emit(depth, f"{hit} = _mask({cond_code}, {mask}, lanes)")
+        # Calculada antes do corpo, que pode alterar as variáveis da condição
+        self.emit(depth, f"{rest} = ~{hit}" if mask == "None" else f"{rest} = {mask} & ~{hit}")
+        if body:
+            self.emit(depth, f"if {hit}.any():")
+            self.block(body, depth + 1, hit)
+        return rest
+
+    def stmt(self, st, depth, mask):
+        k = st.kind
+        if k == "assign":
+            if st.target.kind == "var":
+                self.check_enum_mix(self.kind_of(st.target), self.kind_of(st.value))
+            self.vassign(st.target, self.expr(st.value, mask), self.kind_of(st.value), depth, mask)
+        elif k == "call_stmt":
+            self.vcall_stmt(st.call, depth, mask)
+        elif k == "if":
+            self.if_chain(list(st.branches), st.else_body, depth, mask)
+        elif k == "case":
+            selector = self.tmp("sel")
+            selector_kind = self.kind_of(st.selector)
+            for labels, _ in st.entries:
+                for label in labels:
+                    for bound in label[1:]:
+                        self.check_enum_mix(selector_kind, self.kind_of(bound))
+            self.emit(depth, f"{selector} = np.array({self.expr(st.selector, mask)})")
+            self.case_chain(selector, list(st.entries), st.else_body, depth, mask)
+        elif k == "for":
+            self.vfor(st, depth, mask)
+        else:
+            raise VectorizeError(f"comando {k}")
+
+    def if_chain(self, branches, else_body, depth, mask):
+        cond, body = branches[0]
+        rest = self.branch(depth, self.expr(cond, mask), mask, body)
+        if len(branches) == 1 and not else_body:
+            return
+        # ELSIF/ELSE: só nas lanes que ainda não entraram em um ramo
+        self.emit(depth, f"if {rest}.any():")
+        if len(branches) > 1:
+            self.if_chain(branches[1:], else_body, depth + 1, rest)
+        else:
+            self.block(else_body, depth + 1, rest)
+
+    def case_chain(self, selector, entries, else_body, depth, mask):
+        if not entries:
+            if else_body:
+                self.block(else_body, depth, mask)
+            return
+        labels, body = entries[0]
+        tests = []
+        for label in labels:
+            if label[0] == "value":
+                tests.append(f"({selector} == {self.expr(label[1], mask)})")
+            else:
+                tests.append(f"(({self.expr(label[1], mask)} <= {selector}) & ({selector} <= {self.expr(label[2], mask)}))")
+        rest = self.branch(depth, " | ".join(tests), mask, body)
+        if len(entries) > 1 or else_body:
+            self.emit(depth, f"if {rest}.any():")
+            self.case_chain(selector, entries[1:], else_body, depth + 1, rest)
+
+    def vfor(self, st, depth, mask):
+        # Só limites literais: o número de voltas é o mesmo em todas as lanes
+        bounds = [st.start, st.end] + ([st.step] if st.step is not None else [])
+        if any(b.kind != "lit" or not isinstance(b.value, int) or isinstance(b.value, bool) for b in bounds):
+            raise VectorizeError("FOR com limites não constantes")
+        if self._has_jumps(st.body):
+            raise VectorizeError("EXIT/CONTINUE/RETURN")
+        start, end = st.start.value, st.end.value
+        step = st.step.value if st.step is not None else 1
+        if step == 0:
+            raise VectorizeError("FOR com passo zero")
+        values = list(range(start, end + (1 if step > 0 else -1), step))
+        final = values[-1] + step if values else start
+        var = self.tmp("i")
+        sym = self.symbol(st.var)
+        if sym is None or _static_kind(sym["type"]) != "INT":
+            raise VectorizeError("variável de controle do FOR")
+        target = Node("var", st.line, name=st.var)
+        self.emit(depth, f"for {var} in {values!r}:")
+        self.vassign(target, var, "INT", depth + 1, mask)
+        self.block(st.body, depth + 1, mask)
+        self.vassign(target, repr(final), "INT", depth, mask)
+
+    def _has_jumps(self, body):
+        for st in body:
+            if st.kind in ("exit", "continue", "return"):
+                return True
+            for child in ("body", "else_body"):
+                if self._has_jumps(getattr(st, child, None) or []):
+                    return True
+            for _, sub in list(getattr(st, "branches", None) or []) + list(getattr(st, "entries", None) or []):
+                if self._has_jumps(sub):
+                    return True
+        return False
+
+    def vcall_stmt(self, call, depth, mask):
+        func = call.func
+        type_name = self.static_type(func) if func.kind == "var" else None
+        fb = STANDARD_FBS.get(type_name)
+        if fb is None:
+            if func.kind == "var" and self.symbol(func.name) is None:
+                # Função padrão usada como comando: sem efeito colateral
+                self.vcall(call, mask)
+                return
+            raise VectorizeError("chamada de bloco do usuário")
+
+        obj = self.tmp("fb")
+        self.emit(depth, f"{obj} = {self.read_var(func.name)}")
+        order = list(fb.INPUTS)
+        positional = 0
+        outputs = []
+        for name, value, output in call.args:
+            if output:
+                if name not in fb.OUTPUTS:
+                    raise VectorizeError(f"saída inexistente: {name}")
+                outputs.append((name, value))
+                continue
+            if name is None:
+                if positional >= len(order):
+                    raise VectorizeError("argumentos posicionais demais")
+                name = order[positional]
+                positional += 1
+            if name not in fb.INPUTS:
+                raise VectorizeError(f"parâmetro inexistente: {name}")
+            code = self.vcoerce_code(fb.INPUTS[name], self.expr(value, mask), self.kind_of(value))
+            self.emit(depth, f"_put({obj}.vars[{name!r}], {code}, {mask})")
+        self.emit(depth, f"{obj}.execute(sim.clock_ms, {mask})")
+        for name, target in outputs:
+            self.vassign(target, f"{obj}.vars[{name!r}]", _static_kind(fb.OUTPUTS[name]), depth, mask)
+
+
+class VectorProgram:
+    """Função vetorizada de um programa ST (unidade principal)."""
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.program = compiled.program
+        gen = _VectorCodeGen(self.program)
+        self.python_source = gen.generate()
+        self.addresses = sorted(gen.addresses)
+        self.enum_codes = gen.enum_codes
+        self.enum_types = gen.enum_types
+        self.enum_names = np.array(list(gen.enum_codes) or [""], dtype=object)
+        digest = hashlib.sha256(self.program.source.encode("utf-8")).hexdigest()[:12]
+        code = compile(self.python_source, f"<st-vec:{digest}>", "exec")
+        self.namespace = {
+            "np": np, "FN": _FUNCTIONS,
+            "_put": _put, "_mask": _mask, "_word": _word,
+            "_div": _div, "_mod": _mod, "_wrap": _wrap,
+            "_vcoerce": _vcoerce, "_vconvert": _vconvert,
+        }
+        exec(code, self.namespace)
+        self.scan = self.namespace["vec_scan"]
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+CACHE_SIZE = 256
+
+
+def vectorize_source(source):
+    """
+    Traduz um código ST para a forma vetorizada (cache LRU pelo SHA-256 do
+    fonte). Retorna o CompiledProgram escalar quando o programa usa
+    construções sem tradução vetorial.
+    """
+    key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    with _cache_lock:
+        program = _cache.get(key)
+        if program is not None:
+            _cache.move_to_end(key)
+            return program
+    compiled = compile_source(source)
+    try:
+        program = VectorProgram(compiled)
+        # Instancia uma vez para conferir se todas as variáveis vetorizam
+        VectorSimulation(program, 1)
+    except VectorizeError:
+        program = compiled
+    with _cache_lock:
+        _cache[key] = program
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return program
+
+
+class VectorSimulation:
+    """
+    Estado de um programa em 'lanes' execuções independentes.
+
+    Os valores iniciais vêm de uma Simulation escalar; cada variável vira um
+    array com um valor por lane. 'image' pode ser passada pronta (linhas dos
+    arrays (B, T) do BatchSimulator).
+    """
+
+    def __init__(self, vprogram, lanes, scan_cycle_ms=None, image=None):
+        base = Simulation(vprogram.program, scan_cycle_ms)
+        self.vprogram = vprogram
+        self.lanes = lanes
+        self.scan_cycle_ms = base.scan_cycle_ms
+        self.clock_ms = 0
+        self.scans = 0
+        self.image = {} if image is None else image
+        for address in vprogram.addresses:
+            initial = base.image.get(address, 0)
+            if address in self.image:
+                self.image[address][...] = initial
+            else:
+                self.image[address] = np.full(lanes, initial, dtype=image_dtype(address))
+        self.main_scope = base.main
+        self.vars = self._vectorize(base.main)
+        self.globals = self._vectorize(base.globals)
+
+    def _vectorize(self, scope):
+        arrays = {}
+        for name, value in scope.vars.items():
+            type_name = scope.types.get(name)
+            if isinstance(value, StandardFB):
+                arrays[name] = VECTOR_FBS[value.NAME](value, self.lanes)
+            elif isinstance(value, str) and value in self.vprogram.enum_codes:
+                arrays[name] = np.full(self.lanes, self.vprogram.enum_codes[value], dtype=np.int64)
+            elif isinstance(value, (bool, int, float)) and _dtype(type_name) is not None:
+                arrays[name] = np.full(self.lanes, value, dtype=_dtype(type_name))
+            else:
+                raise VectorizeError(f"variável {name} sem representação vetorial")
+        return arrays
+
+    def scan(self):
+        try:
+            self.vprogram.scan(self, self.vars, self.globals, self.image, self.lanes)
+        except STRuntimeError:
+            raise
+        except (KeyError, TypeError, AttributeError, IndexError, ValueError,
+                ZeroDivisionError, OverflowError, FloatingPointError) as e:
+            raise STRuntimeError(f"erro na execução: {type(e).__name__}: {e}") from e
+        self.scans += 1
+        self.clock_ms += self.scan_cycle_ms
+
+    def run_for(self, duration_ms):
+        scans = max(1, -(-int(duration_ms) // self.scan_cycle_ms))
+        for _ in range(scans):
+            self.scan()
+        return scans
+
+    def _storage(self, name):
+        name = name.upper()
+        address = self.main_scope.located.get(name)
+        if address is not None:
+            return self.image.get(address)
+        if name in self.vars:
+            return self.vars[name]
+        return self.globals.get(name)
+
+    def read_var(self, name):
+        """Valores de uma variável em todas as lanes (None se não declarada)."""
+        storage = self._storage(name)
+        if not isinstance(storage, np.ndarray):
+            return None
+        if self.main_scope.types.get(name.upper()) in self.vprogram.enum_types:
+            return self.vprogram.enum_names[storage]
+        return storage
+
+    def write_var(self, name, values, given=None):
+        """Escreve nas lanes marcadas em 'given'; False se a variável não existe."""
+        storage = self._storage(name)
+        if not isinstance(storage, np.ndarray):
+            return False
+        np.copyto(storage, values, casting="unsafe", where=True if given is None else given)
+        return True
+
+
+# ---------------------------------------------------------------------------
+# Execução em lote
+# ---------------------------------------------------------------------------
+
+def exhaustive_inputs(keys):
+    """Todas as 2^n combinações booleanas das chaves: array (2^n, n), primeira chave mais significativa."""
+    n = len(keys)
+    rows = np.arange(1 << n, dtype=np.int64)[:, None]
+    return ((rows >> np.arange(n - 1, -1, -1)) & 1).astype(np.bool_)
+
+
+class _Traces:
+    """Vetores de teste convertidos para arrays por passo: valores e máscara 'dado' por chave."""
+
+    def __init__(self, traces, outputs=()):
+        if not traces:
+            raise ValueError("nenhum vetor de teste")
+        self.count = len(traces)
+        self.steps = len(traces[0])
+        waits = [step.get("wait", 0.1) for step in traces[0]]
+        for trace in traces:
+            if len(trace) != self.steps or [step.get("wait", 0.1) for step in trace] != waits:
+                raise ValueError("todos os vetores de teste precisam ter os mesmos passos e esperas")
+        self.waits_ms = [w * 1000 for w in waits]
+        self.traces = traces
+
+        self.input_keys = sorted({str(k) for trace in traces for step in trace for k in step["inputs"]})
+        output_keys = {str(k) for trace in traces for step in trace for k in step["expected_outputs"]}
+        self.output_keys = sorted(output_keys | {str(k) for k in outputs})
+        self.inputs = {key: self._table(key, "inputs") for key in self.input_keys}
+        self.expected = {key: self._table(key, "expected_outputs") for key in self.output_keys}
+
+    def _table(self, key, field):
+        values = [[0] * self.steps for _ in range(self.count)]
+        given = np.zeros((self.count, self.steps), dtype=np.bool_)
+        for t, trace in enumerate(self.traces):
+            for s, step in enumerate(trace):
+                items = step[field]
+                if key in items:
+                    values[t][s] = items[key]
+                    given[t, s] = True
+        return np.array(values), given
+
+    @classmethod
+    def from_arrays(cls, input_keys, values, outputs, wait=0.1):
+        """Um passo por vetor, entradas já em array (T, n): evita montar dicionários."""
+        self = cls.__new__(cls)
+        self.count, self.steps = len(values), 1
+        self.waits_ms = [wait * 1000]
+        self.traces = None
+        self.input_keys = [str(k) for k in input_keys]
+        self.output_keys = [str(k) for k in outputs]
+        given = np.ones((self.count, 1), dtype=np.bool_)
+        self.inputs = {key: (values[:, [i]], given) for i, key in enumerate(self.input_keys)}
+        self.expected = {key: (np.zeros((self.count, 1), dtype=object), np.zeros((self.count, 1), dtype=np.bool_))
+                         for key in self.output_keys}
+        return self
+
+
+class BatchResult:
+    """
+    Saídas de B candidatos × T vetores × S passos.
+
+    got[chave] é um array (B, T, S) (dtype object; None = variável
+    inexistente), correct um array (B, T, S, K) e checked (T, S, K) marca as
+    saídas esperadas de cada passo. errors[b] traz o erro de análise ou
+    execução do candidato b (seus resultados ficam vazios).
+    """
+
+    def __init__(self, traces, count):
+        self.traces = traces
+        self.keys = traces.output_keys
+        shape = (count, traces.count, traces.steps)
+        self.got = {key: np.full(shape, None, dtype=object) for key in self.keys}
+        self.correct = np.zeros(shape + (len(self.keys),), dtype=np.bool_)
+        self.checked = np.stack([traces.expected[key][1] for key in self.keys], axis=-1) \
+            if self.keys else np.zeros((traces.count, traces.steps, 0), dtype=np.bool_)
+        self.errors = [None] * count
+        self.engines = [None] * count
+        self.step_times_s = [0.0] * traces.steps
+
+    def scores(self):
+        """Fração de saídas corretas por candidato (como evaluator.score_results sobre todos os vetores)."""
+        total = self.checked.sum()
+        if not total:
+            return np.zeros(len(self.errors))
+        ok = (self.correct & self.checked).sum(axis=(1, 2, 3))
+        scores = ok / total
+        scores[[e is not None for e in self.errors]] = 0.0
+        return scores
+
+    def results(self, b, t=0):
+        """Resultados do vetor t do candidato b no formato de SimulatedRunner.execute."""
+        if self.errors[b] is not None or self.traces.traces is None:
+            return []
+        results = []
+        for s, step in enumerate(self.traces.traces[t]):
+            expected = step["expected_outputs"]
+            got = {k: to_python(self.got[str(k)][b, t, s]) for k in expected}
+            results.append({
+                "inputs": step["inputs"],
+                "expected": expected,
+                "got": got,
+                "correct": {k: bool(self.correct[b, t, s, self.keys.index(str(k))]) for k in expected},
+                "settle_time_s": round(self.step_times_s[s], 4),
+            })
+        return results
+
+
+def to_python(value):
+    """Escalar numpy (np.bool_, np.int64...) como o valor Python equivalente; outros valores inalterados."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class BatchSimulator:
+    """
+    Executa B candidatos contra T vetores de teste de uma vez.
+
+    Os candidatos vetorizáveis compartilham arrays (B, T) da imagem de E/S:
+    cada passo aplica as entradas de todos os vetores com uma atribuição,
+    roda os scans de cada candidato sobre as T lanes e lê as saídas de
+    todos de uma vez. Os demais rodam no engine escalar, vetor por vetor.
+    """
+
+    def __init__(self, scan_cycle_ms=None):
+        self.scan_cycle_ms = scan_cycle_ms
+        self._scalar = SimulatedRunner(scan_cycle_ms=scan_cycle_ms)
+
+    def compile_source(self, st_source):
+        """Programa vetorizado (ou CompiledProgram escalar); erros de sintaxe viram CompilationError."""
+        program = self._scalar.compile_source(st_source)
+        vectorized = vectorize_source(st_source)
+        return vectorized if isinstance(vectorized, VectorProgram) else program
+
+    def run(self, sources, traces, outputs=(), vectorize=True):
+        """
+        Executa os códigos ST 'sources' contra 'traces' (listas de passos no
+        formato dos testes das tarefas, todas com os mesmos waits).
+        'outputs' acrescenta chaves lidas mesmo sem valor esperado; com
+        vectorize=False todos os candidatos usam o engine escalar.
+        """
+        return self._run(sources, _Traces(traces, outputs), vectorize)
+
+    def parity(self, source, traces, outputs=()):
+        """
+        Compara o engine vetorizado com o compilado (escalar) nos mesmos traços.
+
+        Returns:
+            lista de (vetor, passo, chave) em que as saídas divergem; vazia
+            quando concordam ou quando o código não vetoriza. Um erro em só
+            um dos engines conta como divergência em (-1, -1, None).
+        """
+        vector = self.run([source], traces, outputs)
+        if vector.engines[0] != "vectorized":
+            return []
+        scalar = self.run([source], traces, outputs, vectorize=False)
+        if (vector.errors[0] is None) != (scalar.errors[0] is None):
+            return [(-1, -1, None)]
+        mismatches = []
+        for key in vector.keys:
+            differs = vector.got[key][0] != scalar.got[key][0]
+            mismatches += [(int(t), int(s), key) for t, s in zip(*np.nonzero(differs))]
+        return mismatches
+
+    def truth_table(self, sources, input_keys, output_keys, wait=0.1):
+        """
+        Avalia todas as combinações das entradas booleanas em um passo só.
+        Retorna (combinações (2^n, n), BatchResult) com got[chave] (B, 2^n, 1).
+        """
+        combos = exhaustive_inputs(list(input_keys))
+        return combos, self._run(sources, _Traces.from_arrays(input_keys, combos, output_keys, wait))
+
+    def _run(self, sources, traces, vectorize=True):
+        count = len(sources)
+        result = BatchResult(traces, count)
+        programs = [None] * count
+        for b, source in enumerate(sources):
+            try:
+                programs[b] = self.compile_source(source) if vectorize else self._scalar.compile_source(source)
+            except CompilationError as e:
+                result.errors[b] = e.stderr or str(e)
+                result.engines[b] = None
+
+        vector = [b for b in range(count) if isinstance(programs[b], VectorProgram)]
+        scalar = [b for b in range(count) if isinstance(programs[b], CompiledProgram)]
+        self._run_vector(programs, vector, traces, result)
+        self._run_scalar(programs, scalar, traces, result)
+        return result
+
+    def _run_vector(self, programs, indices, traces, result):
+        if not indices:
+            return
+        lanes = traces.count
+        addresses = set()
+        for b in indices:
+            addresses.update(programs[b].addresses)
+        for key in traces.input_keys:
+            address = key_address(key, "input")
+            if address:
+                addresses.add(address)
+        for key in traces.output_keys:
+            address = key_address(key, "output")
+            if address:
+                addresses.add(address)
+        # Imagem compartilhada: uma linha por candidato, uma coluna por vetor
+        image = {a: np.zeros((len(indices), lanes), dtype=image_dtype(a)) for a in sorted(addresses)}
+        sims = {}
+        for row, b in enumerate(indices):
+            sims[b] = VectorSimulation(programs[b], lanes, self.scan_cycle_ms,
+                                       image={a: arr[row] for a, arr in image.items()})
+            result.engines[b] = "vectorized"
+        rows = {b: row for row, b in enumerate(indices)}
+        alive = list(indices)
+
+        for s in range(traces.steps):
+            step_start = time.perf_counter()
+            for key in traces.input_keys:
+                values, given = traces.inputs[key]
+                values, given = values[:, s], given[:, s]
+                address = key_address(key, "input")
+                if address:
+                    np.copyto(image[address], values, casting="unsafe", where=given)
+                    continue
+                for b in alive:
+                    # Variável com outro nome no código gerado: o passo falha na comparação
+                    sims[b].write_var(key, values, given)
+
+            for b in list(alive):
+                try:
+                    sims[b].run_for(traces.waits_ms[s])
+                except STRuntimeError as e:
+                    result.errors[b] = str(e)
+                    alive.remove(b)
+
+            for k, key in enumerate(traces.output_keys):
+                expected, checked = traces.expected[key]
+                expected = expected[:, s]
+                address = key_address(key, "output")
+                if address:
+                    values = image[address][[rows[b] for b in alive]]
+                    for i, b in enumerate(alive):
+                        self._store(result, b, s, k, key, values[i], expected)
+                    continue
+                for b in alive:
+                    self._store(result, b, s, k, key, sims[b].read_var(key), expected)
+            result.step_times_s[s] = time.perf_counter() - step_start
+
+    @staticmethod
+    def _store(result, b, s, k, key, values, expected):
+        if values is None:
+            return
+        result.got[key][b, :, s] = values
+        result.correct[b, :, s, k] = np.asarray(values == expected, dtype=np.bool_)
+
+    def _run_scalar(self, programs, indices, traces, result):
+        for b in indices:
+            result.engines[b] = "compiled"
+            for t in range(traces.count):
+                if traces.traces is not None:
+                    trace = self._read_all(traces.traces[t], traces.output_keys)
+                else:
+                    trace = self._single_step(traces, t)
+                try:
+                    steps = self._scalar.execute(programs[b], trace)
+                except STRuntimeError as e:
+                    result.errors[b] = str(e)
+                    break
+                for s, step in enumerate(steps):
+                    for k, key in enumerate(traces.output_keys):
+                        result.got[key][b, t, s] = step["got"][key]
+                        result.correct[b, t, s, k] = step["correct"][key]
+
+    @staticmethod
+    def _read_all(trace, output_keys):
+        """Passos com todas as chaves de saída (inclusive as de 'outputs', sem valor esperado: None)."""
+        steps = []
+        for step in trace:
+            expected = {str(k): v for k, v in step["expected_outputs"].items()}
+            steps.append(dict(step, expected_outputs={key: expected.get(key) for key in output_keys}))
+        return steps
+
+    @staticmethod
+    def _single_step(traces, t):
+        inputs = {key: to_python(traces.inputs[key][0][t, 0]) for key in traces.input_keys}
+        # Chaves só lidas (sem valor esperado): o valor obtido vai em 'got'
+        return [{"inputs": inputs, "expected_outputs": {key: None for key in traces.output_keys},
+                 "wait": traces.waits_ms[0] / 1000}]
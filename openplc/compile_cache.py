@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from openplc.sandbox import prepare_sandbox
+
+
+def normalize_st_source(source):
+    """
+    Normaliza um código ST para a chave do cache: remove comentários (* *)
+    e //, e colapsa espaços em branco. Strings entre aspas são preservadas.
+    """
+    out = []
+    i = 0
+    n = len(source)
+    while i < n:
+        ch = source[i]
+        if ch in ("'", '"'):
+            end = source.find(ch, i + 1)
+            end = n if end < 0 else end + 1
+            out.append(source[i:end])
+            i = end
+        elif source.startswith("(*", i):
+            end = source.find("*)", i + 2)
+            i = n if end < 0 else end + 2
+            out.append(" ")
+        elif source.startswith("//", i):
+            end = source.find("\n", i)
+            i = n if end < 0 else end
+        else:
+            out.append(ch)
+            i += 1
+    return re.sub(r"\s+", " ", "".join(out)).strip()
+
+
+def compiler_fingerprint(spec):
+    """
+    Identifica a versão do compilador: caminho, tamanho e mtime do binário e
+    do script de compilação, mais a saída de 'iec2c -v' quando disponível.
+    """
+    parts = [spec["mode"]]
+    for key in ("compiler_path", "compile_script"):
+        path = spec.get(key)
+        if not path:
+            continue
+        try:
+            st = os.stat(path)
+            parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+
+    if spec["mode"] == "iec2c":
+        try:
+            version = subprocess.run(
+                [spec["compiler_path"], "-v"],
+                capture_output=True, text=True, timeout=5, check=False
+            )
+            parts.append((version.stdout or version.stderr).strip())
+        except (OSError, subprocess.SubprocessError):
+            pass
+
+    return "|".join(parts)
+
+
+class CompileCache:
+    """
+    Cache em disco de resultados de compilação.
+
+    A chave é o SHA-256 do código ST normalizado mais a identificação do
+    compilador. Cada entrada guarda returncode, stdout/stderr e os arquivos
+    gerados pelo compilador em <cache_dir>/<hash>/. Acima do limite de
+    tamanho, as entradas usadas há mais tempo são removidas primeiro.
+    """
+
+    def __init__(self, cache_dir, spec, max_size_mb=500):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.spec = spec
+        self.fingerprint = compiler_fingerprint(spec)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._total_size = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """Lista (mtime, tamanho, diretório) de cada entrada do cache."""
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            meta_path = entry_dir / "result.json"
+            if not meta_path.exists():
+                continue
+            size = sum(p.stat().st_size for p in entry_dir.rglob("*") if p.is_file())
+            entries.append((meta_path.stat().st_mtime, size, entry_dir))
+        return entries
+
+    def make_key(self, st_source):
+        raw = self.fingerprint + "\n" + normalize_st_source(st_source)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, st_source):
+        """
+        Retorna um compile_result equivalente ao de compile_in_sandbox (com um
+        sandbox novo contendo program.st e os artefatos), ou None.
+        """
+        entry_dir = self.cache_dir / self.make_key(st_source)
+        meta_path = entry_dir / "result.json"
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        sandbox, program = prepare_sandbox(self.spec, st_source)
+        for rel in meta["artifacts"]:
+            target = sandbox / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(entry_dir / "artifacts" / rel, target)
+
+        # Atualiza o mtime para a política LRU
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return {
+            "returncode": meta["returncode"],
+            "stdout": meta["stdout"],
+            "stderr": meta["stderr"],
+            "sandbox": str(sandbox),
+            "program_path": str(program),
+            "artifacts": meta["artifacts"],
+            "cached": True,
+        }
+
+    def put(self, st_source, compile_result):
+        """Guarda o resultado de uma compilação (antes de o sandbox ser removido)."""
+        if compile_result.get("cached"):
+            return
+        key = self.make_key(st_source)
+        entry_dir = self.cache_dir / key
+        tmp_dir = self.cache_dir / f".{key}.{threading.get_ident()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        sandbox = Path(compile_result["sandbox"])
+        for rel in compile_result["artifacts"]:
+            target = tmp_dir / "artifacts" / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(sandbox / rel, target)
+
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "returncode": compile_result["returncode"],
+            "stdout": compile_result["stdout"],
+            "stderr": compile_result["stderr"],
+            "artifacts": compile_result["artifacts"],
+            "created_at": time.time(),
+        }
+        (tmp_dir / "result.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Outra thread gravou a mesma entrada primeiro
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        entry_size = sum(p.stat().st_size for p in entry_dir.rglob("*") if p.is_file())
+        with self._lock:
+            self.writes += 1
+            self._total_size += entry_size
+            over_limit = self.max_size_bytes is not None and self._total_size > self.max_size_bytes
+        if over_limit:
+            self._evict()
+
+    def _evict(self):
+        """Remove as entradas menos usadas até voltar ao limite de tamanho."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, entry_dir in entries:
+            if total <= self.max_size_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+        with self._lock:
+            self._total_size = total
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": True,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
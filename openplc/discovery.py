@@ -0,0 +1,303 @@
+"""
+Descoberta da instalação do OpenPLC (diretório base, compilador, webserver.py,
+script de compilação e lib/ do MatIEC) com cache em disco.
+
+A busca percorre dezenas de caminhos candidatos; o resultado fica em um
+arquivo JSON (OPENPLC_DISCOVERY_CACHE ou ~/.cache/plc_code_with_ai/
+openplc_discovery.json) junto com o mtime de cada caminho que decidiu a
+busca: os componentes encontrados, o diretório base e os diretórios base
+candidatos. Na próxima execução basta conferir esses mtimes (alguns stat)
+para reaproveitar o resultado; qualquer mudança refaz a busca.
+
+Usado pelo OpenPLCRunner e pelo find_openplc.py.
+"""
+import hashlib
+import json
+import os
+import platform
+from pathlib import Path
+
+import logs
+
+CACHE_VERSION = 1
+IS_WINDOWS = platform.system() == "Windows"
+
+
+def _exe(name):
+    return f"{name}.exe" if IS_WINDOWS else name
+
+
+def default_cache_path():
+    env = os.environ.get("OPENPLC_DISCOVERY_CACHE")
+    if env:
+        return Path(env)
+    return Path.home() / ".cache" / "plc_code_with_ai" / "openplc_discovery.json"
+
+
+# -- caminhos candidatos -------------------------------------------------------
+
+def base_candidates(include_editor=False):
+    """Diretórios onde uma instalação do OpenPLC costuma ficar (em ordem de prioridade)."""
+    if IS_WINDOWS:
+        username = os.environ.get("USERNAME", "Matheus")
+        paths = [
+            Path(os.environ.get("OPENPLC_PATH", "")),
+            Path("C:/OpenPLC_Runtime/home") / username / "OpenPLC_v3",  # Webserver rodando
+            Path("C:/OpenPLC_Runtime/home/Matheus/OpenPLC_v3"),  # Caminho específico mencionado
+            Path("C:/OpenPLC_Runtime"),  # Instalação comum do Runtime
+            Path("C:/OpenPLC"),
+            Path("C:/OpenPLC_v3"),
+            Path("C:/Program Files/OpenPLC"),
+            Path("C:/Program Files/OpenPLC_Runtime"),
+            Path("C:/Program Files (x86)/OpenPLC"),
+            Path("C:/Program Files (x86)/OpenPLC_Runtime"),
+            Path.home() / "OpenPLC",
+            Path.home() / "OpenPLC_Runtime",
+            Path.home() / "Documents" / "OpenPLC",
+            Path(".") / "OpenPLC",  # Pasta atual
+        ]
+        if include_editor:
+            paths += [
+                Path("C:/OpenPLC_Editor"),
+                Path("C:/Program Files/OpenPLC_Editor"),
+                Path("C:/Program Files (x86)/OpenPLC_Editor"),
+                Path.home() / "OpenPLC_Editor",
+            ]
+    else:
+        paths = [
+            Path(os.environ.get("OPENPLC_PATH", "")),
+            Path("/usr/local/openplc"),
+            Path("/opt/openplc"),
+            Path("/usr/openplc"),
+            Path.home() / "openplc",
+            Path.home() / "OpenPLC",
+            Path(".") / "openplc",  # Pasta atual
+        ]
+    return paths
+
+
+def is_installation(path):
+    """Diretório com runtime, compilador ou MatIEC do OpenPLC."""
+    runtime_names = [_exe("OpenPLC_Runtime"), _exe("openplc_runtime"), _exe("runtime")]
+    for name in runtime_names:
+        if (path / name).exists() or (path / "runtime" / name).exists():
+            return True
+    return (path / "compiler" / _exe("openplc")).exists() or (path / "webserver" / _exe("iec2c")).exists()
+
+
+def compiler_candidates(base):
+    compiler_name, matiec_name = _exe("openplc"), _exe("iec2c")
+    paths = [
+        # Estrutura padrão OpenPLC_v3
+        base / "compiler" / compiler_name,
+        base / "webserver" / "core" / "matiec" / matiec_name,
+        base / "webserver" / matiec_name,
+        base / "matiec" / matiec_name,
+        # Compilador na raiz
+        base / compiler_name,
+        base / matiec_name,
+        # Editor pode ter o compilador
+        base / "editor" / "compiler" / compiler_name,
+        base / "editor" / compiler_name,
+        base / "editor" / "bin" / compiler_name,
+        base / "editor" / "bin" / matiec_name,
+        base / "editor" / "tools" / compiler_name,
+        base / "editor" / "tools" / matiec_name,
+    ]
+    if IS_WINDOWS:
+        username = os.environ.get("USERNAME", "Matheus")
+        paths += [
+            # Caminho do webserver rodando
+            Path(f"C:/OpenPLC_Runtime/home/{username}/OpenPLC_v3/webserver/iec2c.exe"),
+            Path(f"C:/OpenPLC_Runtime/home/{username}/OpenPLC_v3/webserver/core/matiec/iec2c.exe"),
+            Path("C:/OpenPLC_Runtime/home/Matheus/OpenPLC_v3/webserver/iec2c.exe"),
+            Path("C:/OpenPLC_Runtime/home/Matheus/OpenPLC_v3/webserver/core/matiec/iec2c.exe"),
+            # Outros caminhos comuns
+            Path("C:/OpenPLC_v3/webserver/iec2c.exe"),
+            Path("C:/OpenPLC_v3/webserver/core/matiec/iec2c.exe"),
+            Path.home() / "OpenPLC_Editor" / "matiec" / "iec2c.exe",
+            Path("C:/OpenPLC_Editor/matiec/iec2c.exe"),
+            Path("C:/Program Files/OpenPLC_v3/webserver/iec2c.exe"),
+        ]
+    # Diretórios adjacentes (Editor pode estar em pasta separada)
+    paths += [
+        base.parent / "OpenPLC_Editor" / "compiler" / compiler_name,
+        base.parent / "OpenPLC_Editor" / compiler_name,
+        base.parent / "OpenPLC_Editor" / "matiec" / matiec_name,
+        base.parent / "OpenPLC_v3" / "webserver" / matiec_name,
+        base.parent / "OpenPLC_v3" / "webserver" / "core" / "matiec" / matiec_name,
+    ]
+    return paths
+
+
+def webserver_candidates(base):
+    paths = [
+        base / "webserver" / "webserver.py",
+        base / "webserver.py",
+        base / "webserver" / "main.py",
+        base / "main.py",
+    ]
+    if IS_WINDOWS:
+        username = os.environ.get("USERNAME", "Matheus")
+        paths += [
+            Path(f"C:/OpenPLC_Runtime/home/{username}/OpenPLC_v3/webserver/webserver.py"),
+            Path("C:/OpenPLC_Runtime/home/Matheus/OpenPLC_v3/webserver/webserver.py"),
+        ]
+    return paths
+
+
+def compile_script_candidates(base):
+    return [
+        base / "scripts" / "compile_program.sh",
+        base / "webserver" / "scripts" / "compile_program.sh",
+        base / "scripts" / "compile_program.bat",
+        base / "webserver" / "scripts" / "compile_program.bat",
+    ]
+
+
+def lib_candidates(compiler, base):
+    """Onde procurar lib/ieclib.txt do MatIEC."""
+    compiler_dir = compiler.parent
+    return [
+        compiler_dir / "lib",
+        compiler_dir.parent / "lib",
+        compiler_dir.parent.parent / "lib",
+        base / "webserver" / "core" / "matiec" / "lib",
+        base / "webserver" / "lib",
+        base / "lib",
+    ]
+
+
+def first_existing(paths):
+    for path in paths:
+        if path.exists():
+            return path
+    return None
+
+
+def scan_components(base):
+    """Todos os componentes encontrados em uma instalação (relatório do find_openplc.py)."""
+    components = {"Runtime": [], "Compiler": [], "Editor": [], "MatIEC": []}
+    runtime_names = ["openplc_runtime.exe", "openplc_runtime", "runtime.exe", "runtime", "OpenPLC_Runtime.exe"]
+    compiler_names = ["openplc.exe", "openplc", "compiler.exe", "compiler"]
+    matiec_names = ["iec2c.exe", "iec2c", "matiec.exe", "matiec"]
+
+    for name in runtime_names:
+        for folder in ("runtime", "", "webserver", "bin"):
+            path = base / folder / name if folder else base / name
+            if path.exists():
+                components["Runtime"].append(path)
+    for name in compiler_names:
+        for folder in ("compiler", "", "editor/compiler", "editor"):
+            path = base / folder / name if folder else base / name
+            if path.exists():
+                components["Compiler"].append(path)
+    for name in matiec_names:
+        for folder in ("webserver/core/matiec", "webserver", "matiec", ""):
+            path = base / folder / name if folder else base / name
+            if path.exists():
+                components["MatIEC"].append(path)
+
+    for path in (base / "editor", base / "OpenPLC_Editor.exe", base / "editor.exe"):
+        if not path.exists():
+            continue
+        components["Editor"].append(path)
+        if path.is_dir():
+            # Compilador dentro do editor
+            for name in compiler_names + matiec_names:
+                for folder in ("compiler", "", "bin", "tools"):
+                    comp_path = path / folder / name if folder else path / name
+                    if comp_path.exists():
+                        kind = "MatIEC" if "iec2c" in name.lower() or "matiec" in name.lower() else "Compiler"
+                        components[kind].append(comp_path)
+    return components
+
+
+# -- descoberta com cache ---------------------------------------------------------
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _search(openplc_path, compiler_path, runtime_path):
+    """Busca completa. Retorna (resultado, caminhos cujo mtime valida o resultado)."""
+    stamped = []
+    if openplc_path:
+        base = Path(openplc_path)
+    else:
+        candidates = base_candidates()
+        stamped += candidates
+        base = next((p for p in candidates if p.is_dir() and is_installation(p)), None)
+        if base is None:
+            return {"openplc_path": None, "searched": [str(p) for p in candidates]}, stamped
+
+    compiler = Path(compiler_path) if compiler_path and Path(compiler_path).exists() else None
+    compiler = compiler or first_existing(compiler_candidates(base))
+    webserver = Path(runtime_path) if runtime_path and Path(runtime_path).exists() else None
+    webserver = webserver or first_existing(webserver_candidates(base))
+    script = first_existing(compile_script_candidates(base))
+    lib = None
+    if compiler is not None:
+        lib = next((p for p in lib_candidates(compiler, base) if (p / "ieclib.txt").exists()), None)
+
+    stamped += [base, base / "webserver", compiler, webserver, script, lib]
+    result = {
+        "openplc_path": str(base),
+        "compiler_path": str(compiler) if compiler else None,
+        "webserver_script": str(webserver) if webserver else None,
+        "compile_script": str(script) if script else None,
+        "lib_path": str(lib) if lib else None,
+    }
+    return result, [p for p in stamped if p is not None]
+
+
+def discover(openplc_path=None, compiler_path=None, runtime_path=None, cache_path=None, refresh=False):
+    """
+    Localiza a instalação do OpenPLC, reaproveitando o cache quando válido.
+
+    Returns:
+        dict com openplc_path, compiler_path, webserver_script, compile_script
+        e lib_path (strings ou None), e "cached" indicando se veio do cache.
+        Se nenhuma instalação for encontrada, openplc_path é None e
+        "searched" lista os diretórios testados.
+    """
+    cache_path = Path(cache_path) if cache_path else default_cache_path()
+    # Caminhos relativos (Path(".") / "openplc") dependem do diretório atual
+    key = hashlib.sha256(json.dumps([
+        CACHE_VERSION, platform.system(), os.getcwd(), os.environ.get("OPENPLC_PATH", ""),
+        str(openplc_path or ""), str(compiler_path or ""), str(runtime_path or ""),
+    ]).encode("utf-8")).hexdigest()
+
+    entries = _load(cache_path)
+    entry = entries.get(key)
+    if not refresh and entry and all(_mtime(path) == mtime for path, mtime in entry["stamps"].items()):
+        return dict(entry["result"], cached=True)
+
+    result, stamped = _search(openplc_path, compiler_path, runtime_path)
+    entries[key] = {"result": result, "stamps": {str(p): _mtime(p) for p in stamped}}
+    _save(cache_path, entries)
+    return dict(result, cached=False)
+
+
+def _load(cache_path):
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get("entries", {}) if data.get("version") == CACHE_VERSION else {}
+
+
+def _save(cache_path, entries):
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "entries": entries}, f, indent=2)
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        # Sem cache a descoberta continua funcionando, só mais lenta
+        logs.warning(f"Não foi possível gravar o cache de descoberta do OpenPLC ({cache_path}): {e}")
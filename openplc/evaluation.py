@@ -0,0 +1,306 @@
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from evaluator import score_results
+from openplc.address_map import AddressMap
+from openplc.modbus_io import ModbusIOPlan
+from openplc.runner import CompilationError
+from openplc.sandbox import cleanup_sandbox, compile_in_sandbox
+import logs
+import tracing
+
+
+class EvaluationPipeline:
+    """
+    Estágio automático de avaliação: compila cada .st gerado no OpenPLC,
+    executa os testes da tarefa e calcula o score com evaluator.score_results.
+
+    As compilações rodam em um pool de processos (uma por núcleo), cada uma
+    em seu próprio sandbox temporário; a instalação no runtime e a execução
+    dos testes ficam em uma única thread, pois o runtime é compartilhado.
+    Com um RuntimePool, há uma thread de execução por runtime do pool.
+    Assim a compilação das respostas já prontas começa enquanto outros
+    modelos ainda respondem. O resultado de cada (tarefa, modelo) é salvo em
+    results/evaluations/<tarefa>/<modelo>.json.
+
+    Com um TestExpander e backend em processo, cada código também é executado
+    nos testes ampliados da tarefa (expanded_score), no BatchSimulator.
+    """
+
+    def __init__(self, runner, results_dir, compile_workers=None, runtime_pool=None, test_expander=None):
+        self.runner = runner
+        self.runtime_pool = runtime_pool
+        self.test_expander = test_expander
+        self._batch = None
+        self.evaluations_dir = Path(results_dir) / "evaluations"
+        # Backends em processo (SimulatedRunner) não usam compilador externo
+        self.in_process = getattr(runner, "in_process", False)
+        self.compile_spec = None if self.in_process else runner.compile_spec()
+        if self.in_process:
+            compile_workers = 0
+        elif not self.compile_spec["parallel_safe"]:
+            # compile_program.sh compila dentro da instalação: sem paralelismo
+            compile_workers = 1
+        self.compile_workers = (os.cpu_count() or 1) if compile_workers is None else compile_workers
+        self._pool = None
+        self._queue = queue.Queue()
+        self._results = {}
+        self._io_plans = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        if self.compile_workers:
+            # spawn: o pool é criado com threads já rodando (log, avaliação), e um fork herdaria seus locks
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.compile_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        # Com um pool de runtimes, uma thread de execução por runtime
+        executors = self.runtime_pool.size if self.runtime_pool else 1
+        for i in range(executors):
+            thread = threading.Thread(target=self._worker, name=f"evaluation-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logs.info(f"Avaliação: {self.compile_workers} processos de compilação, {executors} execução(ões) simultânea(s)")
+        return self
+
+    def evaluation_path(self, task_name, st_path):
+        return self.evaluations_dir / task_name / f"{Path(st_path).stem}.json"
+
+    def submit(self, task_name, model_name, st_path, test_cases, source=None):
+        """
+        Envia o código para compilação; a execução é enfileirada quando ela termina.
+
+        source: código já em memória (ex.: recém-gerado ou lido do pacote de
+        respostas); se omitido, é lido de st_path.
+        """
+        job = {
+            "task": task_name,
+            "model": model_name,
+            "file": Path(st_path),
+            "tests": test_cases,
+            "submitted_at": time.perf_counter(),
+        }
+        try:
+            st_source = source if source is not None else job["file"].read_text(encoding="utf-8")
+        except OSError as e:
+            job["future"] = None
+            job["error"] = f"Falha ao ler {job['file']}: {e}"
+            self._queue.put(job)
+            return
+
+        job["source"] = st_source
+        if self.in_process:
+            # Análise e execução acontecem na thread de avaliação
+            job["future"] = None
+            self._on_compiled(job)
+            return
+
+        # Endereços das chaves dos testes neste programa; o código compilado é o instrumentado
+        job["address_map"] = AddressMap(st_source, test_cases)
+        st_source = job["source"] = job["address_map"].source
+
+        cache = self.runner.compile_cache
+        cached = cache.get(st_source) if cache else None
+        if cached:
+            # Código já compilado antes: dispensa o pool de processos
+            job["future"] = None
+            job["compile_result"] = cached
+            self._on_compiled(job)
+            return
+
+        future = self._pool.submit(compile_in_sandbox, self.compile_spec, st_source)
+        job["future"] = future
+        future.add_done_callback(lambda _: self._on_compiled(job))
+
+    def _on_compiled(self, job):
+        job["compiled_at"] = time.perf_counter()
+        self._queue.put(job)
+
+    def close(self):
+        """Aguarda o fim das avaliações pendentes e retorna {tarefa: {modelo: resultado}}."""
+        if self._pool:
+            # Após o shutdown todos os callbacks já enfileiraram seus jobs
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        with self._lock:
+            return {task: dict(models) for task, models in self._results.items()}
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                with tracing.context(task=job["task"], model=job["model"]):
+                    evaluation = self.evaluate(job)
+            except Exception as e:
+                # Falha inesperada não pode derrubar o estágio inteiro
+                logs.error(f"Falha ao avaliar {job['task']}/{job['model']}: {e}")
+                evaluation = self._base_record(job)
+                evaluation["error"] = str(e)
+
+            self._save(job, evaluation)
+            with self._lock:
+                self._results.setdefault(job["task"], {})[job["model"]] = evaluation
+
+    def _base_record(self, job):
+        return {
+            "task": job["task"],
+            "model": job["model"],
+            "file": str(job["file"]),
+            "compiles": False,
+            "executes": False,
+            "score": 0.0,
+            "results": [],
+            "error": None,
+            "compile_time_s": None,
+            "compile_queue_s": None,
+            "compile_cached": False,
+            "execute_time_s": None,
+            "expanded_score": None,
+            "expanded_steps": None,
+        }
+
+    def evaluate(self, job):
+        """Confere a compilação feita no pool, instala o programa e executa os testes."""
+        record = self._base_record(job)
+        logs.debug(f"Avaliando {job['task']} / {job['model']}")
+
+        if self.in_process and "source" in job:
+            return self._evaluate_in_process(job, record)
+
+        if job.get("future") is None and "compile_result" not in job:
+            record["error"] = job.get("error")
+            return record
+
+        compile_result = None
+        try:
+            compile_result = job.get("compile_result") or job["future"].result()
+            return self._evaluate_compiled(job, record, compile_result)
+        finally:
+            # O sandbox é removido mesmo se o processo de compilação ou o cache falharem
+            cleanup_sandbox(compile_result)
+
+    def _evaluate_compiled(self, job, record, compile_result):
+        """Confere o resultado da compilação e executa os testes no runtime."""
+        record["compile_cached"] = bool(compile_result.get("cached"))
+        if self.runner.compile_cache:
+            self.runner.compile_cache.put(job["source"], compile_result)
+        # Duração medida no processo de compilação; o restante desde o envio é
+        # a espera por um processo livre do pool (registrada à parte)
+        elapsed = job["compiled_at"] - job["submitted_at"]
+        compile_s = 0.0 if record["compile_cached"] else min(compile_result.get("compile_time_s", elapsed), elapsed)
+        compile_start = job["compiled_at"] - compile_s
+        record["compile_time_s"] = round(compile_s, 3)
+        record["compile_queue_s"] = round(elapsed - compile_s, 3)
+        tracing.record("compile_queue", job["submitted_at"], compile_start)
+        tracing.record("compile", compile_start, job["compiled_at"], cached=record["compile_cached"])
+        try:
+            self.runner.check_compile_result(compile_result)
+        except CompilationError as e:
+            record["error"] = e.stderr or e.stdout or str(e)
+            logs.warning(f"{job['task']} / {job['model']}: não compila")
+            return record
+        record["compiles"] = True
+
+        start = time.perf_counter()
+        try:
+            with tracing.span("execute"):
+                if self.runtime_pool:
+                    results = self.runtime_pool.evaluate(
+                        compile_result, job["tests"], job["address_map"].program_id, self._io_plan(job)
+                    )
+                else:
+                    self.runner.install_program(compile_result)
+                    results = self.runner.execute_tests(job["tests"], self._io_plan(job))
+        except Exception as e:
+            record["execute_time_s"] = round(time.perf_counter() - start, 3)
+            record["error"] = str(e)
+            logs.warning(f"{job['task']} / {job['model']}: falha na execução: {e}")
+            return record
+        record["execute_time_s"] = round(time.perf_counter() - start, 3)
+
+        record["results"] = results
+        record["score"] = score_results(results)
+        record["executes"] = bool(results) and record["score"] == 1.0
+        logs.ok(f"{job['task']} / {job['model']}: score {record['score']:.2f}")
+        return record
+
+    def _evaluate_in_process(self, job, record):
+        """Avaliação com backend em processo: análise do ST e execução simulada."""
+        start = time.perf_counter()
+        try:
+            with tracing.span("compile", in_process=True):
+                program = self.runner.compile_source(job["source"])
+        except CompilationError as e:
+            record["compile_time_s"] = round(time.perf_counter() - start, 3)
+            record["error"] = e.stderr or e.stdout or str(e)
+            logs.warning(f"{job['task']} / {job['model']}: não compila")
+            return record
+        record["compile_time_s"] = round(time.perf_counter() - start, 3)
+        record["compiles"] = True
+
+        start = time.perf_counter()
+        try:
+            with tracing.span("execute", in_process=True):
+                results = self.runner.execute(program, job["tests"])
+        except Exception as e:
+            record["execute_time_s"] = round(time.perf_counter() - start, 3)
+            record["error"] = str(e)
+            logs.warning(f"{job['task']} / {job['model']}: falha na execução: {e}")
+            return record
+        record["execute_time_s"] = round(time.perf_counter() - start, 3)
+
+        record["results"] = results
+        record["score"] = score_results(results)
+        record["executes"] = bool(results) and record["score"] == 1.0
+        self._evaluate_expanded(job, record)
+        logs.ok(f"{job['task']} / {job['model']}: score {record['score']:.2f}")
+        return record
+
+    def _evaluate_expanded(self, job, record):
+        """Score do código nos testes ampliados da tarefa (todos os vetores de uma vez)."""
+        expanded = self.test_expander.get(job["task"]) if self.test_expander else None
+        if not expanded:
+            return
+        if self._batch is None:
+            from openplc.batch_sim import BatchSimulator
+            self._batch = BatchSimulator(getattr(self.runner, "scan_cycle_ms", None))
+        result = self._batch.run([job["source"]], expanded["traces"])
+        record["expanded_score"] = round(float(result.scores()[0]), 4)
+        record["expanded_steps"] = sum(len(trace) for trace in expanded["traces"])
+        if result.errors[0]:
+            record["error"] = record["error"] or result.errors[0]
+
+    def _io_plan(self, job):
+        """
+        Plano de E/S Modbus da tarefa, calculado na primeira avaliação dela.
+
+        Programas cujas chaves resolvem para os mesmos endereços (o caso comum:
+        variáveis expostas na faixa reservada) compartilham o plano.
+        """
+        address_map = job["address_map"]
+        plan_key = (job["task"], address_map.signature)
+        with self._lock:
+            plan = self._io_plans.get(plan_key)
+            if plan is None:
+                plan = self._io_plans[plan_key] = ModbusIOPlan(job["tests"], address_map)
+        return plan
+
+    def _save(self, job, evaluation):
+        out_path = self.evaluation_path(job["task"], job["file"])
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(evaluation, f, indent=2, ensure_ascii=False)
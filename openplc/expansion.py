@@ -0,0 +1,229 @@
+"""
+Ampliação dos testes das tarefas a partir de implementações de referência.
+
+Os JSON das tarefas trazem poucos passos escritos à mão. O TestExpander gera
+vetores de teste a mais e calcula as saídas esperadas executando a
+referência (tasks/reference/<tarefa>.st) no BatchSimulator:
+
+  truth_table - tarefas combinacionais com entradas booleanas: todas as 2^n
+                combinações, um vetor de um passo por combinação;
+  random      - demais tarefas: T traços aleatórios de L passos cada, com as
+                esperas sorteadas entre as usadas nos testes da tarefa.
+
+Cada vetor começa do estado inicial do programa. O resultado fica em cache
+por tarefa (results/cache/tests/<tarefa>.json) e só é refeito quando a
+referência, os testes da tarefa ou os parâmetros mudam.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from openplc.batch_sim import BatchSimulator, exhaustive_inputs, to_python
+
+import logs
+
+
+class TestExpander:
+    """Gera, valida e guarda em cache os testes ampliados de cada tarefa."""
+
+    VERSION = 2
+
+    def __init__(self, reference_dir, cache_dir=None, traces=64, steps=32, max_truth_bits=12, seed=0):
+        self.reference_dir = Path(reference_dir)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.traces = traces
+        self.steps = steps
+        self.max_truth_bits = max_truth_bits
+        self.seed = seed
+        self.simulator = BatchSimulator()
+        self._expanded = {}
+        self._lock = threading.Lock()
+
+    def get(self, task_name):
+        """Testes ampliados já gerados para a tarefa (ou None)."""
+        with self._lock:
+            return self._expanded.get(task_name)
+
+    def expand(self, task_name, task):
+        """
+        Retorna {"mode", "input_keys", "output_keys", "traces", ...} para a
+        tarefa, ou None quando não há referência ou ela não passa nos testes
+        escritos à mão.
+        """
+        reference_path = self.reference_dir / f"{task_name}.st"
+        if not reference_path.exists():
+            return None
+        reference = reference_path.read_text(encoding="utf-8")
+        options = task.get("expansion", {})
+        key = self._cache_key(reference, task["tests"], options)
+
+        expanded = self._load(task_name, key)
+        if expanded is None:
+            expanded = self._generate(task_name, task, reference, options)
+            if expanded is not None:
+                expanded["key"] = key
+                self._save(task_name, expanded)
+        with self._lock:
+            self._expanded[task_name] = expanded
+        return expanded
+
+    # -- geração --------------------------------------------------------------
+
+    def _generate(self, task_name, task, reference, options):
+        tests = task["tests"]
+        check = self.simulator.run([reference], [tests])
+        if check.errors[0] is not None or check.scores()[0] < 1.0:
+            logs.warning(f"{task_name}: referência não passa nos testes da tarefa; testes não ampliados")
+            return None
+
+        inputs = self._input_kinds(tests)
+        output_keys = sorted({str(k) for step in tests for k in step["expected_outputs"]})
+        waits = sorted({step.get("wait", 0.1) for step in tests})
+        # Semente por tarefa: a mesma tarefa gera sempre os mesmos traços
+        digest = hashlib.sha256(f"{self.seed}:{task_name}".encode("utf-8")).digest()
+        rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+        traces = self._random_traces(rng, inputs, waits, options)
+        # As saídas esperadas vêm do engine vetorizado: confere com o compilado nos mesmos traços
+        vectorize = True
+        mismatches = self.simulator.parity(reference, traces, outputs=output_keys)
+        if mismatches:
+            logs.warning(f"{task_name}: engine vetorizado diverge do compilado em {len(mismatches)} passos; "
+                         f"usando o engine compilado")
+            vectorize = False
+        result = self.simulator.run([reference], traces, outputs=output_keys, vectorize=vectorize)
+        if result.errors[0] is not None:
+            logs.warning(f"{task_name}: referência falhou nos traços aleatórios: {result.errors[0]}")
+            return None
+
+        mode = options.get("mode")
+        boolean = all(kind == "bool" for kind in inputs.values())
+        if mode is None:
+            combinational = self._is_combinational(result, traces, list(inputs), output_keys)
+            mode = "truth_table" if combinational and boolean and len(inputs) <= self.max_truth_bits else "random"
+        if mode == "truth_table":
+            if not boolean:
+                raise ValueError(f"{task_name}: tabela verdade exige entradas booleanas")
+            traces = self._truth_table(list(inputs), options.get("wait", waits[0]))
+            result = self.simulator.run([reference], traces, outputs=output_keys, vectorize=vectorize)
+
+        for t, trace in enumerate(traces):
+            for s, step in enumerate(trace):
+                step["expected_outputs"] = {key: to_python(result.got[key][0, t, s]) for key in output_keys}
+                if any(value is None for value in step["expected_outputs"].values()):
+                    logs.warning(f"{task_name}: saída sem valor no traço {t}, passo {s}; testes não ampliados")
+                    return None
+
+        # Os testes gerados precisam aprovar a própria referência antes de irem para o cache
+        final = self.simulator.run([reference], traces, vectorize=vectorize)
+        if final.errors[0] is not None or final.scores()[0] < 1.0:
+            logs.warning(f"{task_name}: referência não passa nos testes ampliados "
+                         f"(score {final.scores()[0]:.2f}); testes não ampliados")
+            return None
+        steps = sum(len(trace) for trace in traces)
+        logs.info(f"{task_name}: {steps} passos gerados ({mode}, {len(traces)} vetores)")
+        return {
+            "task": task_name,
+            "mode": mode,
+            "input_keys": list(inputs),
+            "output_keys": output_keys,
+            "traces": traces,
+        }
+
+    @staticmethod
+    def _input_kinds(tests):
+        """Tipo de cada entrada pelos valores dos testes: 'bool' ou a faixa (mín, máx) dos inteiros."""
+        kinds = {}
+        for step in tests:
+            for key, value in step["inputs"].items():
+                key = str(key)
+                if isinstance(value, bool):
+                    kinds.setdefault(key, "bool")
+                else:
+                    low, high = kinds.get(key) if isinstance(kinds.get(key), tuple) else (value, value)
+                    kinds[key] = (min(low, value), max(high, value))
+        return dict(sorted(kinds.items()))
+
+    def _random_traces(self, rng, inputs, waits, options):
+        count = options.get("traces", self.traces)
+        length = options.get("steps", self.steps)
+        # As esperas de cada passo são as mesmas em todos os traços (exigência do BatchSimulator)
+        step_waits = [float(w) for w in rng.choice(waits, size=length)]
+        columns = {}
+        for key, kind in inputs.items():
+            if kind == "bool":
+                columns[key] = rng.random((count, length)) < 0.5
+            else:
+                low, high = kind
+                low, high = min(0, low), min(32767, max(100, 2 * high))
+                columns[key] = rng.integers(low, high + 1, size=(count, length))
+        return [
+            [
+                {
+                    "inputs": {key: to_python(columns[key][t, s]) for key in inputs},
+                    "expected_outputs": {},
+                    "wait": step_waits[s],
+                }
+                for s in range(length)
+            ]
+            for t in range(count)
+        ]
+
+    @staticmethod
+    def _truth_table(input_keys, wait):
+        combos = exhaustive_inputs(input_keys)
+        return [
+            [{"inputs": {key: bool(v) for key, v in zip(input_keys, row)}, "expected_outputs": {}, "wait": wait}]
+            for row in combos
+        ]
+
+    @staticmethod
+    def _is_combinational(result, traces, input_keys, output_keys):
+        """Combinacional se a mesma combinação de entradas sempre produziu as mesmas saídas."""
+        seen = {}
+        for t, trace in enumerate(traces):
+            for s, step in enumerate(trace):
+                state = tuple(step["inputs"][key] for key in input_keys)
+                outputs = tuple(to_python(result.got[key][0, t, s]) for key in output_keys)
+                if seen.setdefault(state, outputs) != outputs:
+                    return False
+        return True
+
+    # -- cache ----------------------------------------------------------------
+
+    def _cache_key(self, reference, tests, options):
+        payload = json.dumps({
+            "version": self.VERSION,
+            "reference": reference,
+            "tests": tests,
+            "options": options,
+            "params": [self.traces, self.steps, self.max_truth_bits, self.seed],
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, task_name):
+        return self.cache_dir / f"{task_name}.json"
+
+    def _load(self, task_name, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(task_name), encoding="utf-8") as f:
+                expanded = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return expanded if expanded.get("key") == key else None
+
+    def _save(self, task_name, expanded):
+        if not self.cache_dir:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(task_name)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(expanded, f, ensure_ascii=False)
+        os.replace(tmp, path)
@@ -0,0 +1,279 @@
+import re
+import struct
+from collections import namedtuple
+
+
+# Tipos de endereço Modbus usados pelos testes
+COIL = "coil"                  # %QX (entradas %IX expostas ao teste em %QX90.0+)
+DISCRETE_INPUT = "discrete"    # %IX, somente leitura
+HOLDING_REGISTER = "register"  # %QW/%MW/%MD (entradas %IW expostas ao teste em %MW900+)
+INPUT_REGISTER = "input"       # %IW, somente leitura
+
+# Endereço Modbus de uma chave: tipo, endereço inicial, nº de registradores
+# (1 ou 2) e tipo IEC (None = valor bruto do registrador)
+Location = namedtuple("Location", ["kind", "address", "width", "type_name"])
+
+SIGNED_TYPES = {"INT", "SINT", "DINT", "TIME"}
+
+# Tabela Modbus do OpenPLC para as áreas de memória
+MEMORY_WORD_BASE = 1024         # %MW0 = holding register 1024
+MEMORY_DWORD_BASE = 2048        # %MD0 = holding registers 2048/2049
+
+_ADDRESS = re.compile(r"^%([IQM])([XBWDL]?)(\d+)(?:\.(\d+))?$", re.IGNORECASE)
+_KEY = re.compile(r"^(A|DI)(\d+)$", re.IGNORECASE)
+
+
+def key_address(key, direction):
+    """
+    Endereço direto de uma chave dos testes, ou None para nomes de variáveis.
+
+    Entradas numéricas ('0', '1'...) são %IX, saídas numéricas %QX (bit n =
+    %IXn/8.n%8), 'A<n>' é %IW<n> (entrada) ou %QW<n> (saída) e 'DI<n>' é %IX.
+    """
+    key = str(key)
+    if key.isdigit():
+        n = int(key)
+        area = "I" if direction == "input" else "Q"
+        return f"%{area}X{n // 8}.{n % 8}"
+    match = _KEY.match(key)
+    if match:
+        n = int(match.group(2))
+        if match.group(1).upper() == "DI":
+            return f"%IX{n // 8}.{n % 8}"
+        return f"%IW{n}" if direction == "input" else f"%QW{n}"
+    return None
+
+
+def address_location(address, type_name=None):
+    """Location Modbus de um endereço direto do OpenPLC (%IX0.1, %QW2, %MD5...)."""
+    match = _ADDRESS.match(address)
+    if not match:
+        return None
+    area, size, index, bit = match.group(1).upper(), (match.group(2) or "X").upper(), int(match.group(3)), match.group(4)
+    if size == "X":
+        position = index * 8 + int(bit or 0)
+        kind = DISCRETE_INPUT if area == "I" else COIL if area == "Q" else None
+        return Location(kind, position, 1, "BOOL") if kind else None
+    if size == "W":
+        if area == "I":
+            return Location(INPUT_REGISTER, index, 1, type_name or "INT")
+        base = 0 if area == "Q" else MEMORY_WORD_BASE
+        return Location(HOLDING_REGISTER, base + index, 1, type_name or "INT")
+    if size == "D" and area == "M":
+        return Location(HOLDING_REGISTER, MEMORY_DWORD_BASE + 2 * index, 2, type_name or "DINT")
+    return None
+
+
+def parse_key(key, direction="output"):
+    """
+    Converte uma chave dos testes em (tipo, endereço).
+
+    Mesma convenção do simulador (key_address): '0', '1'... são %IX nas
+    entradas e %QX (coils) nas saídas, 'A0', 'A1'... são %IW (input
+    registers) nas entradas e %QW (holding registers) nas saídas e 'DI0'...
+    entradas discretas. Nomes de variáveis (ex.: 'input1') não têm endereço
+    Modbus próprio: são resolvidos pelo openplc.address_map.AddressMap.
+    """
+    location = key_location(key, direction)
+    if location is None:
+        raise ValueError(f"Chave de teste sem endereço Modbus: {key!r}")
+    return location.kind, location.address
+
+
+def key_location(key, direction="output"):
+    """Location de uma chave numérica/A<n>/DI<n>, ou None para nomes de variáveis."""
+    address = key_address(key, direction)
+    if address is None:
+        return None
+    location = address_location(address)
+    # Chaves diretas levam o valor bruto do registrador (sem conversão de tipo)
+    return location._replace(type_name=None)
+
+
+def encode_value(value, location):
+    """Palavras de 16 bits a escrever para o valor no tipo da location."""
+    if location.type_name == "REAL":
+        high, low = struct.unpack(">HH", struct.pack(">f", float(value)))
+        return [high, low]
+    value = int(value)
+    if location.width == 2:
+        value &= 0xFFFFFFFF
+        return [value >> 16, value & 0xFFFF]
+    return [value & 0xFFFF if location.type_name else value]
+
+
+def decode_value(words, location):
+    """Valor lido dos registradores, convertido para o tipo da location."""
+    if location.type_name is None:
+        return words[0]
+    if location.width == 2:
+        raw = (words[0] << 16) | words[1]
+        if location.type_name == "REAL":
+            return struct.unpack(">f", struct.pack(">I", raw))[0]
+        return raw - (1 << 32) if location.type_name in SIGNED_TYPES and raw & 0x80000000 else raw
+    raw = words[0]
+    return raw - (1 << 16) if location.type_name in SIGNED_TYPES and raw & 0x8000 else raw
+
+
+def group_addresses(addresses, max_gap=0):
+    """
+    Agrupa endereços em faixas contíguas [(início, quantidade)].
+
+    Com max_gap > 0, faixas separadas por até max_gap endereços são unidas
+    (útil para leituras, onde ler alguns endereços a mais é inofensivo).
+    """
+    groups = []
+    for addr in sorted(set(addresses)):
+        if groups and addr - (groups[-1][0] + groups[-1][1]) <= max_gap:
+            start = groups[-1][0]
+            groups[-1] = (start, addr - start + 1)
+        else:
+            groups.append((addr, 1))
+    return groups
+
+
+def _check(result, action):
+    # Verifica erro (compatível com versões antigas e novas do pymodbus)
+    if hasattr(result, 'isError') and result.isError():
+        raise RuntimeError(f"Erro ao {action}: {result}")
+    elif hasattr(result, 'is_error') and result.is_error():
+        raise RuntimeError(f"Erro ao {action}: {result}")
+    return result
+
+
+def _bits(result, count, action):
+    if hasattr(result, 'bits') and len(result.bits) >= count:
+        return list(result.bits[:count])
+    if hasattr(result, 'getBit'):
+        return [result.getBit(i) for i in range(count)]
+    raise RuntimeError(f"Não foi possível extrair os bits ao {action}")
+
+
+class ModbusIOPlan:
+    """
+    Plano de E/S Modbus de uma tarefa, calculado uma única vez a partir dos testes.
+
+    Para cada passo, as entradas são agrupadas em faixas contíguas escritas
+    com um único write_coils/write_registers, e as saídas esperadas em faixas
+    lidas com um único read_coils/read_discrete_inputs/read_holding_registers/
+    read_input_registers. Um passo com N entradas e M saídas passa de N+M
+    requisições para uma por faixa.
+
+    Com address_map (openplc.address_map.AddressMap), cada chave usa o
+    endereço resolvido para o programa: nomes de variáveis e entradas
+    %IX/%IW (que o Modbus não escreve) expostas em endereços graváveis. Sem
+    ele, só chaves numéricas, A<n> e DI<n> que caem em áreas graváveis são
+    aceitas como entrada. Chaves que o programa não usa não são escritas e
+    são lidas como None.
+    """
+
+    # Buracos de até 8 bits / 2 registradores são lidos junto com a faixa
+    READ_GAPS = {COIL: 8, DISCRETE_INPUT: 8, HOLDING_REGISTER: 2, INPUT_REGISTER: 2}
+
+    def __init__(self, test_cases, address_map=None):
+        self.address_map = address_map
+        self.steps = [self._plan_step(step) for step in test_cases]
+
+    def _location(self, key, direction):
+        if self.address_map is not None:
+            return self.address_map.location(key, direction)
+        kind, addr = parse_key(key, direction)
+        return Location(kind, addr, 1, None)
+
+    def _plan_step(self, step):
+        writes = []
+        by_kind = {}
+        for key in step.get("inputs", {}):
+            location = self._location(key, "input")
+            if location is None:
+                continue
+            if location.kind in (DISCRETE_INPUT, INPUT_REGISTER):
+                raise ValueError(f"Entrada {key!r} é somente leitura ({location.kind})")
+            by_kind.setdefault(location.kind, {})[location.address] = (key, location)
+        for kind, keys in by_kind.items():
+            slots = [addr + i for addr, (_, loc) in keys.items() for i in range(loc.width)]
+            for start, count in group_addresses(slots):
+                entries = [keys[a] for a in sorted(keys) if start <= a < start + count]
+                writes.append((kind, start, count, entries))
+
+        reads = []
+        missing = []
+        by_kind = {}
+        for key in step.get("expected_outputs", {}):
+            location = self._location(key, "output")
+            if location is None:
+                missing.append(key)
+                continue
+            by_kind.setdefault(location.kind, {})[location.address] = (key, location)
+        for kind, keys in by_kind.items():
+            slots = [addr + i for addr, (_, loc) in keys.items() for i in range(loc.width)]
+            for start, count in group_addresses(slots, self.READ_GAPS[kind]):
+                offsets = {key: (addr - start, loc) for addr, (key, loc) in keys.items() if start <= addr < start + count}
+                reads.append((kind, start, count, offsets))
+
+        return {"writes": writes, "reads": reads, "missing": missing}
+
+    @property
+    def requests_per_run(self):
+        """Total de requisições Modbus para executar todos os passos."""
+        return sum(len(s["writes"]) + len(s["reads"]) for s in self.steps)
+
+    def _write_requests(self, client, step_index, inputs):
+        """Requisições de escrita do passo (chamadas do cliente e descrição para erros)."""
+        for kind, start, count, entries in self.steps[step_index]["writes"]:
+            if kind == COIL:
+                yield (client.write_coils(start, [bool(inputs[key]) for key, _ in entries]),
+                       f"escrever coils {start}..{start + count - 1}")
+            else:
+                values = [word for key, loc in entries for word in encode_value(inputs[key], loc)]
+                yield client.write_registers(start, values), f"escrever registradores {start}..{start + count - 1}"
+
+    def _read_requests(self, client, step_index):
+        """Requisições de leitura do passo, com a faixa e os offsets de cada chave."""
+        for kind, start, count, offsets in self.steps[step_index]["reads"]:
+            if kind == COIL:
+                request = client.read_coils(start, count=count)
+            elif kind == DISCRETE_INPUT:
+                request = client.read_discrete_inputs(start, count=count)
+            elif kind == INPUT_REGISTER:
+                request = client.read_input_registers(start, count=count)
+            else:
+                request = client.read_holding_registers(start, count=count)
+            yield request, (kind, start, count, offsets)
+
+    @staticmethod
+    def _collect(out_states, result, read):
+        kind, start, count, offsets = read
+        action = f"ler {kind} {start}..{start + count - 1}"
+        _check(result, action)
+        if kind in (COIL, DISCRETE_INPUT):
+            values = _bits(result, count, action)
+            for key, (offset, _) in offsets.items():
+                out_states[key] = values[offset]
+        else:
+            values = list(result.registers)
+            for key, (offset, loc) in offsets.items():
+                out_states[key] = decode_value(values[offset:offset + loc.width], loc)
+
+    def write_inputs(self, client, step_index, inputs):
+        for result, action in self._write_requests(client, step_index, inputs):
+            _check(result, action)
+
+    def read_outputs(self, client, step_index):
+        """Lê as saídas esperadas do passo e retorna {chave: valor}."""
+        out_states = dict.fromkeys(self.steps[step_index]["missing"])
+        for result, read in self._read_requests(client, step_index):
+            self._collect(out_states, result, read)
+        return out_states
+
+    # Mesmas requisições com o cliente assíncrono do pymodbus (as chamadas retornam corrotinas)
+
+    async def write_inputs_async(self, client, step_index, inputs):
+        for request, action in self._write_requests(client, step_index, inputs):
+            _check(await request, action)
+
+    async def read_outputs_async(self, client, step_index):
+        out_states = dict.fromkeys(self.steps[step_index]["missing"])
+        for request, read in self._read_requests(client, step_index):
+            self._collect(out_states, await request, read)
+        return out_states
@@ -0,0 +1,46 @@
+import socket
+import threading
+
+
+class PortAllocator:
+    """
+    Reserva portas TCP livres e não privilegiadas (>= 1024) para runtimes.
+
+    As portas são procuradas a partir de 'start', pulando as já entregues
+    por este alocador e as que estiverem em uso no host (teste de bind em
+    127.0.0.1). Assim vários runtimes rodam lado a lado sem precisar de root.
+    """
+
+    def __init__(self, start=5020, end=65535):
+        if start < 1024:
+            raise ValueError(f"Porta inicial {start} é privilegiada (use >= 1024)")
+        self.start = start
+        self.end = end
+        self._next = start
+        self._reserved = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_free(port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.bind(("127.0.0.1", port))
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.close()
+
+    def allocate(self):
+        with self._lock:
+            for _ in range(self.end - self.start + 1):
+                port = self._next
+                self._next = port + 1 if port < self.end else self.start
+                if port not in self._reserved and self.is_free(port):
+                    self._reserved.add(port)
+                    return port
+        raise RuntimeError(f"Nenhuma porta livre entre {self.start} e {self.end}")
+
+    def release(self, port):
+        with self._lock:
+            self._reserved.discard(port)
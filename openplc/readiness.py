@@ -0,0 +1,101 @@
+"""
+Espera pelo runtime OpenPLC pronto, sem polling de segundo em segundo.
+
+O OutputWatcher lê a saída do processo filho em uma thread (copiando-a para
+o log, se houver) e sinaliza quando aparece uma das marcas de "escutando"
+do webserver/runtime. wait_ready() tenta conectar nas portas com back-off
+exponencial curto (5 ms dobrando até 200 ms) e é acordado na hora pela
+marca, então a partida custa o tempo real do runtime, não múltiplos de 1 s.
+"""
+import collections
+import socket
+import threading
+import time
+
+# Linhas que o OpenPLC escreve quando começa a aceitar conexões
+LISTENING_MARKERS = (
+    "listening on port",    # servidor Modbus/DNP3 do runtime
+    "running on http",      # Flask (webserver.py)
+)
+
+FIRST_DELAY = 0.005
+MAX_DELAY = 0.2
+CONNECT_TIMEOUT = 0.05
+
+
+class OutputWatcher:
+    """Consome a saída do processo (evita PIPE cheio) e detecta as marcas de prontidão."""
+
+    def __init__(self, stream, log_file=None, markers=LISTENING_MARKERS, tail_lines=50):
+        self.stream = stream
+        self.log_file = log_file
+        self.markers = tuple(m.lower() for m in markers)
+        self.listening = threading.Event()
+        self.marker_line = None
+        self._tail = collections.deque(maxlen=tail_lines)
+        self._thread = threading.Thread(target=self._read, name="openplc-output", daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        for raw in iter(self.stream.readline, b""):
+            line = raw.decode("utf-8", errors="ignore").rstrip()
+            self._tail.append(line)
+            if self.log_file:
+                try:
+                    self.log_file.write(raw)
+                    self.log_file.flush()
+                except (OSError, ValueError):
+                    # Log fechado pelo stop(): continua só drenando a saída
+                    self.log_file = None
+            if not self.listening.is_set() and any(m in line.lower() for m in self.markers):
+                self.marker_line = line
+                self.listening.set()
+        self.stream.close()
+
+    def tail(self, lines=20):
+        return "\n".join(list(self._tail)[-lines:])
+
+
+def port_open(port, timeout=CONNECT_TIMEOUT):
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wait_ready(process, ports, timeout, watcher=None):
+    """
+    Espera alguma das portas aceitar conexão.
+
+    Returns:
+        segundos desde a chamada até a porta responder (tempo de partida).
+
+    Raises:
+        RuntimeError: o processo terminou antes de ficar pronto.
+        TimeoutError: nenhuma porta respondeu dentro de timeout.
+    """
+    start = time.perf_counter()
+    deadline = start + timeout
+    delay = FIRST_DELAY
+    woke_on_marker = False
+    while True:
+        if process.poll() is not None:
+            output = watcher.tail() if watcher else ""
+            raise RuntimeError(f"processo terminou com código {process.returncode} ao iniciar:\n{output}")
+        if any(port_open(port) for port in ports):
+            return time.perf_counter() - start
+        now = time.perf_counter()
+        if now >= deadline:
+            raise TimeoutError(f"portas {'/'.join(map(str, ports))} não responderam em {timeout}s")
+
+        wait = min(delay, deadline - now)
+        if watcher is not None and not woke_on_marker:
+            if watcher.listening.wait(wait):
+                # Marca vista: volta ao intervalo mínimo para conectar assim que a porta abrir
+                woke_on_marker = True
+                delay = FIRST_DELAY
+                continue
+        else:
+            time.sleep(wait)
+        delay = min(delay * 2, MAX_DELAY)
@@ -1,18 +1,72 @@
+import copy
 import time
 import subprocess
 import json
 import os
-import platform
+import sys
 from pathlib import Path
 
+from openplc.address_map import PROGRAM_ID_ADDRESS, AddressMap
+from openplc.discovery import compiler_candidates, discover, lib_candidates, webserver_candidates
+from openplc.modbus_io import ModbusIOPlan, address_location, decode_value
+from openplc.readiness import OutputWatcher, port_open, wait_ready
+from openplc.sandbox import cleanup_sandbox, compile_in_sandbox, install_artifacts
+from openplc.web_api import OpenPLCWebClient, WebInterfaceError
+import logs
+import tracing
+
 try:
     from pymodbus.client import ModbusTcpClient
 except ImportError:
     # Fallback para versão antiga do pymodbus
     from pymodbus.client.sync import ModbusTcpClient
 
+# Inicia o webserver.py aplicando as portas do runner (ver openplc/runtime_launcher.py)
+RUNTIME_LAUNCHER = Path(__file__).with_name("runtime_launcher.py")
+
+
+class CompilationError(RuntimeError):
+    """Erro retornado pelo compilador do OpenPLC para um programa ST."""
+
+    def __init__(self, message, returncode=None, stdout="", stderr=""):
+        super().__init__(message)
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+def time_dependent(test_cases):
+    """
+    True se os testes dependem do tempo decorrido: esperas diferentes entre
+    os passos (ex.: 0.1/1.0/2.2 s em volta do PT de um TON) ou "timed": true
+    em algum passo. Nesses testes o wait é o tempo mínimo de cada passo.
+    """
+    waits = {step.get("wait", 0.1) for step in test_cases}
+    return len(waits) > 1 or any(step.get("timed") for step in test_cases)
+
+
 class OpenPLCRunner:
-    def __init__(self, openplc_path=None, compiler_path=None, runtime_path=None):
+    # Modos de avanço entre passos dos testes:
+    #   sleep  - dorme step["wait"] segundos e lê as saídas uma vez (padrão)
+    #   settle - lê as saídas até ficarem estáveis por SETTLE_POLLS leituras
+    #   match  - lê as saídas até baterem com o esperado por SETTLE_POLLS leituras
+    # Em testes dependentes do tempo (time_dependent), settle/match só começam
+    # depois do wait do passo e têm TIMED_GRACE para concluir.
+    STEP_MODES = ("sleep", "settle", "match")
+    POLL_INTERVAL = 0.005   # intervalo entre leituras (s)
+    SETTLE_POLLS = 3        # leituras consecutivas exigidas
+    SCAN_CYCLE = 0.02       # ciclo de varredura do runtime (T#20ms padrão do OpenPLC)
+    STEP_TIMEOUT = 2.0      # prazo mínimo por passo nos modos settle/match (s)
+    TIMED_GRACE = 0.1       # tolerância após o wait nos testes dependentes do tempo (s)
+    # Sondagem das portas: em 127.0.0.1 a resposta é imediata; o prazo curto evita
+    # esperar segundos por uma porta fechada (no Windows a recusa pode demorar)
+    PROBE_TIMEOUT = 0.25
+    DEFAULT_PORTS = (502, 8080)  # portas fixas do webserver.py original (Modbus, web)
+    STARTUP_TIMEOUT = 10.0  # prazo para o webserver iniciado pelo runner responder (s)
+    LOAD_TIMEOUT = 5.0      # prazo para o runtime passar a executar um programa carregado (s)
+
+    def __init__(self, openplc_path=None, compiler_path=None, runtime_path=None, step_mode="sleep",
+                 modbus_port=502, web_port=8080):
         """
         Inicializa o runner do OpenPLC.
         
@@ -22,219 +76,128 @@ class OpenPLCRunner:
             compiler_path: Caminho direto para o compilador (opcional, sobrescreve detecção)
             runtime_path: Caminho direto para o webserver.py (opcional, sobrescreve detecção)
                          NOTA: O OpenPLC moderno usa webserver.py como runtime, não executável
+            step_mode: 'sleep', 'settle' ou 'match' (ver STEP_MODES)
+            modbus_port / web_port: Portas do runtime (padrão 502/8080). Um
+                         webserver iniciado pelo runner em outras portas passa
+                         pelo runtime_launcher.py (ver runtime_command).
         """
+        if step_mode not in self.STEP_MODES:
+            raise ValueError(f"step_mode inválido: {step_mode!r} (use {', '.join(self.STEP_MODES)})")
+        self.step_mode = step_mode
+        # Partida a frio do último webserver iniciado por execute_tests (s)
+        self.cold_start_s = None
+        self.modbus_port = modbus_port
+        self.web_port = web_port
         self.compiler_path_override = Path(compiler_path) if compiler_path else None
+        # Cache opcional de compilações (openplc.compile_cache.CompileCache)
+        self.compile_cache = None
         self.webserver_script_override = Path(runtime_path) if runtime_path else None
         
-        if openplc_path:
-            self.openplc_path = Path(openplc_path)
-            if not self.openplc_path.exists():
-                raise FileNotFoundError(
-                    f"Caminho do OpenPLC não existe: {self.openplc_path}\n"
-                    f"Verifique se o caminho está correto."
-                )
-        else:
-            # Detecção automática baseada no OS
-            if platform.system() == "Windows":
-                # Caminhos comuns no Windows
-                possible_paths = [
-                    Path(os.environ.get("OPENPLC_PATH", "")),
-                    Path("C:/OpenPLC_Runtime/home") / os.environ.get("USERNAME", "Matheus") / "OpenPLC_v3",  # Webserver rodando
-                    Path("C:/OpenPLC_Runtime/home/Matheus/OpenPLC_v3"),  # Caminho específico mencionado
-                    Path("C:/OpenPLC_Runtime"),  # Instalação comum do Runtime
-                    Path("C:/OpenPLC"),
-                    Path("C:/OpenPLC_v3"),
-                    Path("C:/Program Files/OpenPLC"),
-                    Path("C:/Program Files/OpenPLC_Runtime"),
-                    Path("C:/Program Files (x86)/OpenPLC"),
-                    Path("C:/Program Files (x86)/OpenPLC_Runtime"),
-                    Path.home() / "OpenPLC",
-                    Path.home() / "OpenPLC_Runtime",
-                    Path.home() / "Documents" / "OpenPLC",
-                    Path(".") / "OpenPLC",  # Pasta atual
-                ]
-            else:
-                # Caminhos comuns no Linux
-                possible_paths = [
-                    Path(os.environ.get("OPENPLC_PATH", "")),
-                    Path("/usr/local/openplc"),
-                    Path("/opt/openplc"),
-                    Path("/usr/openplc"),
-                    Path.home() / "openplc",
-                    Path.home() / "OpenPLC",
-                    Path(".") / "openplc",  # Pasta atual
-                ]
-            
-            self.openplc_path = None
-            for path in possible_paths:
-                if path and path.exists() and path.is_dir():
-                    # Verifica se tem runtime (prioridade) ou compilador
-                    runtime_names = [
-                        "OpenPLC_Runtime.exe" if platform.system() == "Windows" else "OpenPLC_Runtime",
-                        "openplc_runtime.exe" if platform.system() == "Windows" else "openplc_runtime",
-                        "runtime.exe" if platform.system() == "Windows" else "runtime",
-                    ]
-                    
-                    has_runtime = False
-                    for name in runtime_names:
-                        if (path / name).exists() or (path / "runtime" / name).exists():
-                            has_runtime = True
-                            break
-                    
-                    compiler = path / "compiler" / ("openplc.exe" if platform.system() == "Windows" else "openplc")
-                    matiec = path / "webserver" / "iec2c.exe" if platform.system() == "Windows" else path / "webserver" / "iec2c"
-                    
-                    if has_runtime or compiler.exists() or matiec.exists():
-                        self.openplc_path = path
-                        break
-            
-            if not self.openplc_path:
-                error_msg = (
-                    "OpenPLC não encontrado automaticamente.\n\n"
-                    "Soluções:\n"
-                    "1. Configure a variável de ambiente OPENPLC_PATH:\n"
-                    f"   Windows: set OPENPLC_PATH=C:\\caminho\\para\\OpenPLC\n"
-                    f"   Linux: export OPENPLC_PATH=/caminho/para/openplc\n"
-                    "2. Use o parâmetro --openplc-path ao executar:\n"
-                    "   python benchmark.py --openplc-path \"C:\\caminho\\para\\OpenPLC\"\n\n"
-                    "Caminhos testados:\n"
-                )
-                for path in possible_paths:
-                    if path:
-                        error_msg += f"  - {path}\n"
-                
-                raise FileNotFoundError(error_msg)
-        
+        if openplc_path and not Path(openplc_path).exists():
+            raise FileNotFoundError(
+                f"Caminho do OpenPLC não existe: {openplc_path}\n"
+                f"Verifique se o caminho está correto."
+            )
+
+        # Busca dos componentes (em cache: ver openplc/discovery.py)
+        self._discovery = discover(openplc_path, compiler_path, runtime_path)
+        if not self._discovery["openplc_path"]:
+            error_msg = (
+                "OpenPLC não encontrado automaticamente.\n\n"
+                "Soluções:\n"
+                "1. Configure a variável de ambiente OPENPLC_PATH:\n"
+                f"   Windows: set OPENPLC_PATH=C:\\caminho\\para\\OpenPLC\n"
+                f"   Linux: export OPENPLC_PATH=/caminho/para/openplc\n"
+                "2. Use o parâmetro --openplc-path ao executar:\n"
+                "   python benchmark.py --openplc-path \"C:\\caminho\\para\\OpenPLC\"\n\n"
+                "Caminhos testados:\n"
+            )
+            for path in self._discovery["searched"]:
+                error_msg += f"  - {path}\n"
+
+            raise FileNotFoundError(error_msg)
+        self.openplc_path = Path(self._discovery["openplc_path"])
+        if self._discovery["cached"]:
+            logs.debug(f"Instalação do OpenPLC obtida do cache de descoberta: {self.openplc_path}")
+
         # Valida componentes essenciais
         self._validate_openplc_installation()
     
     def _find_compiler(self):
-        """Procura o compilador em vários locais possíveis"""
-        # Se temos override, usa ele
-        if self.compiler_path_override and self.compiler_path_override.exists():
-            return self.compiler_path_override
-        
-        compiler_name = "openplc.exe" if platform.system() == "Windows" else "openplc"
-        matiec_name = "iec2c.exe" if platform.system() == "Windows" else "iec2c"
-        
-        # Possíveis locais do compilador (no diretório base)
-        possible_compiler_paths = [
-            # Estrutura padrão OpenPLC_v3
-            self.openplc_path / "compiler" / compiler_name,
-            self.openplc_path / "webserver" / "core" / "matiec" / matiec_name,
-            self.openplc_path / "webserver" / matiec_name,
-            self.openplc_path / "matiec" / matiec_name,
-            # Compilador na raiz
-            self.openplc_path / compiler_name,
-            self.openplc_path / matiec_name,
-            # Editor pode ter o compilador
-            self.openplc_path / "editor" / "compiler" / compiler_name,
-            self.openplc_path / "editor" / compiler_name,
-            self.openplc_path / "editor" / "bin" / compiler_name,
-            self.openplc_path / "editor" / "bin" / matiec_name,
-            self.openplc_path / "editor" / "tools" / compiler_name,
-            self.openplc_path / "editor" / "tools" / matiec_name,
-        ]
-        
-        # Procurar em diretórios adjacentes e locais comuns do Windows
-        if platform.system() == "Windows":
-            username = os.environ.get("USERNAME", "Matheus")
-            common_paths = [
-                # Caminho do webserver rodando
-                Path(f"C:/OpenPLC_Runtime/home/{username}/OpenPLC_v3/webserver/iec2c.exe"),
-                Path(f"C:/OpenPLC_Runtime/home/{username}/OpenPLC_v3/webserver/core/matiec/iec2c.exe"),
-                Path("C:/OpenPLC_Runtime/home/Matheus/OpenPLC_v3/webserver/iec2c.exe"),
-                Path("C:/OpenPLC_Runtime/home/Matheus/OpenPLC_v3/webserver/core/matiec/iec2c.exe"),
-                # Outros caminhos comuns
-                Path("C:/OpenPLC_v3/webserver/iec2c.exe"),
-                Path("C:/OpenPLC_v3/webserver/core/matiec/iec2c.exe"),
-                Path.home() / "OpenPLC_Editor" / "matiec" / "iec2c.exe",
-                Path("C:/OpenPLC_Editor/matiec/iec2c.exe"),
-                Path("C:/Program Files/OpenPLC_v3/webserver/iec2c.exe"),
-            ]
-            possible_compiler_paths.extend(common_paths)
-        
-        # Procurar em diretórios adjacentes (Editor pode estar em pasta separada)
-        possible_compiler_paths.extend([
-            self.openplc_path.parent / "OpenPLC_Editor" / "compiler" / compiler_name,
-            self.openplc_path.parent / "OpenPLC_Editor" / compiler_name,
-            self.openplc_path.parent / "OpenPLC_Editor" / "matiec" / matiec_name,
-            self.openplc_path.parent / "OpenPLC_v3" / "webserver" / matiec_name,
-            self.openplc_path.parent / "OpenPLC_v3" / "webserver" / "core" / "matiec" / matiec_name,
-        ])
-        
-        for path in possible_compiler_paths:
-            if path.exists():
-                return path
-        
-        return None
-    
-    def _check_webserver_running(self, port=8080):
+        """Compilador encontrado pela descoberta (override tem prioridade se existir)"""
+        path = self._discovery.get("compiler_path")
+        return Path(path) if path else None
+
+    @property
+    def webserver_url(self):
+        return f"http://127.0.0.1:{self.web_port}"
+
+    def with_ports(self, modbus_port, web_port):
+        """Cópia do runner apontando para outro runtime (mesma instalação e compilador)."""
+        runner = copy.copy(self)
+        runner.modbus_port = modbus_port
+        runner.web_port = web_port
+        runner.webserver_running = False
+        runner._web_client = None
+        return runner
+
+    def runtime_env(self):
+        """Ambiente para iniciar um webserver.py nas portas deste runner (lido pelo runtime_launcher.py)."""
+        env = dict(os.environ)
+        env["OPENPLC_MODBUS_PORT"] = str(self.modbus_port)
+        env["OPENPLC_WEB_PORT"] = str(self.web_port)
+        return env
+
+    def runtime_command(self, script=None):
+        """
+        Comando que inicia o webserver.py (o da instalação, ou script) nas
+        portas deste runner.
+
+        O webserver.py original ignora OPENPLC_MODBUS_PORT/OPENPLC_WEB_PORT e
+        sobe sempre em 502/8080. Fora dessas portas ele é iniciado pelo
+        runtime_launcher.py, que aplica as portas (ou termina com erro se não
+        conseguir) em vez de deixar as instâncias colidirem.
+        """
+        script = str(script or self.webserver_script)
+        if (self.modbus_port, self.web_port) == self.DEFAULT_PORTS:
+            return [sys.executable, script]
+        return [sys.executable, str(RUNTIME_LAUNCHER), script]
+
+    @classmethod
+    def _port_open(cls, port):
+        """Conexão TCP em 127.0.0.1 aceita dentro de PROBE_TIMEOUT"""
+        return port_open(port, cls.PROBE_TIMEOUT)
+
+    def _check_webserver_running(self, port=None):
         """Verifica se o webserver do OpenPLC está rodando"""
-        try:
-            import socket
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex(('127.0.0.1', port))
-            sock.close()
-            return result == 0
-        except:
-            return False
+        return self._port_open(port or self.web_port)
     
-    def _check_modbus_running(self, port=502):
-        """Verifica se o Modbus/TCP está respondendo (runtime ativo)"""
-        try:
-            test_client = ModbusTcpClient("127.0.0.1", port=port)
-            connect_result = test_client.connect()
-            test_client.close()
-            return connect_result is not False
-        except:
-            return False
+    def _check_modbus_running(self, port=None):
+        """Verifica se o Modbus/TCP está aceitando conexões (runtime ativo)"""
+        return self._port_open(port or self.modbus_port)
     
     def _find_webserver_script(self):
-        """Procura o script webserver.py do OpenPLC"""
-        # Se temos override, usa ele
-        if self.webserver_script_override and self.webserver_script_override.exists():
-            return self.webserver_script_override
-        
-        possible_paths = [
-            self.openplc_path / "webserver" / "webserver.py",
-            self.openplc_path / "webserver.py",
-            self.openplc_path / "webserver" / "main.py",
-            self.openplc_path / "main.py",
-        ]
-        
-        # Procurar em locais comuns do Windows
-        if platform.system() == "Windows":
-            username = os.environ.get("USERNAME", "Matheus")
-            possible_paths.extend([
-                Path(f"C:/OpenPLC_Runtime/home/{username}/OpenPLC_v3/webserver/webserver.py"),
-                Path("C:/OpenPLC_Runtime/home/Matheus/OpenPLC_v3/webserver/webserver.py"),
-            ])
-        
-        for path in possible_paths:
-            if path.exists():
-                return path
-        
-        return None
-    
+        """Script webserver.py encontrado pela descoberta (override tem prioridade se existir)"""
+        path = self._discovery.get("webserver_script")
+        return Path(path) if path else None
+
     def _validate_openplc_installation(self):
         """Valida se a instalação do OpenPLC tem os componentes necessários"""
         # Verifica se webserver está rodando (OpenPLC moderno)
-        webserver_running = self._check_webserver_running(8080)
-        modbus_running = self._check_modbus_running(502)
+        webserver_running = self._check_webserver_running()
+        modbus_running = self._check_modbus_running()
         
         # Procura o script webserver.py
         webserver_script = self._find_webserver_script()
         
         # Se webserver está rodando, não precisa iniciar
         if webserver_running or modbus_running:
-            print(f"[INFO] OpenPLC webserver detectado (porta 8080: {webserver_running}, Modbus 502: {modbus_running})")
+            logs.info(f"OpenPLC webserver detectado (porta {self.web_port}: {webserver_running}, Modbus {self.modbus_port}: {modbus_running})")
             webserver_path = webserver_script if webserver_script else "webserver_running"
         else:
             # Webserver não está rodando, precisa encontrar o script para iniciar
             if webserver_script:
-                print(f"[INFO] Webserver não está rodando, mas script encontrado: {webserver_script}")
+                logs.info(f"Webserver não está rodando, mas script encontrado: {webserver_script}")
                 webserver_path = webserver_script
             else:
                 webserver_path = None
@@ -249,27 +212,6 @@ class OpenPLCRunner:
             missing.append(f"Webserver (webserver.py não encontrado e webserver não está rodando)")
         
         if missing:
-            # Lista os caminhos que foram procurados
-            compiler_name = "openplc.exe" if platform.system() == "Windows" else "openplc"
-            matiec_name = "iec2c.exe" if platform.system() == "Windows" else "iec2c"
-            
-            searched_compiler_paths = [
-                self.openplc_path / "compiler" / compiler_name,
-                self.openplc_path / "webserver" / "core" / "matiec" / matiec_name,
-                self.openplc_path / "webserver" / matiec_name,
-                self.openplc_path / "matiec" / matiec_name,
-                self.openplc_path / compiler_name,
-                self.openplc_path / matiec_name,
-                self.openplc_path / "editor" / "compiler" / compiler_name,
-                self.openplc_path / "editor" / compiler_name,
-            ]
-            
-            searched_runtime_paths = [
-                self.openplc_path / "runtime" / runtime_name,
-                self.openplc_path / runtime_name,
-                self.openplc_path / "webserver" / runtime_name,
-            ]
-            
             error_msg = (
                 f"Componentes do OpenPLC não encontrados em {self.openplc_path}:\n"
                 + "\n".join(f"  - {m}" for m in missing) + "\n\n"
@@ -277,18 +219,13 @@ class OpenPLCRunner:
             
             if not compiler_path:
                 error_msg += "Locais onde o COMPILADOR foi procurado:\n"
-                for path in searched_compiler_paths:
+                for path in compiler_candidates(self.openplc_path):
                     error_msg += f"  - {path}\n"
                 error_msg += "\n"
             
             if not webserver_path:
                 error_msg += "Locais onde o WEBSERVER foi procurado:\n"
-                searched_webserver_paths = [
-                    self.openplc_path / "webserver" / "webserver.py",
-                    self.openplc_path / "webserver.py",
-                    self.openplc_path / "webserver" / "main.py",
-                ]
-                for path in searched_webserver_paths:
+                for path in webserver_candidates(self.openplc_path):
                     error_msg += f"  - {path}\n"
                 error_msg += "\n"
             
@@ -312,241 +249,382 @@ class OpenPLCRunner:
         self.compiler_path = compiler_path
         self.webserver_script = webserver_path
         self.webserver_running = webserver_running or modbus_running
-        self.webserver_port = 8080
-        self.webserver_url = f"http://127.0.0.1:{self.webserver_port}"
     
-    def _upload_program_via_api(self, st_code_path):
-        """Tenta fazer upload do programa via API REST do webserver (opcional)"""
+    def web_client(self):
+        """Sessão na interface web do webserver deste runner (openplc.web_api), criada na primeira carga."""
+        if getattr(self, "_web_client", None) is None:
+            self._web_client = OpenPLCWebClient(self.webserver_url)
+        return self._web_client
+
+    def connect_modbus(self, port=None):
+        """Abre um ModbusTcpClient para o runtime local (porta modbus_port por padrão)."""
+        port = port or self.modbus_port
+        client = ModbusTcpClient("127.0.0.1", port=port)
+        
+        # Compatibilidade com versões antigas e novas do pymodbus
         try:
-            import requests
-            st_content = Path(st_code_path).read_text(encoding='utf-8')
-            
-            # Tenta fazer upload via API (endpoint pode variar)
-            # OpenPLC webserver pode ter endpoint /upload ou similar
-            endpoints = [
-                f"{self.webserver_url}/upload_program",
-                f"{self.webserver_url}/api/upload",
-                f"{self.webserver_url}/program/upload",
-            ]
-            
-            for endpoint in endpoints:
-                try:
-                    response = requests.post(
-                        endpoint,
-                        files={"file": ("program.st", st_content, "text/plain")},
-                        timeout=5
-                    )
-                    if response.status_code == 200:
-                        print(f"[DEBUG] Programa enviado via API para: {endpoint}")
-                        return
-                except:
-                    continue
-            
-            # Se não conseguiu via API, continua com método local
-            print(f"[DEBUG] API de upload não disponível, usando método local")
-        except ImportError:
-            # requests não disponível, continua com método local
+            with tracing.span("modbus_connect", port=port):
+                connect_result = client.connect()
+            if connect_result is False:
+                raise ConnectionError("Não foi possível conectar ao OpenPLC via Modbus/TCP")
+        except (AttributeError, TypeError):
+            # Versão nova do pymodbus pode não ter connect() ou retornar diferente
             pass
-        except Exception as e:
-            # Qualquer erro, continua com método local
-            print(f"[DEBUG] Upload via API falhou: {e}, usando método local")
-
-    def run_program(self, st_code_path, test_cases):
-        """Executa um código ST dentro do OpenPLC e avalia"""
-        webserver_process = None
-        client = None
         
+        if self.step_mode == "sleep":
+            time.sleep(0.5)
+        return client
+
+    def read_value(self, client, address, type_name):
+        """Valor de um endereço %MW/%MD/%QW no tipo dado, ou None se a leitura falhar."""
+        location = address_location(address, type_name)
         try:
-            # 1. Copiar arquivo ST para pasta de compilação
-            # Se for webserver, pode estar em local diferente
-            if "webserver" in str(self.openplc_path).lower() or "home" in str(self.openplc_path).lower():
-                # Estrutura de webserver: tenta vários locais possíveis
-                possible_locations = [
-                    self.openplc_path / "webserver" / "program.st",
-                    self.openplc_path / "program.st",
-                    self.openplc_path / "st_files" / "program.st",
-                ]
-                tmp_program = None
-                for loc in possible_locations:
-                    if loc.parent.exists():
-                        tmp_program = loc
-                        break
-                if not tmp_program:
-                    # Cria no primeiro local possível
-                    tmp_program = possible_locations[0]
+            result = client.read_holding_registers(location.address, count=location.width)
+        except Exception:
+            return None
+        if hasattr(result, 'isError') and result.isError():
+            return None
+        if hasattr(result, 'is_error') and result.is_error():
+            return None
+        return decode_value(list(result.registers), location)
+
+    def read_program_id(self, client):
+        """Marca do programa em execução (AddressMap.program_id), ou None se a leitura falhar."""
+        return self.read_value(client, PROGRAM_ID_ADDRESS, "UDINT")
+
+    def wait_program(self, client, program_id, timeout=None):
+        """
+        Espera o runtime executar o programa com a marca program_id. Um upload
+        aceito pelo webserver não garante a troca do programa: até a marca
+        aparecer em PROGRAM_ID_ADDRESS, o runtime ainda roda o anterior.
+
+        Returns:
+            True se a marca apareceu dentro do prazo (LOAD_TIMEOUT por padrão).
+        """
+        deadline = time.perf_counter() + (self.LOAD_TIMEOUT if timeout is None else timeout)
+        while True:
+            if self.read_program_id(client) == program_id:
+                return True
+            if time.perf_counter() >= deadline:
+                return False
+            time.sleep(self.SCAN_CYCLE)
+
+    def run_steps(self, client, test_cases, io_plan):
+        """
+        Executa os passos dos testes em um cliente Modbus já conectado.
+
+        io_plan é o ModbusIOPlan montado com o AddressMap do programa
+        carregado: só ele resolve as chaves que são nomes de variáveis.
+        """
+        results = []
+        timed = time_dependent(test_cases)
+
+        for index, step in enumerate(test_cases):
+            inputs = step["inputs"]
+
+            # Escreve as entradas (uma requisição por faixa contígua)
+            io_plan.write_inputs(client, index, inputs)
+
+            step_start = time.perf_counter()
+            if self.step_mode == "sleep":
+                time.sleep(step.get("wait", 0.1))  # tempo em segundos
+                got = io_plan.read_outputs(client, index)
             else:
-                tmp_program = self.openplc_path / "program.st"
-            
-            tmp_program.parent.mkdir(parents=True, exist_ok=True)
-            tmp_program.write_text(Path(st_code_path).read_text(), encoding='utf-8')
-            print(f"[DEBUG] Arquivo ST copiado para: {tmp_program}")
-            
-            # Se webserver está rodando, tenta fazer upload via API (opcional)
-            if hasattr(self, 'webserver_running') and self.webserver_running:
-                try:
-                    self._upload_program_via_api(st_code_path)
-                except Exception as e:
-                    print(f"[AVISO] Falha ao fazer upload via API, usando método local: {e}")
+                got = self._poll_outputs(client, io_plan, index, step, timed)
+            step_end = time.perf_counter()
+            tracing.record("test_step", step_start, step_end, step=index)
+            results.append(self.step_record(step, got, step_end - step_start))
 
-            # 2. Compilar usando o compilador encontrado
-            if not hasattr(self, 'compiler_path') or not self.compiler_path:
-                raise FileNotFoundError("Compilador OpenPLC não foi encontrado durante a inicialização")
-            
-            print(f"[DEBUG] Usando compilador: {self.compiler_path}")
+        return results
+
+    @staticmethod
+    def step_record(step, got, settle_time):
+        """Resultado de um passo: saídas lidas comparadas com as esperadas."""
+        expected = step["expected_outputs"]
+        out_states = {k: got[k] for k in expected}
+
+        # Comparação
+        correct = {k: (out_states[k] == expected[k]) for k in expected}
+
+        return {
+            "inputs": step["inputs"],
+            "expected": expected,
+            "got": out_states,
+            "correct": correct,
+            "settle_time_s": round(settle_time, 4)
+        }
+
+    def poll_window(self, step, timed):
+        """
+        (espera mínima, prazo) do polling de um passo, em segundos a partir do início.
+
+        Sem dependência do tempo o passo pode terminar antes do wait, assim
+        que a condição valer. Com ela, o wait é o mínimo: um TON correto ainda
+        está em FALSE antes do PT (settle terminaria cedo demais) e um TON com
+        PT errado bateria com o esperado em algum momento (match passaria).
+        """
+        wait = step.get("wait", 0.1)
+        if timed:
+            return wait, wait + self.TIMED_GRACE
+        return 0.0, max(self.STEP_TIMEOUT, 2 * wait)
+
+    def _poll_outputs(self, client, io_plan, index, step, timed=False):
+        """
+        Lê as saídas do passo até a condição do step_mode valer por
+        SETTLE_POLLS leituras seguidas cobrindo ao menos um ciclo de varredura
+        (antes disso o runtime pode ainda não ter lido as entradas novas).
+        Se o prazo do passo vencer, retorna a última leitura.
+        """
+        expected = step["expected_outputs"]
+        minimum, limit = self.poll_window(step, timed)
+        if minimum:
+            time.sleep(minimum)
+        deadline = time.perf_counter() - minimum + limit
+        previous = None
+        streak = 0
+        streak_start = None
+
+        while True:
+            got = io_plan.read_outputs(client, index)
+            now = time.perf_counter()
+            if self.step_mode == "match":
+                holds = all(got[k] == expected[k] for k in expected)
+            else:
+                holds = got == previous
+            previous = got
+
+            if holds:
+                if streak == 0:
+                    streak_start = now
+                streak += 1
+                if streak >= self.SETTLE_POLLS and now - streak_start >= self.SCAN_CYCLE:
+                    return got
+            else:
+                streak = 0
+
+            if now >= deadline:
+                return got
+            time.sleep(self.POLL_INTERVAL)
+
+    def run_program(self, st_code_path, test_cases, io_plan=None):
+        """Executa um código ST dentro do OpenPLC e avalia"""
+        try:
+            # Variáveis citadas pelos testes sem endereço Modbus ganham um AT da faixa reservada
+            address_map = AddressMap(Path(st_code_path).read_text(encoding='utf-8'), test_cases)
+            compile_result = self.compile_program(st_code_path, address_map.source)
+            self.install_program(compile_result)
+            return self.execute_tests(test_cases, io_plan or ModbusIOPlan(test_cases, address_map))
+        except Exception as e:
+            raise RuntimeError(f"Erro ao executar programa OpenPLC: {e}") from e
+
+    def compile_spec(self):
+        """
+        Resolve uma única vez como o programa deve ser compilado.
+
+        Returns:
+            dict serializável com o modo ('script', 'iec2c' ou 'openplc'), o
+            compilador, o script de compilação e o diretório lib/ do MatIEC.
+        """
+        if getattr(self, "_compile_spec", None):
+            return self._compile_spec
+
+        if not hasattr(self, 'compiler_path') or not self.compiler_path:
+            raise FileNotFoundError("Compilador OpenPLC não foi encontrado durante a inicialização")
+        
+        logs.debug(f"Usando compilador: {self.compiler_path}")
+        
+        # Script de compilação e lib/ do MatIEC já localizados pela descoberta
+        compile_script = self._discovery.get("compile_script")
+        compile_script = Path(compile_script) if compile_script else None
+        if compile_script:
+            logs.debug(f"Script de compilação encontrado: {compile_script}")
+        
+        # Diferentes compiladores podem ter diferentes sintaxes
+        compiler_name = self.compiler_path.name.lower()
+        lib_path = None
+        
+        if compile_script:
+            mode = "script"
+        elif "iec2c" in compiler_name or "matiec" in compiler_name:
+            mode = "iec2c"
+            # MatIEC compiler - precisa executar no diretório onde está lib/ieclib.txt
+            lib_path = self._discovery.get("lib_path")
+            if lib_path:
+                logs.debug(f"Biblioteca encontrada em: {lib_path}")
             
-            # Tenta encontrar script de compilação primeiro
-            compile_script = None
-            possible_scripts = [
-                self.openplc_path / "scripts" / "compile_program.sh",
-                self.openplc_path / "webserver" / "scripts" / "compile_program.sh",
-                self.openplc_path / "scripts" / "compile_program.bat",
-                self.openplc_path / "webserver" / "scripts" / "compile_program.bat",
+            if not lib_path:
+                logs.warning(f"Biblioteca lib/ieclib.txt não encontrada")
+                logs.debug(f"Locais procurados: {[str(p) for p in lib_candidates(self.compiler_path, self.openplc_path)]}")
+        else:
+            mode = "openplc"
+
+        self._compile_spec = {
+            "mode": mode,
+            "compiler_path": str(self.compiler_path),
+            "compile_script": str(compile_script) if compile_script else None,
+            "lib_path": str(lib_path) if lib_path else None,
+            # O compile_program.sh compila dentro da instalação (core/), então
+            # duas compilações simultâneas ainda disputariam os mesmos arquivos
+            "parallel_safe": mode != "script",
+        }
+        return self._compile_spec
+
+    def compile_program(self, st_code_path, st_source=None):
+        """
+        Compila o código ST em um sandbox temporário próprio.
+
+        st_source substitui o conteúdo do arquivo (ex.: código instrumentado
+        pelo AddressMap).
+
+        Returns:
+            dict com returncode, stdout, stderr, sandbox e program_path
+            (ver openplc.sandbox.compile_in_sandbox).
+
+        Raises:
+            CompilationError: se o compilador retornar erro.
+        """
+        if st_source is None:
+            st_source = Path(st_code_path).read_text(encoding='utf-8')
+
+        compile_result = self.compile_cache.get(st_source) if self.compile_cache else None
+        if compile_result:
+            logs.debug(f"Resultado de compilação obtido do cache")
+        else:
+            compile_result = compile_in_sandbox(self.compile_spec(), st_source)
+            if self.compile_cache:
+                self.compile_cache.put(st_source, compile_result)
+
+        self.check_compile_result(compile_result)
+        return compile_result
+
+    @staticmethod
+    def check_compile_result(compile_result):
+        """Levanta CompilationError (e remove o sandbox) se a compilação falhou."""
+        if compile_result["returncode"] != 0:
+            cleanup_sandbox(compile_result)
+            raise CompilationError(
+                f"Erro na compilação (código {compile_result['returncode']}):\n"
+                f"STDERR: {compile_result['stderr']}\n"
+                f"STDOUT: {compile_result['stdout']}",
+                returncode=compile_result["returncode"],
+                stdout=compile_result["stdout"],
+                stderr=compile_result["stderr"]
+            )
+
+    def generated_dir(self, program_dir):
+        """
+        Pasta onde o build do runtime procura o código C gerado pelo MatIEC:
+        core/ do webserver no OpenPLC_v3 (o compile_program.sh move para lá
+        POUS.c, Res0.c...), ou a própria pasta do program.st.
+        """
+        for candidate in (program_dir / "core", self.openplc_path / "webserver" / "core", self.openplc_path / "core"):
+            if candidate.is_dir():
+                return candidate
+        return program_dir
+
+    def install_program(self, compile_result):
+        """
+        Instala no OpenPLC um programa já compilado em sandbox: copia o
+        program.st e os arquivos gerados pelo compilador (POUS.c, Config0.c,
+        LOCATED_VARIABLES.h...) para a instalação, onde o build do runtime os
+        procura (ver generated_dir), então o ST não é traduzido de novo. Se o
+        webserver já estiver rodando, o programa é carregado pela interface
+        web (openplc.web_api: upload, compilação e início). Deve ser chamado
+        de forma serial, pois a instalação é compartilhada. O sandbox é
+        removido ao final.
+        """
+        # Se for webserver, pode estar em local diferente
+        if "webserver" in str(self.openplc_path).lower() or "home" in str(self.openplc_path).lower():
+            # Estrutura de webserver: tenta vários locais possíveis
+            possible_locations = [
+                self.openplc_path / "webserver" / "program.st",
+                self.openplc_path / "program.st",
+                self.openplc_path / "st_files" / "program.st",
             ]
-            
-            for script_path in possible_scripts:
-                if script_path.exists():
-                    compile_script = script_path
-                    print(f"[DEBUG] Script de compilação encontrado: {compile_script}")
+            tmp_program = None
+            for loc in possible_locations:
+                if loc.parent.exists():
+                    tmp_program = loc
                     break
+            if not tmp_program:
+                # Cria no primeiro local possível
+                tmp_program = possible_locations[0]
+        else:
+            tmp_program = self.openplc_path / "program.st"
+        
+        try:
+            sandbox_program = Path(compile_result["program_path"])
+            tmp_program.parent.mkdir(parents=True, exist_ok=True)
+            tmp_program.write_text(sandbox_program.read_text(encoding='utf-8'), encoding='utf-8')
+            logs.debug(f"Arquivo ST copiado para: {tmp_program}")
+            generated_dir = self.generated_dir(tmp_program.parent)
+            installed = install_artifacts(compile_result, generated_dir)
+            if installed:
+                logs.debug(f"{len(installed)} arquivos gerados pelo compilador instalados em {generated_dir}")
             
-            # Diferentes compiladores podem ter diferentes sintaxes
-            compiler_name = self.compiler_path.name.lower()
-            
-            if compile_script:
-                # Usa script de compilação se disponível
-                if compile_script.suffix == ".sh":
-                    # Script bash (pode precisar de WSL no Windows)
-                    compile_result = subprocess.run(
-                        ["bash", str(compile_script), str(tmp_program)],
-                        cwd=str(compile_script.parent),
-                        capture_output=True,
-                        text=True,
-                        check=False
-                    )
-                else:
-                    # Script batch (.bat)
-                    compile_result = subprocess.run(
-                        [str(compile_script), str(tmp_program)],
-                        cwd=str(compile_script.parent),
-                        capture_output=True,
-                        text=True,
-                        check=False,
-                        shell=True
-                    )
-            elif "iec2c" in compiler_name or "matiec" in compiler_name:
-                # MatIEC compiler - precisa executar no diretório onde está lib/ieclib.txt
-                compiler_dir = self.compiler_path.parent
-                
-                # Procura lib/ieclib.txt em vários locais possíveis
-                lib_path = None
-                possible_lib_paths = [
-                    compiler_dir / "lib",
-                    compiler_dir.parent / "lib",
-                    compiler_dir.parent.parent / "lib",
-                    self.openplc_path / "webserver" / "core" / "matiec" / "lib",
-                    self.openplc_path / "webserver" / "lib",
-                    self.openplc_path / "lib",
-                ]
-                
-                for path in possible_lib_paths:
-                    if path.exists() and (path / "ieclib.txt").exists():
-                        lib_path = path
-                        print(f"[DEBUG] Biblioteca encontrada em: {lib_path}")
-                        break
-                
-                # Determina o diretório de trabalho para o compilador
-                # O MatIEC precisa que lib/ esteja relativo ao diretório de execução
-                if lib_path:
-                    compile_cwd = lib_path.parent
-                    print(f"[DEBUG] Compilando a partir de: {compile_cwd} (lib em: {lib_path})")
-                else:
-                    # Se não encontrou lib/, tenta usar o diretório do compilador
-                    compile_cwd = compiler_dir
-                    print(f"[AVISO] Biblioteca lib/ieclib.txt não encontrada, compilando a partir de: {compile_cwd}")
-                    print(f"[DEBUG] Locais procurados: {[str(p) for p in possible_lib_paths]}")
-                
-                # Converte o caminho do arquivo ST para relativo ao diretório de trabalho
+            # Webserver já rodando: carrega o programa pela interface web (upload, compilação e início)
+            if getattr(self, 'webserver_running', False):
                 try:
-                    st_file_for_compiler = tmp_program.relative_to(compile_cwd)
-                except ValueError:
-                    # Se não é relativo, usa caminho absoluto
-                    st_file_for_compiler = tmp_program
-                
-                print(f"[DEBUG] Executando: {self.compiler_path} {st_file_for_compiler}")
-                print(f"[DEBUG] Diretório de trabalho: {compile_cwd}")
-                
-                compile_result = subprocess.run(
-                    [str(self.compiler_path), str(st_file_for_compiler)],
-                    cwd=str(compile_cwd),
-                    capture_output=True,
-                    text=True,
-                    check=False
-                )
-            else:
-                # Compilador padrão (openplc) - lê program.st do diretório atual
-                compile_result = subprocess.run(
-                    [str(self.compiler_path)],
-                    cwd=str(self.openplc_path),
-                    capture_output=True,
-                    text=True,
-                    check=False
-                )
-            
-            if compile_result.returncode != 0:
-                error_output = compile_result.stderr or compile_result.stdout
-                raise RuntimeError(
-                    f"Erro na compilação (código {compile_result.returncode}):\n"
-                    f"STDERR: {compile_result.stderr}\n"
-                    f"STDOUT: {compile_result.stdout}"
-                )
+                    self.web_client().load_program(sandbox_program)
+                except (WebInterfaceError, OSError) as e:
+                    logs.warning(f"Falha ao carregar o programa pela interface web: {e}")
+        finally:
+            cleanup_sandbox(compile_result)
+
+        return tmp_program
 
+    def execute_tests(self, test_cases, io_plan):
+        """
+        Executa os casos de teste no programa carregado no OpenPLC via Modbus/TCP.
+
+        Inicia o webserver se necessário (e o encerra ao final se foi iniciado aqui).
+        io_plan (ModbusIOPlan com o AddressMap do programa) pode ser
+        reaproveitado entre execuções da mesma tarefa.
+        """
+        webserver_process = None
+        client = None
+        webserver_running = False
+        modbus_running = False
+
+        try:
             # 3. Verificar se webserver já está rodando e iniciar se necessário
-            webserver_process = None
-            
             # Verifica se webserver já está rodando
-            webserver_running = self._check_webserver_running(8080)
-            modbus_running = self._check_modbus_running(502)
+            webserver_running = self._check_webserver_running()
+            modbus_running = self._check_modbus_running()
             
             if webserver_running or modbus_running:
-                print(f"[INFO] OpenPLC webserver já está rodando (porta 8080: {webserver_running}, Modbus 502: {modbus_running})")
+                logs.info(f"OpenPLC webserver já está rodando (porta {self.web_port}: {webserver_running}, Modbus {self.modbus_port}: {modbus_running})")
             else:
                 # Webserver não está rodando, precisa iniciar
                 if hasattr(self, 'webserver_script') and self.webserver_script:
                     if isinstance(self.webserver_script, Path) and self.webserver_script.exists():
-                        print(f"[INFO] Iniciando OpenPLC webserver: {self.webserver_script}")
+                        logs.info(f"Iniciando OpenPLC webserver: {self.webserver_script}")
                         
                         # Determina o diretório de trabalho (onde está o webserver.py)
                         webserver_dir = self.webserver_script.parent
                         
-                        # Inicia o webserver.py
+                        # Inicia o webserver.py (saída lida por uma thread: um PIPE cheio travaria o processo)
+                        started = time.perf_counter()
                         webserver_process = subprocess.Popen(
-                            ["python", str(self.webserver_script)],
+                            self.runtime_command(),
                             cwd=str(webserver_dir),
+                            env=self.runtime_env(),
                             stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE
+                            stderr=subprocess.STDOUT
                         )
+                        watcher = OutputWatcher(webserver_process.stdout)
                         
-                        # Aguarda o webserver iniciar
-                        print(f"[INFO] Aguardando webserver iniciar...")
-                        max_wait = 10  # máximo 10 segundos
-                        waited = 0
-                        while waited < max_wait:
-                            time.sleep(1)
-                            waited += 1
-                            if self._check_webserver_running(8080) or self._check_modbus_running(502):
-                                print(f"[OK] Webserver iniciado com sucesso!")
-                                break
-                        
-                        if not (self._check_webserver_running(8080) or self._check_modbus_running(502)):
-                            # Verifica se o processo ainda está rodando
-                            if webserver_process.poll() is not None:
-                                stderr_output = webserver_process.stderr.read().decode('utf-8', errors='ignore')
-                                raise RuntimeError(
-                                    f"Falha ao iniciar webserver (processo terminou com código {webserver_process.returncode}):\n"
-                                    f"{stderr_output}"
-                                )
-                            else:
-                                print(f"[AVISO] Webserver iniciado, mas ainda não responde nas portas 8080/502. Continuando...")
+                        # Aguarda o webserver iniciar (acorda na marca de "escutando" da saída)
+                        logs.info(f"Aguardando webserver iniciar...")
+                        try:
+                            wait_ready(webserver_process, [self.web_port, self.modbus_port], self.STARTUP_TIMEOUT, watcher)
+                            tracing.record("runtime_start", started, time.perf_counter(), port=self.modbus_port)
+                            self.cold_start_s = round(time.perf_counter() - started, 3)
+                            logs.ok(f"Webserver iniciado com sucesso em {self.cold_start_s}s!")
+                        except RuntimeError as e:
+                            raise RuntimeError(f"Falha ao iniciar webserver ({e})")
+                        except TimeoutError:
+                            logs.warning(f"Webserver iniciado, mas ainda não responde nas portas {self.web_port}/{self.modbus_port}. Continuando...")
                     else:
                         raise FileNotFoundError(f"Script webserver.py não encontrado: {self.webserver_script}")
                 else:
@@ -556,72 +634,8 @@ class OpenPLCRunner:
                     )
 
             # 4. Conectar via Modbus/TCP
-            client = ModbusTcpClient("127.0.0.1", port=502)
-            
-            # Compatibilidade com versões antigas e novas do pymodbus
-            try:
-                connect_result = client.connect()
-                if connect_result is False:
-                    raise ConnectionError("Não foi possível conectar ao OpenPLC via Modbus/TCP")
-            except (AttributeError, TypeError):
-                # Versão nova do pymodbus pode não ter connect() ou retornar diferente
-                pass
-            
-            time.sleep(0.5)
-
-            results = []
-
-            for step in test_cases:
-                inputs = step["inputs"]
-                expected = step["expected_outputs"]
-
-                # Escreve entradas digitais
-                for i, val in inputs.items():
-                    addr = int(i)
-                    result = client.write_coil(addr, val)
-                    
-                    # Verifica erro (compatível com versões antigas e novas)
-                    if hasattr(result, 'isError') and result.isError():
-                        raise RuntimeError(f"Erro ao escrever coil {addr}: {result}")
-                    elif hasattr(result, 'is_error') and result.is_error():
-                        raise RuntimeError(f"Erro ao escrever coil {addr}: {result}")
-
-                time.sleep(step.get("wait", 0.1))  # tempo em segundos
-
-                # Ler saídas
-                out_states = {}
-                for o in expected.keys():
-                    addr = int(o)
-                    result = client.read_coils(addr, 1)
-                    
-                    # Verifica erro (compatível com versões antigas e novas)
-                    if hasattr(result, 'isError') and result.isError():
-                        raise RuntimeError(f"Erro ao ler coil {addr}: {result}")
-                    elif hasattr(result, 'is_error') and result.is_error():
-                        raise RuntimeError(f"Erro ao ler coil {addr}: {result}")
-                    
-                    # Extrai o valor do bit (compatível com versões antigas e novas)
-                    if hasattr(result, 'bits') and len(result.bits) > 0:
-                        out_states[o] = result.bits[0]
-                    elif hasattr(result, 'getBit'):
-                        out_states[o] = result.getBit(0)
-                    else:
-                        raise RuntimeError(f"Não foi possível extrair o valor do coil {addr}")
-
-                # Comparação
-                correct = {k: (out_states[k] == expected[k]) for k in expected}
-
-                results.append({
-                    "inputs": inputs,
-                    "expected": expected,
-                    "got": out_states,
-                    "correct": correct
-                })
-
-            return results
-            
-        except Exception as e:
-            raise RuntimeError(f"Erro ao executar programa OpenPLC: {e}") from e
+            client = self.connect_modbus()
+            return self.run_steps(client, test_cases, io_plan)
             
         finally:
             # Limpeza
@@ -634,7 +648,7 @@ class OpenPLCRunner:
             # Só termina o webserver se nós o iniciamos (não estava rodando antes)
             if webserver_process and not (webserver_running or modbus_running):
                 try:
-                    print(f"[INFO] Encerrando processo de webserver...")
+                    logs.info(f"Encerrando processo de webserver...")
                     webserver_process.terminate()
                     webserver_process.wait(timeout=5)
                 except:
@@ -0,0 +1,98 @@
+"""
+Cópia de trabalho do webserver do OpenPLC para um runtime do pool.
+
+Instâncias que rodam da mesma instalação compartilham o binário
+core/openplc, o banco openplc.db, st_files/ e o programa ativo, e cada core
+escuta na porta interativa fixa 43628, por onde o webserver manda
+start_modbus/start_run. Cada RuntimeInstance roda então de uma cópia do
+diretório do webserver.py, com:
+
+- a porta interativa trocada nos fontes do core (o core da cópia é
+  recompilado a cada programa carregado) e, no lado Python, pelo
+  runtime_launcher.py (OPENPLC_INTERACTIVE_PORT);
+- a tabela Settings do banco da cópia com a porta Modbus da instância,
+  DNP3 e EtherNet/IP desabilitados e Start_run_mode = false, para o core
+  antigo da cópia (ainda na porta 43628) não subir com o webserver.
+
+Se a cópia não puder ser isolada (fontes do core sem a porta interativa,
+banco sem a tabela Settings), create_runtime_copy levanta RuntimeError e o
+runtime não inicia.
+"""
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+
+DEFAULT_INTERACTIVE_PORT = 43628
+CORE_SOURCE_SUFFIXES = {".c", ".cpp", ".h", ".hpp"}
+
+
+def create_runtime_copy(webserver_dir, index, modbus_port, interactive_port):
+    """
+    Copia o diretório do webserver.py para um diretório temporário próprio
+    e o configura para as portas da instância.
+
+    Returns:
+        caminho da cópia (o webserver.py fica na raiz dela).
+    """
+    webserver_dir = Path(webserver_dir)
+    root = Path(tempfile.mkdtemp(prefix=f"openplc_runtime_{index}_"))
+    workdir = root / webserver_dir.name
+    try:
+        shutil.copytree(webserver_dir, workdir, symlinks=True)
+        _patch_interactive_port(workdir / "core", interactive_port)
+        _configure_settings(workdir / "openplc.db", modbus_port)
+    except Exception:
+        shutil.rmtree(root, ignore_errors=True)
+        raise
+    return workdir
+
+
+def remove_runtime_copy(workdir):
+    if workdir:
+        shutil.rmtree(Path(workdir).parent, ignore_errors=True)
+
+
+def _patch_interactive_port(core_dir, port):
+    """Troca a porta interativa nos fontes do core da cópia."""
+    default = str(DEFAULT_INTERACTIVE_PORT)
+    patched = []
+    if core_dir.is_dir():
+        for path in core_dir.rglob("*"):
+            if path.suffix not in CORE_SOURCE_SUFFIXES or not path.is_file() or path.is_symlink():
+                continue
+            text = path.read_text(encoding="utf-8", errors="surrogateescape")
+            if default in text:
+                path.write_text(text.replace(default, str(port)), encoding="utf-8", errors="surrogateescape")
+                patched.append(path.name)
+    if not patched:
+        raise RuntimeError(
+            f"porta interativa {default} não encontrada nos fontes de {core_dir}: "
+            f"o core desta cópia colidiria com o das outras instâncias"
+        )
+    return patched
+
+
+def _configure_settings(db_path, modbus_port):
+    """Porta Modbus da instância, DNP3/EtherNet/IP desabilitados e sem iniciar em RUN."""
+    if not db_path.exists():
+        raise RuntimeError(f"banco do webserver não encontrado: {db_path}")
+    values = {
+        "Modbus_port": str(modbus_port),
+        "Dnp3_port": "disabled",
+        "Enip_port": "disabled",
+        "Start_run_mode": "false",
+    }
+    conn = sqlite3.connect(str(db_path))
+    try:
+        keys = {row[0] for row in conn.execute("SELECT Key FROM Settings")}
+        for key, value in values.items():
+            if key in keys:
+                conn.execute("UPDATE Settings SET Value = ? WHERE Key = ?", (value, key))
+        conn.commit()
+    except sqlite3.Error as e:
+        raise RuntimeError(f"não foi possível configurar {db_path}: {e}")
+    finally:
+        conn.close()
+    if "Modbus_port" not in keys:
+        raise RuntimeError(f"{db_path} não tem a configuração Modbus_port")
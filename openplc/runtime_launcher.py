@@ -0,0 +1,109 @@
+"""
+Inicia o webserver.py do OpenPLC nas portas de OPENPLC_MODBUS_PORT,
+OPENPLC_WEB_PORT e OPENPLC_INTERACTIVE_PORT.
+
+O webserver.py original ignora essas variáveis: a porta Modbus vem da
+tabela Settings do banco (passada a runtime.start_modbus), a porta web
+está fixa no app.run(port=8080) e a API do runtime (openplc.py, ao lado do
+webserver.py) fala com o core pela porta interativa fixa 43628. Este
+script executa o webserver.py como __main__ depois de trocar a porta em
+start_modbus, em Flask.run e nas conexões do openplc.py à porta
+interativa (o core da cópia de trabalho escuta na mesma porta; ver
+openplc/runtime_copy.py). Se algum desses pontos não existir, termina com
+erro em vez de deixar o runtime subir nas portas padrão, onde colidiria
+com as outras instâncias.
+
+Uso (feito pelo OpenPLCRunner):
+    python runtime_launcher.py caminho/para/webserver.py
+
+Deve ser executado como script, não como módulo do pacote: o webserver.py
+importa o próprio openplc.py, que tem o mesmo nome deste pacote.
+"""
+import os
+import runpy
+import socket
+import sys
+import types
+
+EXIT_PORTS_NOT_APPLIED = 3
+DEFAULT_INTERACTIVE_PORT = 43628
+
+
+def _fail(message):
+    print(f"[ERRO] runtime_launcher: {message}", flush=True)
+    sys.exit(EXIT_PORTS_NOT_APPLIED)
+
+
+def _patch_modbus_port(port):
+    try:
+        import openplc as runtime_api
+        original = runtime_api.runtime.start_modbus
+    except (ImportError, AttributeError) as e:
+        _fail(f"API do runtime sem start_modbus, porta Modbus {port} não aplicável ({e})")
+
+    def start_modbus(self, port_num=None, *args, **kwargs):
+        return original(self, port, *args, **kwargs)
+
+    runtime_api.runtime.start_modbus = start_modbus
+
+
+def _patch_interactive_port(port):
+    try:
+        import openplc as runtime_api
+        runtime_module = runtime_api.socket
+    except (ImportError, AttributeError) as e:
+        _fail(f"API do runtime sem o módulo socket, porta interativa {port} não aplicável ({e})")
+
+    class InstanceSocket(socket.socket):
+        def connect(self, address):
+            host, target = address[0], address[1]
+            if target == DEFAULT_INTERACTIVE_PORT:
+                address = (host, port) + tuple(address[2:])
+            return super().connect(address)
+
+    # Só o openplc.py vê o socket trocado; o Flask e o resto do processo usam o original
+    shim = types.ModuleType("socket")
+    shim.__dict__.update(vars(runtime_module))
+    shim.socket = InstanceSocket
+    runtime_api.socket = shim
+
+
+def _patch_web_port(port):
+    try:
+        import flask
+        original = flask.Flask.run
+    except (ImportError, AttributeError) as e:
+        _fail(f"Flask não encontrado, porta web {port} não aplicável ({e})")
+
+    def run(self, host=None, port_num=None, *args, **kwargs):
+        kwargs.pop("port", None)
+        return original(self, host, port, *args, **kwargs)
+
+    flask.Flask.run = run
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        _fail("uso: runtime_launcher.py <webserver.py>")
+    script = os.path.abspath(argv[0])
+    directory = os.path.dirname(script)
+
+    # Imports do webserver (openplc.py, pages.py...) resolvidos na pasta dele, não na deste script
+    sys.path[0] = directory
+    sys.argv = [script]
+
+    modbus_port = os.environ.get("OPENPLC_MODBUS_PORT")
+    web_port = os.environ.get("OPENPLC_WEB_PORT")
+    interactive_port = os.environ.get("OPENPLC_INTERACTIVE_PORT")
+    if modbus_port:
+        _patch_modbus_port(int(modbus_port))
+    if interactive_port:
+        _patch_interactive_port(int(interactive_port))
+    if web_port:
+        _patch_web_port(int(web_port))
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
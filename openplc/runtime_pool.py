@@ -0,0 +1,334 @@
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from openplc.ports import PortAllocator
+from openplc.runtime_copy import create_runtime_copy, remove_runtime_copy
+from openplc.readiness import OutputWatcher, port_open, wait_ready
+from openplc.sandbox import cleanup_sandbox
+from openplc.web_api import OpenPLCWebClient, WebInterfaceError
+
+import logs
+import tracing
+
+
+class RuntimeInstance:
+    """
+    Um processo webserver.py do OpenPLC com portas e cópia de trabalho próprias.
+
+    O webserver roda de uma cópia do diretório da instalação
+    (openplc/runtime_copy.py), com core, banco e programa ativo só seus, e
+    é iniciado pelo runtime_launcher.py, que aplica as portas Modbus, web e
+    interativa (OpenPLCRunner.runtime_command). Cada programa novo é
+    carregado pela interface web do próprio webserver, sem reiniciar o
+    processo; a compilação reinicia o core, então o cliente Modbus é
+    reaberto a cada carga, e a carga só vale depois que a marca do programa
+    (AddressMap.program_id) é lida pelo Modbus.
+    """
+
+    def __init__(self, runner, index, modbus_port, web_port, interactive_port, startup_timeout=10):
+        # Cópia do runner apontando para as portas desta instância
+        self.runner = runner.with_ports(modbus_port, web_port)
+        self.index = index
+        self.modbus_port = modbus_port
+        self.web_port = web_port
+        self.interactive_port = interactive_port
+        self.startup_timeout = startup_timeout
+        # Cópia do diretório do webserver.py (criada no primeiro start, mantida entre reinícios)
+        self.workdir = None
+        self.process = None
+        self.client = None
+        self.web = None
+        self.programs_run = 0
+        self.restarts = 0
+        # Marcado quando uma suíte assíncrona vence o prazo ou é cancelada
+        self.needs_restart = False
+        self.cold_start_s = None
+        self._log_file = None
+        self._watcher = None
+
+    @property
+    def name(self):
+        return f"runtime-{self.index} (Modbus {self.modbus_port}, web {self.web_port})"
+
+    def start(self):
+        script = self.runner.webserver_script
+        if not isinstance(script, Path) or not script.exists():
+            raise FileNotFoundError(f"Script webserver.py não encontrado: {script}")
+        if self.workdir is None:
+            try:
+                self.workdir = create_runtime_copy(script.parent, self.index, self.modbus_port, self.interactive_port)
+            except (OSError, RuntimeError) as e:
+                raise RuntimeError(f"{self.name}: cópia de trabalho do webserver não pôde ser isolada: {e}")
+        script = self.workdir / script.name
+        env = self.runner.runtime_env()
+        env["OPENPLC_INTERACTIVE_PORT"] = str(self.interactive_port)
+
+        # A saída vai para o log por uma thread que também detecta a marca de "escutando"
+        self._log_file = tempfile.NamedTemporaryFile(
+            prefix=f"openplc_runtime_{self.index}_", suffix=".log", delete=False
+        )
+        started = time.perf_counter()
+        self.process = subprocess.Popen(
+            self.runner.runtime_command(script),
+            cwd=str(script.parent),
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        self._watcher = OutputWatcher(self.process.stdout, self._log_file)
+
+        try:
+            # A carga dos programas é pela interface web; o Modbus só abre com um programa iniciado
+            wait_ready(self.process, [self.web_port], self.startup_timeout, self._watcher)
+        except RuntimeError as e:
+            raise RuntimeError(f"{self.name} {e}")
+        except TimeoutError:
+            self.stop()
+            raise TimeoutError(f"{self.name} não respondeu em {self.startup_timeout}s")
+        # Partida a frio: do Popen até a porta web aceitar conexões
+        self.cold_start_s = round(time.perf_counter() - started, 3)
+        tracing.record("runtime_start", started, time.perf_counter(), runtime=self.index)
+        # Sessão nova: o webserver reiniciado não reconhece a anterior
+        self.web = OpenPLCWebClient(self.runner.webserver_url)
+        logs.ok(f"{self.name} pronto em {self.cold_start_s}s")
+
+    def close(self):
+        """Encerra o processo e remove a cópia de trabalho."""
+        self.stop()
+        remove_runtime_copy(self.workdir)
+        self.workdir = None
+
+    def log_tail(self, lines=20):
+        if not self._log_file:
+            return ""
+        try:
+            text = Path(self._log_file.name).read_text(encoding="utf-8", errors="ignore")
+        except OSError:
+            return ""
+        return "\n".join(text.splitlines()[-lines:])
+
+    def healthy(self):
+        """Processo vivo, interface web aceitando conexões e, com um programa carregado, Modbus respondendo."""
+        if self.needs_restart:
+            return False
+        if self.process is None or self.process.poll() is not None or not port_open(self.web_port):
+            return False
+        if self.client is None:
+            return True
+        try:
+            result = self.client.read_coils(0, count=1)
+        except Exception:
+            return False
+        if hasattr(result, 'isError') and result.isError():
+            return False
+        if hasattr(result, 'is_error') and result.is_error():
+            return False
+        return True
+
+    def restart(self):
+        logs.warning(f"{self.name} não está saudável, reiniciando...")
+        self.stop()
+        self.restarts += 1
+        self.needs_restart = False
+        self.start()
+
+    def load(self, compile_result, program_id):
+        """
+        Carrega um programa no runtime pela interface web do webserver.py
+        (login, upload, compilação e início; ver openplc.web_api) e só
+        considera a carga feita quando a marca program_id é lida pelo
+        Modbus. O sandbox é removido ao final. Levanta RuntimeError se algum
+        passo falhar ou se o runtime continuar executando outro programa.
+        """
+        try:
+            with tracing.span("program_load", runtime=self.index):
+                try:
+                    self.web.load_program(compile_result["program_path"])
+                except (WebInterfaceError, OSError) as e:
+                    raise RuntimeError(f"{self.name}: falha ao carregar o programa pela interface web: {e}") from e
+                # A compilação para o core e o start_plc o reinicia: a conexão Modbus antiga caiu
+                self._reconnect()
+                if not self.runner.wait_program(self.client, program_id):
+                    raise RuntimeError(
+                        f"{self.name} compilou e iniciou o programa, mas a marca {program_id} "
+                        f"não foi lida em {self.runner.LOAD_TIMEOUT}s"
+                    )
+        finally:
+            cleanup_sandbox(compile_result)
+
+    def _reconnect(self):
+        """Reabre o cliente Modbus assim que o core reiniciado aceitar conexões."""
+        if self.client:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+            self.client = None
+        deadline = time.perf_counter() + self.runner.LOAD_TIMEOUT
+        while True:
+            if port_open(self.modbus_port):
+                try:
+                    self.client = self.runner.connect_modbus()
+                    return
+                except ConnectionError:
+                    pass
+            if time.perf_counter() >= deadline:
+                raise RuntimeError(f"{self.name}: Modbus não voltou em {self.runner.LOAD_TIMEOUT}s após iniciar o programa")
+            time.sleep(self.runner.SCAN_CYCLE)
+
+    def run(self, test_cases, io_plan):
+        results = self.runner.run_steps(self.client, test_cases, io_plan)
+        self.programs_run += 1
+        return results
+
+    def stop(self):
+        if self.client:
+            try:
+                self.client.close()
+            except:
+                pass
+            self.client = None
+        if self.process:
+            try:
+                self.process.terminate()
+                self.process.wait(timeout=5)
+            except:
+                try:
+                    self.process.kill()
+                except:
+                    pass
+            self.process = None
+        if self._log_file:
+            self._log_file.close()
+            try:
+                os.unlink(self._log_file.name)
+            except OSError:
+                pass
+            self._log_file = None
+
+
+class RuntimePool:
+    """
+    Pool de runtimes OpenPLC mantidos quentes durante toda a avaliação.
+
+    Os N processos são iniciados uma única vez, cada um com portas Modbus,
+    web e interativa não privilegiadas reservadas pelo PortAllocator e sua
+    própria cópia de trabalho do webserver. Para cada programa
+    um runtime ocioso é reservado, checado (e reiniciado se necessário),
+    recebe o programa e executa os testes, e volta ao pool. O custo por candidato fica em compilação + testes.
+
+    Com async_io=True os passos dos testes rodam no AsyncModbusDriver: um
+    único event loop intercala as esperas de todos os runtimes, com prazo e
+    cancelamento por suíte.
+    """
+
+    def __init__(self, runner, size=2, port_allocator=None, startup_timeout=10, async_io=False):
+        self.runner = runner
+        self.size = size
+        self.async_io = async_io
+        self.driver = None
+        self.ports = port_allocator or PortAllocator()
+        self.instances = [
+            RuntimeInstance(
+                runner, i, self.ports.allocate(), self.ports.allocate(), self.ports.allocate(), startup_timeout
+            )
+            for i in range(size)
+        ]
+        self._idle = queue.Queue()
+
+    def start(self):
+        """Inicia todos os runtimes em paralelo."""
+        errors = []
+
+        def start_instance(instance):
+            try:
+                instance.start()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=start_instance, args=(inst,)) for inst in self.instances]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if errors:
+            self.close()
+            raise RuntimeError(f"Falha ao iniciar o pool de runtimes: {errors[0]}")
+
+        if self.async_io:
+            from openplc.async_runner import AsyncModbusDriver
+            try:
+                # As conexões de cada runtime são abertas a cada programa carregado (evaluate)
+                self.driver = AsyncModbusDriver(self.runner)
+            except Exception as e:
+                self.close()
+                raise RuntimeError(f"Falha ao iniciar o cliente Modbus assíncrono: {e}")
+
+        for instance in self.instances:
+            self._idle.put(instance)
+        mode = " (E/S assíncrona)" if self.driver else ""
+        logs.info(f"Pool de runtimes: {self.size} instâncias prontas{mode}")
+        return self
+
+    def acquire(self, timeout=None):
+        instance = self._idle.get(timeout=timeout)
+        if not instance.healthy():
+            try:
+                instance.restart()
+                if self.driver:
+                    self.driver.disconnect(instance)
+            except Exception:
+                # Devolve ao pool para uma nova tentativa na próxima reserva
+                self._idle.put(instance)
+                raise
+        return instance
+
+    def release(self, instance):
+        self._idle.put(instance)
+
+    def evaluate(self, compile_result, test_cases, program_id, io_plan):
+        """
+        Carrega o programa em um runtime ocioso e executa os testes.
+
+        program_id é a marca do código instrumentado (AddressMap.program_id),
+        usada para confirmar a carga antes dos testes, e io_plan o
+        ModbusIOPlan montado com o mesmo AddressMap.
+        """
+        instance = self.acquire()
+        try:
+            instance.load(compile_result, program_id)
+            if self.driver:
+                # O core reiniciou com o programa novo: a conexão assíncrona também é reaberta
+                self.driver.connect(instance)
+                return self.driver.run(instance, test_cases, io_plan)
+            return instance.run(test_cases, io_plan)
+        finally:
+            self.release(instance)
+
+    def stats(self):
+        return [
+            {
+                "modbus_port": inst.modbus_port,
+                "web_port": inst.web_port,
+                "cold_start_s": inst.cold_start_s,
+                "programs_run": inst.programs_run,
+                "restarts": inst.restarts,
+            }
+            for inst in self.instances
+        ]
+
+    def close(self):
+        if self.driver:
+            self.driver.close()
+            self.driver = None
+        for instance in self.instances:
+            instance.close()
+            self.ports.release(instance.modbus_port)
+            self.ports.release(instance.web_port)
+            self.ports.release(instance.interactive_port)
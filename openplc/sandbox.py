@@ -0,0 +1,129 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+
+def prepare_sandbox(spec, st_source):
+    """
+    Cria um diretório temporário exclusivo para uma compilação.
+
+    O program.st é gravado no sandbox e, para o MatIEC, o diretório lib/ com
+    ieclib.txt é ligado por symlink (ou copiado, se symlinks não forem
+    permitidos), pois o iec2c procura lib/ relativo ao diretório de execução.
+    """
+    sandbox = Path(tempfile.mkdtemp(prefix="plc_compile_"))
+    program = sandbox / "program.st"
+    program.write_text(st_source, encoding="utf-8")
+
+    lib_path = spec.get("lib_path")
+    if spec["mode"] == "iec2c" and lib_path:
+        try:
+            os.symlink(lib_path, sandbox / "lib", target_is_directory=True)
+        except (OSError, NotImplementedError):
+            shutil.copytree(lib_path, sandbox / "lib")
+
+    return sandbox, program
+
+
+def compile_in_sandbox(spec, st_source):
+    """
+    Compila um código ST em um sandbox próprio.
+
+    É uma função de módulo (e recebe apenas dados serializáveis) para poder
+    rodar em um ProcessPoolExecutor. A forma de chamar o compilador é a mesma
+    do OpenPLCRunner; só o diretório de trabalho passa a ser o sandbox.
+
+    Args:
+        spec: dict gerado por OpenPLCRunner.compile_spec().
+        st_source: conteúdo do programa ST.
+
+    Returns:
+        dict com returncode, stdout, stderr, sandbox, program_path, artifacts
+        (arquivos gerados pelo compilador dentro do sandbox) e compile_time_s
+        (duração medida no próprio processo, sem a espera na fila do pool).
+    """
+    started = time.perf_counter()
+    sandbox, program = prepare_sandbox(spec, st_source)
+    mode = spec["mode"]
+    compiler_path = spec["compiler_path"]
+
+    if mode == "script":
+        script = Path(spec["compile_script"])
+        if script.suffix == ".sh":
+            # Script bash (pode precisar de WSL no Windows)
+            compile_result = subprocess.run(
+                ["bash", str(script), str(program)],
+                cwd=str(script.parent),
+                capture_output=True,
+                text=True,
+                check=False
+            )
+        else:
+            # Script batch (.bat)
+            compile_result = subprocess.run(
+                [str(script), str(program)],
+                cwd=str(script.parent),
+                capture_output=True,
+                text=True,
+                check=False,
+                shell=True
+            )
+    elif mode == "iec2c":
+        # MatIEC: executa no sandbox, onde lib/ está disponível
+        compile_result = subprocess.run(
+            [str(compiler_path), program.name],
+            cwd=str(sandbox),
+            capture_output=True,
+            text=True,
+            check=False
+        )
+    else:
+        # Compilador padrão (openplc) - lê program.st do diretório atual
+        compile_result = subprocess.run(
+            [str(compiler_path)],
+            cwd=str(sandbox),
+            capture_output=True,
+            text=True,
+            check=False
+        )
+
+    artifacts = sorted(
+        str(p.relative_to(sandbox)) for p in sandbox.rglob("*")
+        if p.is_file() and p != program and "lib" not in p.relative_to(sandbox).parts[:1]
+    )
+
+    return {
+        "returncode": compile_result.returncode,
+        "stdout": compile_result.stdout,
+        "stderr": compile_result.stderr,
+        "sandbox": str(sandbox),
+        "program_path": str(program),
+        "artifacts": artifacts,
+        "compile_time_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def install_artifacts(compile_result, target_dir):
+    """
+    Copia os arquivos gerados pelo compilador (artifacts) do sandbox para
+    target_dir, mantendo os caminhos relativos. Retorna a lista copiada.
+    """
+    sandbox = Path(compile_result["sandbox"])
+    target_dir = Path(target_dir)
+    installed = []
+    for rel in compile_result.get("artifacts", []):
+        target = target_dir / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(sandbox / rel, target)
+        installed.append(str(target))
+    return installed
+
+
+def cleanup_sandbox(compile_result):
+    """Remove o diretório temporário de uma compilação."""
+    sandbox = compile_result.get("sandbox") if compile_result else None
+    if sandbox:
+        shutil.rmtree(sandbox, ignore_errors=True)
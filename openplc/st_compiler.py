@@ -0,0 +1,676 @@
+"""
+Tradução de programas ST (árvore de st_interpreter) para funções Python.
+
+Cada POU vira uma função 'pou_<NOME>(sim, s)' gerada uma única vez e
+compilada com compile()/exec; um ciclo de varredura passa a ser uma chamada
+dessa função sobre o estado da instância (Scope.vars e a imagem de E/S), sem
+percorrer a árvore. Os resultados ficam em cache pelo hash do código fonte.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from openplc.st_interpreter import (
+    INT_TYPES, REAL_TYPES, STANDARD_FBS, STANDARD_FUNCTIONS, STRING_TYPES, TIME_TYPES,
+    Node, STArray, STProgram, STRuntimeError, Scope, Simulation, StandardFB,
+    address_type, coerce, conversion_target, convert, st_div, st_mod,
+)
+
+_COMPARISONS = {"=": "==", "<>": "!=", "<": "<", ">": ">", "<=": "<=", ">=": ">="}
+_ARITHMETIC = {"+": "+", "-": "-", "*": "*"}
+
+
+def _static_kind(type_name):
+    """Classe do tipo para inferência: BOOL, INT, REAL, STRING ou None."""
+    if type_name == "BOOL":
+        return "BOOL"
+    if type_name in INT_TYPES or type_name in TIME_TYPES:
+        return "INT"
+    if type_name in REAL_TYPES:
+        return "REAL"
+    if type_name in STRING_TYPES:
+        return "STRING"
+    return None
+
+
+def _and(a, b):
+    return (a and b) if isinstance(a, bool) else a & b
+
+
+def _or(a, b):
+    return (a or b) if isinstance(a, bool) else a | b
+
+
+def _xor(a, b):
+    return (a != b) if isinstance(a, bool) else a ^ b
+
+
+def _not(a):
+    return (not a) if isinstance(a, bool) else ~a
+
+
+def _member(obj, name):
+    if not isinstance(obj, Scope) or name not in obj.vars:
+        raise STRuntimeError(f"membro inexistente: {name}")
+    return obj.vars[name]
+
+
+def _set_member(obj, name, value):
+    if not isinstance(obj, Scope):
+        raise STRuntimeError(f"'{name}' não é membro de uma estrutura ou bloco")
+    obj.vars[name] = coerce(obj.types.get(name), value)
+
+
+def _aget(arr, indices):
+    if not isinstance(arr, STArray):
+        raise STRuntimeError("indexação de variável que não é array")
+    return arr.data[arr.offset(indices)]
+
+
+def _aset(arr, indices, value):
+    if not isinstance(arr, STArray):
+        raise STRuntimeError("indexação de variável que não é array")
+    arr.data[arr.offset(indices)] = coerce(arr.elem_type, value)
+
+
+def _undeclared(name):
+    raise STRuntimeError(f"variável não declarada: {name}")
+
+
+def _loop_limit():
+    raise STRuntimeError("laço excedeu o limite de iterações (possível laço infinito)")
+
+
+def _for_step_zero():
+    raise STRuntimeError("FOR com passo zero")
+
+
+class _CodeGen:
+    """Gera o código Python de todas as POUs de um STProgram."""
+
+    def __init__(self, program):
+        self.program = program
+        self.lines = []
+        self.nodes = []       # nós usados pelo fallback para o interpretador
+        self.counter = 0
+        self.pou = None
+        self.symbols = {}
+        self.globals = self._global_symbols()
+
+    # -- utilitários --------------------------------------------------------
+
+    def emit(self, depth, text):
+        self.lines.append("    " * depth + text)
+
+    def tmp(self, prefix):
+        self.counter += 1
+        return f"_{prefix}{self.counter}"
+
+    def node_ref(self, node):
+        self.nodes.append(node)
+        return f"NODES[{len(self.nodes) - 1}]"
+
+    def type_name(self, type_spec):
+        if type_spec is None or type_spec.kind == "array_type":
+            return None
+        name = type_spec.name
+        alias = self.program.types.get(name)
+        if alias is not None and alias.kind == "alias":
+            return self.type_name(alias.type)
+        return name
+
+    def _global_symbols(self):
+        symbols = {}
+        for decl in self.program.unit.globals:
+            symbols[decl.name] = {
+                "where": "located" if decl.address else "global",
+                "type": self.type_name(decl.type),
+                "spec": decl.type,
+                "address": decl.address,
+            }
+        return symbols
+
+    def pou_symbols(self, pou):
+        symbols = {}
+        for decl in pou.decls:
+            if decl.block == "VAR_EXTERNAL":
+                continue
+            symbols[decl.name] = {
+                "where": "located" if decl.address else "local",
+                "type": self.type_name(decl.type),
+                "spec": decl.type,
+                "address": decl.address,
+            }
+        if pou.pou_type == "FUNCTION" and pou.return_type is not None:
+            symbols[pou.name] = {"where": "local", "type": self.type_name(pou.return_type),
+                                 "spec": pou.return_type, "address": None}
+        return symbols
+
+    def symbol(self, name):
+        return self.symbols.get(name) or self.globals.get(name)
+
+    # -- POUs -----------------------------------------------------------------
+
+    def generate(self):
+        for pou in self.program.unit.pous:
+            self.pou = pou
+            self.symbols = self.pou_symbols(pou)
+            self.emit(0, f"def pou_{pou.name}(sim, s):")
+            self.emit(1, "v = s.vars")
+            self.emit(1, "img = sim.image")
+            self.emit(1, "g = sim.globals.vars")
+            self.block(pou.body, 1, loop=False)
+            self.emit(1, "return")
+            self.emit(0, "")
+        return "\n".join(self.lines) + "\n"
+
+    # -- expressões -----------------------------------------------------------
+
+    def kind_of(self, expr):
+        """Inferência simples de tipo estático (para evitar conversões desnecessárias)."""
+        k = expr.kind
+        if k == "lit":
+            value = expr.value
+            if isinstance(value, bool):
+                return "BOOL"
+            if isinstance(value, int):
+                return "INT"
+            if isinstance(value, float):
+                return "REAL"
+            return "STRING"
+        if k == "var":
+            sym = self.symbol(expr.name)
+            return _static_kind(sym["type"]) if sym else None
+        if k == "addr":
+            return _static_kind(address_type(expr.address))
+        if k == "bit":
+            return "BOOL"
+        if k == "unop":
+            inner = self.kind_of(expr.operand)
+            if expr.op == "NOT":
+                return inner if inner in ("BOOL", "INT") else None
+            return inner if inner in ("INT", "REAL") else None
+        if k == "binop":
+            op = expr.op
+            if op in _COMPARISONS:
+                return "BOOL"
+            left, right = self.kind_of(expr.left), self.kind_of(expr.right)
+            if op in ("AND", "OR", "XOR"):
+                return left if left == right and left in ("BOOL", "INT") else None
+            if op in ("+", "-", "*", "/", "MOD"):
+                if left == right == "INT":
+                    return "INT"
+                if left in ("INT", "REAL") and right in ("INT", "REAL"):
+                    return "REAL"
+                return None
+            if op == "**":
+                return "REAL"
+        if k == "index" and expr.obj.kind == "var":
+            sym = self.symbol(expr.obj.name)
+            if sym and sym["spec"].kind == "array_type":
+                return _static_kind(self.type_name(sym["spec"].elem))
+            return None
+        if k == "member":
+            obj_type = self.static_type(expr.obj)
+            fb = STANDARD_FBS.get(obj_type)
+            if fb is not None:
+                return _static_kind({**fb.INPUTS, **fb.OUTPUTS}.get(expr.name))
+            pou = self.program.pous.get(obj_type)
+            if pou is not None:
+                for decl in pou.decls:
+                    if decl.name == expr.name:
+                        return _static_kind(self.type_name(decl.type))
+            return None
+        if k == "call" and expr.func.kind == "var":
+            name = expr.func.name
+            pou = self.program.pous.get(name)
+            if pou is not None and pou.pou_type == "FUNCTION":
+                return _static_kind(self.type_name(pou.return_type))
+            target = conversion_target(name)
+            if target:
+                return _static_kind(target)
+        return None
+
+    def static_type(self, expr):
+        """Nome do tipo declarado de uma variável simples (ex.: 'TON'), ou None."""
+        if expr.kind == "var":
+            sym = self.symbol(expr.name)
+            return sym["type"] if sym else None
+        return None
+
+    def coerce_code(self, type_name, code, kind):
+        if type_name is None:
+            return code
+        if type_name == "BOOL":
+            return code if kind == "BOOL" else f"bool({code})"
+        spec = INT_TYPES.get(type_name)
+        if spec:
+            bits, signed = spec
+            mask = (1 << bits) - 1
+            if kind != "INT":
+                return f"coerce({type_name!r}, {code})"
+            if signed:
+                half = 1 << (bits - 1)
+                return f"((({code}) + {half}) & {mask}) - {half}"
+            return f"(({code}) & {mask})"
+        if type_name in REAL_TYPES:
+            return code if kind == "REAL" else f"float({code})"
+        if type_name in TIME_TYPES:
+            return code if kind == "INT" else f"int({code})"
+        if type_name in STRING_TYPES:
+            return code if kind == "STRING" else f"str({code})"
+        return code
+
+    def expr(self, e):
+        k = e.kind
+        if k == "lit":
+            return repr(e.value)
+        if k == "var":
+            return self.read_var(e.name)
+        if k == "addr":
+            return f"img.get({e.address!r}, {coerce(address_type(e.address), 0)!r})"
+        if k == "unop":
+            inner = self.expr(e.operand)
+            if e.op == "NOT":
+                return f"(not {inner})" if self.kind_of(e.operand) == "BOOL" else f"_not({inner})"
+            return f"(-{inner})"
+        if k == "binop":
+            return self.binop(e)
+        if k == "member":
+            return f"_member({self.expr(e.obj)}, {e.name!r})"
+        if k == "index":
+            indices = ", ".join(self.expr(i) for i in e.indices)
+            return f"_aget({self.expr(e.obj)}, ({indices},))"
+        if k == "bit":
+            return f"bool((int({self.expr(e.obj)}) >> {e.bit}) & 1)"
+        if k == "call":
+            return self.call_expr(e)
+        raise STRuntimeError(f"expressão não suportada: {k}")
+
+    def read_var(self, name):
+        sym = self.symbol(name)
+        if sym is None:
+            if name in self.program.enum_values:
+                return repr(self.program.enum_values[name])
+            return f"_undeclared({name!r})"
+        if sym["where"] == "located":
+            address = sym["address"]
+            return f"img.get({address!r}, {coerce(address_type(address), 0)!r})"
+        container = "v" if name in self.symbols else "g"
+        return f"{container}[{name!r}]"
+
+    def binop(self, e):
+        left, right = self.expr(e.left), self.expr(e.right)
+        op = e.op
+        if op in _COMPARISONS:
+            return f"({left} {_COMPARISONS[op]} {right})"
+        if op in _ARITHMETIC:
+            return f"({left} {_ARITHMETIC[op]} {right})"
+        both_bool = self.kind_of(e.left) == "BOOL" and self.kind_of(e.right) == "BOOL"
+        if op == "AND":
+            return f"({left} and {right})" if both_bool else f"_and({left}, {right})"
+        if op == "OR":
+            return f"({left} or {right})" if both_bool else f"_or({left}, {right})"
+        if op == "XOR":
+            return f"({left} != {right})" if both_bool else f"_xor({left}, {right})"
+        if op == "/":
+            return f"st_div({left}, {right})"
+        if op == "MOD":
+            return f"st_mod({left}, {right})"
+        if op == "**":
+            return f"(float({left}) ** {right})"
+        raise STRuntimeError(f"operador não suportado: {op}")
+
+    def call_expr(self, e):
+        func = e.func
+        if func.kind == "var" and self.symbol(func.name) is None:
+            name = func.name
+            pou = self.program.pous.get(name)
+            if pou is not None and pou.pou_type == "FUNCTION":
+                has_in_outs = any(d.block == "VAR_IN_OUT" for d in pou.decls)
+                if has_in_outs or any(output for _, _, output in e.args):
+                    return f"sim.call({self.node_ref(e)}, s)"
+                args = self.bind_args(self.param_order(pou), e.args)
+                if args is None:
+                    return f"sim.call({self.node_ref(e)}, s)"
+                items = ", ".join(f"{n!r}: {c}" for n, c in args)
+                return f"call_function(sim, {pou.name!r}, {{{items}}})"
+            args = ", ".join(self.expr(value) for _, value, _ in e.args)
+            if name in STANDARD_FUNCTIONS:
+                return f"F[{name!r}]({args})"
+            target = conversion_target(name)
+            if target and len(e.args) == 1:
+                if target in REAL_TYPES and self.kind_of(e.args[0][1]) == "INT":
+                    return f"float({args})"
+                return f"convert({target!r}, {args})"
+            return f"sim.call({self.node_ref(e)}, s)"
+        # Bloco funcional usado como expressão: executa e retorna None
+        return f"sim.call({self.node_ref(e)}, s)"
+
+    def param_order(self, pou):
+        inputs = [d.name for d in pou.decls if d.block == "VAR_INPUT"]
+        in_outs = [d.name for d in pou.decls if d.block == "VAR_IN_OUT"]
+        return inputs + in_outs
+
+    def bind_args(self, order, args):
+        """Resolve argumentos posicionais/nomeados em [(parâmetro, código)], ou None."""
+        bound = []
+        positional = 0
+        for name, value, output in args:
+            if output:
+                continue
+            if name is None:
+                if positional >= len(order):
+                    return None
+                name = order[positional]
+                positional += 1
+            bound.append((name, self.expr(value)))
+        return bound
+
+    # -- comandos -------------------------------------------------------------
+
+    def block(self, body, depth, loop):
+        if not body:
+            self.emit(depth, "pass")
+            return
+        for stmt in body:
+            self.stmt(stmt, depth, loop)
+
+    def assign(self, target, code, kind, depth):
+        k = target.kind
+        if k == "var":
+            sym = self.symbol(target.name)
+            if sym is None:
+                self.emit(depth, f"_undeclared({target.name!r})")
+            elif sym["where"] == "located":
+                address = sym["address"]
+                self.emit(depth, f"img[{address!r}] = {self.coerce_code(address_type(address), code, kind)}")
+            else:
+                container = "v" if target.name in self.symbols else "g"
+                self.emit(depth, f"{container}[{target.name!r}] = {self.coerce_code(sym['type'], code, kind)}")
+        elif k == "addr":
+            self.emit(depth, f"img[{target.address!r}] = {self.coerce_code(address_type(target.address), code, kind)}")
+        elif k == "member":
+            self.emit(depth, f"_set_member({self.expr(target.obj)}, {target.name!r}, {code})")
+        elif k == "index":
+            indices = ", ".join(self.expr(i) for i in target.indices)
+            self.emit(depth, f"_aset({self.expr(target.obj)}, ({indices},), {code})")
+        elif k == "bit":
+            current = self.tmp("bits")
+            self.emit(depth, f"{current} = int({self.expr(target.obj)})")
+            self.emit(depth, f"{current} = ({current} | {1 << target.bit}) if ({code}) else ({current} & {~(1 << target.bit)})")
+            self.assign(target.obj, current, "INT", depth)
+        else:
+            raise STRuntimeError(f"destino de atribuição inválido: {k}")
+
+    def stmt(self, st, depth, loop):
+        k = st.kind
+        if k == "assign":
+            self.assign(st.target, self.expr(st.value), self.kind_of(st.value), depth)
+        elif k == "call_stmt":
+            self.call_stmt(st.call, depth)
+        elif k == "if":
+            for i, (cond, body) in enumerate(st.branches):
+                self.emit(depth, f"{'if' if i == 0 else 'elif'} {self.expr(cond)}:")
+                self.block(body, depth + 1, loop)
+            if st.else_body:
+                self.emit(depth, "else:")
+                self.block(st.else_body, depth + 1, loop)
+        elif k == "case":
+            selector = self.tmp("sel")
+            self.emit(depth, f"{selector} = {self.expr(st.selector)}")
+            first = True
+            for labels, body in st.entries:
+                tests = []
+                for label in labels:
+                    if label[0] == "value":
+                        tests.append(f"{selector} == {self.expr(label[1])}")
+                    else:
+                        tests.append(f"{self.expr(label[1])} <= {selector} <= {self.expr(label[2])}")
+                self.emit(depth, f"{'if' if first else 'elif'} {' or '.join(tests)}:")
+                self.block(body, depth + 1, loop)
+                first = False
+            if st.else_body:
+                if first:
+                    self.block(st.else_body, depth, loop)
+                else:
+                    self.emit(depth, "else:")
+                    self.block(st.else_body, depth + 1, loop)
+        elif k == "for":
+            self.for_stmt(st, depth)
+        elif k == "while":
+            guard = self.tmp("n")
+            self.emit(depth, f"{guard} = 0")
+            self.emit(depth, f"while {self.expr(st.cond)}:")
+            self.emit_guard(guard, depth + 1)
+            self.block(st.body, depth + 1, loop=True)
+        elif k == "repeat":
+            guard, first = self.tmp("n"), self.tmp("first")
+            self.emit(depth, f"{guard} = 0")
+            self.emit(depth, f"{first} = True")
+            self.emit(depth, f"while {first} or not ({self.expr(st.cond)}):")
+            self.emit(depth + 1, f"{first} = False")
+            self.emit_guard(guard, depth + 1)
+            self.block(st.body, depth + 1, loop=True)
+        elif k == "exit":
+            self.emit(depth, "break" if loop else "pass")
+        elif k == "continue":
+            self.emit(depth, "continue" if loop else "pass")
+        elif k == "return":
+            self.emit(depth, "return")
+        else:
+            raise STRuntimeError(f"comando não suportado: {k}")
+
+    def emit_guard(self, guard, depth):
+        self.emit(depth, f"{guard} += 1")
+        self.emit(depth, f"if {guard} > MAX_LOOP_ITERATIONS:")
+        self.emit(depth + 1, "_loop_limit()")
+
+    def for_stmt(self, st, depth):
+        # Como no interpretador, a condição usa o valor antes do ajuste ao tipo
+        # da variável de controle (FOR i: SINT := 0 TO 127 termina em 128)
+        var = Node("var", st.line, name=st.var)
+        value, end, step = self.tmp("x"), self.tmp("end"), self.tmp("step")
+        guard, first = self.tmp("n"), self.tmp("first")
+        int_loop = self.kind_of(var) == "INT" and self.kind_of(st.start) == "INT" and (
+            st.step is None or self.kind_of(st.step) == "INT")
+        kind = "INT" if int_loop else None
+
+        self.emit(depth, f"{value} = {self.expr(st.start)}")
+        self.emit(depth, f"{end} = {self.expr(st.end)}")
+        self.emit(depth, f"{step} = {self.expr(st.step) if st.step is not None else '1'}")
+        if st.step is None or (st.step.kind == "lit" and isinstance(st.step.value, int)):
+            step_value = 1 if st.step is None else st.step.value
+            if step_value == 0:
+                self.emit(depth, "_for_step_zero()")
+            cond = f"{value} {'<=' if step_value > 0 else '>='} {end}"
+        else:
+            self.emit(depth, f"if {step} == 0:")
+            self.emit(depth + 1, "_for_step_zero()")
+            cond = f"(({value} <= {end}) if {step} > 0 else ({value} >= {end}))"
+        self.assign(var, value, kind, depth)
+
+        # CONTINUE precisa passar pelo incremento: ele fica no início da volta
+        self.emit(depth, f"{guard} = 0")
+        self.emit(depth, f"{first} = True")
+        self.emit(depth, "while True:")
+        self.emit(depth + 1, f"if {first}:")
+        self.emit(depth + 2, f"{first} = False")
+        self.emit(depth + 1, "else:")
+        self.emit(depth + 2, f"{value} = {self.read_var(st.var)} + {step}")
+        self.assign(var, value, kind, depth + 2)
+        self.emit(depth + 1, f"if not ({cond}):")
+        self.emit(depth + 2, "break")
+        self.emit_guard(guard, depth + 1)
+        self.block(st.body, depth + 1, loop=True)
+
+    def call_stmt(self, call, depth):
+        func = call.func
+        if func.kind == "var" and self.symbol(func.name) is None:
+            # Função usada como comando: avalia e descarta o resultado
+            self.emit(depth, self.call_expr(call))
+            return
+
+        type_name = self.static_type(func)
+        fb = STANDARD_FBS.get(type_name)
+        pou = self.program.pous.get(type_name)
+        if fb is None and (pou is None or pou.pou_type != "FUNCTION_BLOCK"):
+            self.emit(depth, f"sim.call({self.node_ref(call)}, s)")
+            return
+
+        if fb is not None:
+            types = {**fb.INPUTS, **fb.OUTPUTS}
+            order, in_outs = list(fb.INPUTS), []
+        else:
+            types = {d.name: self.type_name(d.type) for d in pou.decls}
+            order = self.param_order(pou)
+            in_outs = [d.name for d in pou.decls if d.block == "VAR_IN_OUT"]
+
+        bound = []
+        outputs = []
+        positional = 0
+        for name, value, output in call.args:
+            if output:
+                outputs.append((name, value))
+                continue
+            if name is None:
+                if positional >= len(order):
+                    self.emit(depth, f"sim.call({self.node_ref(call)}, s)")
+                    return
+                name = order[positional]
+                positional += 1
+            if name not in types:
+                self.emit(depth, f"sim.call({self.node_ref(call)}, s)")
+                return
+            if name in in_outs:
+                outputs.append((name, value))
+            bound.append((name, value))
+
+        obj, ov = self.tmp("fb"), self.tmp("fbv")
+        self.emit(depth, f"{obj} = {self.expr(func)}")
+        self.emit(depth, f"{ov} = {obj}.vars")
+        for name, value in bound:
+            self.emit(depth, f"{ov}[{name!r}] = {self.coerce_code(types.get(name), self.expr(value), self.kind_of(value))}")
+        if fb is not None:
+            self.emit(depth, f"{obj}.execute(sim.clock_ms)")
+        else:
+            self.emit(depth, f"pou_{pou.name}(sim, {obj})")
+        for name, target in outputs:
+            self.assign(target, f"{ov}[{name!r}]", _static_kind(types.get(name)), depth)
+
+
+class CompiledProgram:
+    """Funções Python geradas para as POUs de um STProgram."""
+
+    def __init__(self, program):
+        self.program = program
+        gen = _CodeGen(program)
+        self.python_source = gen.generate()
+        digest = hashlib.sha256(program.source.encode("utf-8")).hexdigest()[:12]
+        code = compile(self.python_source, f"<st:{digest}>", "exec")
+        self.namespace = {
+            "NODES": gen.nodes,
+            "F": STANDARD_FUNCTIONS,
+            "MAX_LOOP_ITERATIONS": Simulation.MAX_LOOP_ITERATIONS,
+            "coerce": coerce,
+            "convert": convert,
+            "st_div": st_div,
+            "st_mod": st_mod,
+            "call_function": _call_function,
+            "_and": _and, "_or": _or, "_xor": _xor, "_not": _not,
+            "_member": _member, "_set_member": _set_member,
+            "_aget": _aget, "_aset": _aset,
+            "_undeclared": _undeclared, "_loop_limit": _loop_limit, "_for_step_zero": _for_step_zero,
+        }
+        exec(code, self.namespace)
+        self.functions = {pou.name: self.namespace[f"pou_{pou.name}"] for pou in program.unit.pous}
+        self.entry = self.functions[program.entry.name]
+
+
+def _call_function(sim, name, args):
+    """Chamada de FUNCTION do usuário a partir do código gerado."""
+    pou = sim.program.pous[name]
+    frame = sim.new_frame(pou)
+    for param, value in args.items():
+        if param not in frame.vars and param not in frame.located:
+            raise STRuntimeError(f"parâmetro inexistente: {param}")
+        frame.vars[param] = coerce(frame.types.get(param), value)
+    sim.compiled.functions[name](sim, frame)
+    return frame.vars.get(name)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+CACHE_SIZE = 256
+
+
+def compile_source(source):
+    """
+    Analisa e traduz um código ST, reaproveitando o resultado de um código
+    idêntico já compilado (cache LRU pelo SHA-256 do fonte).
+    """
+    key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+    compiled = CompiledProgram(STProgram(source))
+    with _cache_lock:
+        _cache[key] = compiled
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+class CompiledSimulation(Simulation):
+    """Simulation cujo scan chama a função gerada da unidade principal."""
+
+    def __init__(self, compiled, scan_cycle_ms=None):
+        self.compiled = compiled
+        self._frame_templates = {}
+        super().__init__(compiled.program, scan_cycle_ms)
+
+    def new_frame(self, pou):
+        """Escopo novo para uma chamada de FUNCTION (cópia rasa de um modelo quando possível)."""
+        template = self._frame_templates.get(pou.name)
+        if template is None:
+            template = self.instantiate(pou)
+            simple = all(isinstance(v, (bool, int, float, str)) for v in template.vars.values())
+            self._frame_templates[pou.name] = template = (template, simple)
+        scope, simple = template
+        if not simple:
+            return self.instantiate(pou)
+        frame = Scope(pou)
+        frame.vars = dict(scope.vars)
+        frame.types = scope.types
+        frame.located = scope.located
+        frame.inputs = scope.inputs
+        frame.in_outs = scope.in_outs
+        return frame
+
+    def call_block(self, instance, args, scope):
+        # Fallback do interpretador: blocos do usuário também executam o código gerado
+        if isinstance(instance, StandardFB) or instance.pou is None:
+            return super().call_block(instance, args, scope)
+        outputs = self._bind_inputs(instance, args, scope)
+        self.compiled.functions[instance.pou.name](self, instance)
+        self._bind_outputs(instance, outputs, scope)
+
+    def call_function(self, pou, args, scope):
+        frame = self.new_frame(pou)
+        outputs = self._bind_inputs(frame, args, scope)
+        self.compiled.functions[pou.name](self, frame)
+        self._bind_outputs(frame, outputs, scope)
+        return frame.vars.get(pou.name)
+
+    def scan(self):
+        try:
+            self.compiled.entry(self, self.main)
+        except STRuntimeError:
+            raise
+        except (KeyError, TypeError, AttributeError, IndexError, ValueError,
+                ZeroDivisionError, OverflowError, RecursionError) as e:
+            raise STRuntimeError(f"erro na execução: {type(e).__name__}: {e}") from e
+        self.scans += 1
+        self.clock_ms += self.scan_cycle_ms
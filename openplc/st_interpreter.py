@@ -0,0 +1,1549 @@
+"""
+Interpretador Structured Text (IEC 61131-3) em Python puro.
+
+Cobre o subconjunto usado pelas tarefas do benchmark: blocos VAR, IF/CASE/
+FOR/WHILE/REPEAT, FUNCTION, FUNCTION_BLOCK, tipos enumerados e estruturas,
+arrays, blocos padrão (TON/TOF/TP, CTU/CTD/CTUD, SR/RS, R_TRIG/F_TRIG) e
+variáveis localizadas (%IX/%QX/%IW/%QW/%M...). O programa é executado em
+ciclos de varredura com relógio simulado, sem OpenPLC nem compilador.
+"""
+import math
+import re
+
+
+class STSyntaxError(ValueError):
+    """Erro de análise léxica/sintática no código ST."""
+
+    def __init__(self, message, line=None):
+        if line is not None:
+            message = f"linha {line}: {message}"
+        super().__init__(message)
+        self.line = line
+
+
+class STRuntimeError(RuntimeError):
+    """Erro durante a execução simulada (variável inexistente, divisão por zero...)."""
+
+
+# ---------------------------------------------------------------------------
+# Léxico
+# ---------------------------------------------------------------------------
+
+KEYWORDS = {
+    "PROGRAM", "END_PROGRAM", "FUNCTION", "END_FUNCTION", "FUNCTION_BLOCK",
+    "END_FUNCTION_BLOCK", "VAR", "VAR_INPUT", "VAR_OUTPUT", "VAR_IN_OUT",
+    "VAR_TEMP", "VAR_GLOBAL", "VAR_EXTERNAL", "END_VAR", "CONSTANT", "RETAIN",
+    "NON_RETAIN", "PERSISTENT", "AT", "IF", "THEN", "ELSIF", "ELSE", "END_IF",
+    "CASE", "OF", "END_CASE", "FOR", "TO", "BY", "DO", "END_FOR", "WHILE",
+    "END_WHILE", "REPEAT", "UNTIL", "END_REPEAT", "EXIT", "CONTINUE", "RETURN",
+    "NOT", "AND", "OR", "XOR", "MOD", "TRUE", "FALSE", "ARRAY", "STRUCT",
+    "END_STRUCT", "TYPE", "END_TYPE", "CONFIGURATION", "END_CONFIGURATION",
+    "RESOURCE", "END_RESOURCE", "TASK", "WITH", "ON",
+}
+
+VAR_BLOCKS = {"VAR", "VAR_INPUT", "VAR_OUTPUT", "VAR_IN_OUT", "VAR_TEMP", "VAR_GLOBAL", "VAR_EXTERNAL"}
+
+INT_TYPES = {
+    "SINT": (8, True), "INT": (16, True), "DINT": (32, True), "LINT": (64, True),
+    "USINT": (8, False), "UINT": (16, False), "UDINT": (32, False), "ULINT": (64, False),
+    "BYTE": (8, False), "WORD": (16, False), "DWORD": (32, False), "LWORD": (64, False),
+}
+REAL_TYPES = {"REAL", "LREAL"}
+TIME_TYPES = {"TIME", "LTIME", "DATE", "TIME_OF_DAY", "TOD", "DATE_AND_TIME", "DT"}
+STRING_TYPES = {"STRING", "WSTRING"}
+ELEMENTARY_TYPES = set(INT_TYPES) | REAL_TYPES | TIME_TYPES | STRING_TYPES | {"BOOL"}
+
+_TIME_UNITS = {"D": 86400000, "H": 3600000, "M": 60000, "S": 1000, "MS": 1, "US": 0.001, "NS": 0.000001}
+_TIME_PART = re.compile(r"(\d+(?:\.\d+)?)(MS|US|NS|D|H|M|S)")
+_OPERATORS = [":=", "=>", "<=", ">=", "<>", "**", "..", "+", "-", "*", "/", "(", ")",
+              "[", "]", ",", ";", ":", ".", "=", "<", ">", "&", "#"]
+
+
+class Token:
+    __slots__ = ("kind", "value", "line")
+
+    def __init__(self, kind, value, line):
+        self.kind = kind    # ID, KW, INT, REAL, BOOL, TIME, STRING, ADDR, OP, EOF
+        self.value = value
+        self.line = line
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r}, {self.line})"
+
+
+def parse_time_literal(text, line=None):
+    """Converte o corpo de um literal T#... em milissegundos (ex.: '1m30s' -> 90000)."""
+    body = text.upper().replace("_", "")
+    negative = body.startswith("-")
+    body = body.lstrip("+-")
+    pos = 0
+    total = 0.0
+    while pos < len(body):
+        match = _TIME_PART.match(body, pos)
+        if not match:
+            raise STSyntaxError(f"literal de tempo inválido: T#{text}", line)
+        total += float(match.group(1)) * _TIME_UNITS[match.group(2)]
+        pos = match.end()
+    if pos == 0:
+        raise STSyntaxError(f"literal de tempo vazio: T#{text}", line)
+    total = int(round(total))
+    return -total if negative else total
+
+
+def tokenize(source):
+    tokens = []
+    i = 0
+    n = len(source)
+    line = 1
+
+    while i < n:
+        ch = source[i]
+        if ch == "\n":
+            line += 1
+            i += 1
+            continue
+        if ch.isspace():
+            i += 1
+            continue
+        if source.startswith("(*", i) or source.startswith("/*", i):
+            end = source.find("*)" if ch == "(" else "*/", i + 2)
+            end = n if end < 0 else end + 2
+            line += source.count("\n", i, end)
+            i = end
+            continue
+        if source.startswith("//", i):
+            end = source.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if ch == "{":
+            # Pragma: ignorado
+            end = source.find("}", i)
+            end = n if end < 0 else end + 1
+            line += source.count("\n", i, end)
+            i = end
+            continue
+
+        if ch in ("'", '"'):
+            j = i + 1
+            chars = []
+            while j < n and source[j] != ch:
+                if source[j] == "$" and j + 1 < n:
+                    esc = source[j + 1].upper()
+                    chars.append({"N": "\n", "L": "\n", "R": "\r", "T": "\t", "$": "$", "'": "'", '"': '"'}.get(esc, esc))
+                    j += 2
+                    continue
+                chars.append(source[j])
+                j += 1
+            if j >= n:
+                raise STSyntaxError("string sem fechamento", line)
+            tokens.append(Token("STRING", "".join(chars), line))
+            i = j + 1
+            continue
+
+        if ch == "%":
+            match = re.compile(r"%([IQM])([XBWDL]?)(\d+(?:\.\d+)*)", re.IGNORECASE).match(source, i)
+            if not match:
+                raise STSyntaxError(f"endereço direto inválido: {source[i:i + 8]!r}", line)
+            area, size, index = match.group(1).upper(), (match.group(2) or "X").upper(), match.group(3)
+            if size == "X" and "." not in index:
+                # %IX8 equivale a %IX1.0 (bit 8)
+                index = f"{int(index) // 8}.{int(index) % 8}"
+            tokens.append(Token("ADDR", f"%{area}{size}{index}", line))
+            i = match.end()
+            continue
+
+        if ch.isdigit():
+            match = re.compile(r"(\d[\d_]*)#([0-9A-Fa-f_]+)").match(source, i)
+            if match and match.group(1).replace("_", "") in ("2", "8", "16"):
+                base = int(match.group(1).replace("_", ""))
+                tokens.append(Token("INT", int(match.group(2).replace("_", ""), base), line))
+                i = match.end()
+                continue
+            match = re.compile(r"\d[\d_]*(\.\d[\d_]*)?([eE][+-]?\d+)?").match(source, i)
+            text = match.group(0).replace("_", "")
+            if match.group(1) or match.group(2):
+                tokens.append(Token("REAL", float(text), line))
+            else:
+                tokens.append(Token("INT", int(text), line))
+            i = match.end()
+            continue
+
+        if ch.isalpha() or ch == "_":
+            match = re.compile(r"[A-Za-z_][A-Za-z0-9_]*").match(source, i)
+            word = match.group(0)
+            upper = word.upper()
+            i = match.end()
+
+            if i < n and source[i] == "#":
+                # Literais tipados: T#2s, TIME#1m, INT#5, BOOL#TRUE, State#RUN
+                if upper in ("T", "TIME", "LT", "LTIME"):
+                    lit = re.compile(r"[+-]?[0-9A-Za-z_.]+").match(source, i + 1)
+                    if not lit:
+                        raise STSyntaxError("literal de tempo inválido", line)
+                    tokens.append(Token("TIME", parse_time_literal(lit.group(0), line), line))
+                    i = lit.end()
+                    continue
+                if upper in ELEMENTARY_TYPES:
+                    # O tipo é descartado: o valor é convertido na atribuição
+                    i += 1
+                    continue
+                # Enum qualificado: mantém apenas o valor
+                i += 1
+                continue
+
+            if upper in ("TRUE", "FALSE"):
+                tokens.append(Token("BOOL", upper == "TRUE", line))
+            elif upper in KEYWORDS:
+                tokens.append(Token("KW", upper, line))
+            else:
+                tokens.append(Token("ID", upper, line))
+            continue
+
+        for op in _OPERATORS:
+            if source.startswith(op, i):
+                tokens.append(Token("OP", op, line))
+                i += len(op)
+                break
+        else:
+            raise STSyntaxError(f"caractere inesperado: {ch!r}", line)
+
+    tokens.append(Token("EOF", None, line))
+    return tokens
+
+
+# ---------------------------------------------------------------------------
+# Árvore sintática
+# ---------------------------------------------------------------------------
+
+class Node:
+    """Nó genérico da árvore sintática: 'kind' mais os campos do nó."""
+
+    def __init__(self, kind, line=None, **fields):
+        self.kind = kind
+        self.line = line
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.__dict__.items() if k not in ("kind", "line"))
+        return f"{self.kind}({fields})"
+
+
+class Parser:
+    def __init__(self, source):
+        self.tokens = tokenize(source)
+        self.pos = 0
+
+    # -- utilitários --------------------------------------------------------
+
+    @property
+    def tok(self):
+        return self.tokens[self.pos]
+
+    def peek(self, offset=1):
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def advance(self):
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def at(self, kind, value=None):
+        tok = self.tok
+        return tok.kind == kind and (value is None or tok.value == value)
+
+    def at_kw(self, *values):
+        return self.tok.kind == "KW" and self.tok.value in values
+
+    def at_op(self, *values):
+        return self.tok.kind == "OP" and self.tok.value in values
+
+    def accept(self, kind, value=None):
+        if self.at(kind, value):
+            return self.advance()
+        return None
+
+    def expect(self, kind, value=None):
+        if self.at(kind, value):
+            return self.advance()
+        found = self.tok.value if self.tok.kind != "EOF" else "fim do arquivo"
+        raise STSyntaxError(f"esperado {value or kind}, encontrado {found!r}", self.tok.line)
+
+    def expect_id(self):
+        # Algumas palavras reservadas aparecem como nomes (ex.: parâmetro ON)
+        if self.tok.kind in ("ID", "KW"):
+            return self.advance().value
+        raise STSyntaxError(f"esperado identificador, encontrado {self.tok.value!r}", self.tok.line)
+
+    # -- unidades de programa -------------------------------------------------
+
+    def parse(self):
+        pous = []
+        types = []
+        globals_ = []
+        config = {"tasks": {}, "instances": []}
+
+        while not self.at("EOF"):
+            if self.at_kw("PROGRAM", "FUNCTION", "FUNCTION_BLOCK"):
+                pous.append(self.parse_pou())
+            elif self.at_kw("TYPE"):
+                types.extend(self.parse_types())
+            elif self.at_kw("CONFIGURATION"):
+                globals_.extend(self.parse_configuration(config))
+            elif self.at_kw("VAR_GLOBAL"):
+                globals_.extend(self.parse_var_block())
+            elif self.accept("OP", ";"):
+                continue
+            else:
+                raise STSyntaxError(f"esperado PROGRAM, FUNCTION ou FUNCTION_BLOCK, encontrado {self.tok.value!r}", self.tok.line)
+
+        if not pous:
+            raise STSyntaxError("nenhum PROGRAM, FUNCTION ou FUNCTION_BLOCK encontrado")
+        return Node("unit", pous=pous, types=types, globals=globals_, config=config)
+
+    def parse_pou(self):
+        line = self.tok.line
+        pou_type = self.advance().value
+        name = self.expect_id()
+        return_type = None
+        if pou_type == "FUNCTION" and self.accept("OP", ":"):
+            return_type = self.parse_type()
+
+        decls = []
+        while self.at_kw(*VAR_BLOCKS):
+            decls.extend(self.parse_var_block())
+
+        end = "END_" + pou_type
+        body = self.parse_statements((end,))
+        self.expect("KW", end)
+        return Node("pou", line, pou_type=pou_type, name=name, return_type=return_type, decls=decls, body=body)
+
+    def parse_configuration(self, config):
+        """CONFIGURATION/RESOURCE: extrai variáveis globais, tarefas e instâncias."""
+        self.expect("KW", "CONFIGURATION")
+        self.expect_id()
+        globals_ = []
+        while not self.at_kw("END_CONFIGURATION"):
+            if self.at("EOF"):
+                raise STSyntaxError("END_CONFIGURATION ausente", self.tok.line)
+            if self.at_kw("VAR_GLOBAL"):
+                globals_.extend(self.parse_var_block())
+            elif self.accept("KW", "TASK"):
+                task = self.expect_id()
+                interval = None
+                if self.accept("OP", "("):
+                    while not self.accept("OP", ")"):
+                        key = self.expect_id()
+                        self.expect("OP", ":=")
+                        value = self.parse_expression()
+                        if key == "INTERVAL" and value.kind == "lit":
+                            interval = value.value
+                        self.accept("OP", ",")
+                config["tasks"][task] = interval
+            elif self.at_kw("PROGRAM"):
+                self.advance()
+                instance = self.expect_id()
+                task = None
+                if self.accept("KW", "WITH"):
+                    task = self.expect_id()
+                self.expect("OP", ":")
+                pou = self.expect_id()
+                config["instances"].append({"name": instance, "task": task, "pou": pou})
+            else:
+                self.advance()
+        self.expect("KW", "END_CONFIGURATION")
+        return globals_
+
+    def parse_types(self):
+        self.expect("KW", "TYPE")
+        types = []
+        while not self.at_kw("END_TYPE"):
+            line = self.tok.line
+            name = self.expect_id()
+            self.expect("OP", ":")
+            if self.accept("OP", "("):
+                values = [self.expect_id()]
+                while self.accept("OP", ","):
+                    values.append(self.expect_id())
+                self.expect("OP", ")")
+                default = values[0]
+                if self.accept("OP", ":="):
+                    default = self.expect_id()
+                types.append(Node("enum", line, name=name, values=values, default=default))
+            elif self.accept("KW", "STRUCT"):
+                fields = []
+                while not self.at_kw("END_STRUCT"):
+                    fields.extend(self.parse_var_decl("STRUCT"))
+                self.expect("KW", "END_STRUCT")
+                types.append(Node("struct", line, name=name, fields=fields))
+            else:
+                type_spec = self.parse_type()
+                init = self.parse_initializer() if self.accept("OP", ":=") else None
+                types.append(Node("alias", line, name=name, type=type_spec, init=init))
+            self.accept("OP", ";")
+        self.expect("KW", "END_TYPE")
+        return types
+
+    def parse_var_block(self):
+        block = self.advance().value
+        constant = False
+        while self.at_kw("CONSTANT", "RETAIN", "NON_RETAIN", "PERSISTENT"):
+            constant = constant or self.advance().value == "CONSTANT"
+        decls = []
+        while not self.at_kw("END_VAR"):
+            if self.at("EOF"):
+                raise STSyntaxError("END_VAR ausente", self.tok.line)
+            decls.extend(self.parse_var_decl(block, constant))
+        self.expect("KW", "END_VAR")
+        return decls
+
+    def parse_var_decl(self, block, constant=False):
+        line = self.tok.line
+        names = [self.expect_id()]
+        while self.accept("OP", ","):
+            names.append(self.expect_id())
+        address = None
+        if self.accept("KW", "AT"):
+            address = self.expect("ADDR").value
+        self.expect("OP", ":")
+        type_spec = self.parse_type()
+        init = self.parse_initializer() if self.accept("OP", ":=") else None
+        self.expect("OP", ";")
+        return [
+            Node("decl", line, name=name, type=type_spec, init=init, address=address, block=block, constant=constant)
+            for name in names
+        ]
+
+    def parse_type(self):
+        line = self.tok.line
+        if self.accept("KW", "ARRAY"):
+            self.expect("OP", "[")
+            dims = []
+            while True:
+                low = self.parse_expression()
+                self.expect("OP", "..")
+                high = self.parse_expression()
+                dims.append((low, high))
+                if not self.accept("OP", ","):
+                    break
+            self.expect("OP", "]")
+            self.expect("KW", "OF")
+            return Node("array_type", line, dims=dims, elem=self.parse_type())
+        name = self.expect_id()
+        if name in STRING_TYPES and self.at_op("[", "("):
+            close = "]" if self.advance().value == "[" else ")"
+            self.parse_expression()
+            self.expect("OP", close)
+        return Node("type", line, name=name)
+
+    def parse_initializer(self):
+        line = self.tok.line
+        if self.accept("OP", "["):
+            items = []
+            while not self.accept("OP", "]"):
+                # Repetição: n(valor)
+                if self.at("INT") and self.peek().kind == "OP" and self.peek().value == "(":
+                    count = self.advance().value
+                    self.advance()
+                    value = self.parse_initializer() if not self.at_op(")") else None
+                    self.expect("OP", ")")
+                    items.extend([value] * count)
+                else:
+                    items.append(self.parse_initializer())
+                self.accept("OP", ",")
+            return Node("array_init", line, items=items)
+        if self.at_op("(") and self.peek().kind in ("ID", "KW") and self.peek(2).kind == "OP" and self.peek(2).value == ":=":
+            self.advance()
+            fields = {}
+            while not self.accept("OP", ")"):
+                key = self.expect_id()
+                self.expect("OP", ":=")
+                fields[key] = self.parse_initializer()
+                self.accept("OP", ",")
+            return Node("struct_init", line, fields=fields)
+        return self.parse_expression()
+
+    # -- comandos -------------------------------------------------------------
+
+    def parse_statements(self, terminators):
+        body = []
+        while not (self.at_kw(*terminators) or self.at("EOF")):
+            stmt = self.parse_statement()
+            if stmt is not None:
+                body.append(stmt)
+        return body
+
+    def parse_statement(self):
+        line = self.tok.line
+        if self.accept("OP", ";"):
+            return None
+
+        if self.accept("KW", "IF"):
+            branches = []
+            cond = self.parse_expression()
+            self.expect("KW", "THEN")
+            branches.append((cond, self.parse_statements(("ELSIF", "ELSE", "END_IF"))))
+            else_body = []
+            while True:
+                if self.accept("KW", "ELSIF"):
+                    cond = self.parse_expression()
+                    self.expect("KW", "THEN")
+                    branches.append((cond, self.parse_statements(("ELSIF", "ELSE", "END_IF"))))
+                elif self.accept("KW", "ELSE"):
+                    else_body = self.parse_statements(("END_IF",))
+                else:
+                    break
+            self.expect("KW", "END_IF")
+            self.accept("OP", ";")
+            return Node("if", line, branches=branches, else_body=else_body)
+
+        if self.accept("KW", "CASE"):
+            selector = self.parse_expression()
+            self.expect("KW", "OF")
+            entries = []
+            else_body = []
+            while not self.at_kw("END_CASE"):
+                if self.accept("KW", "ELSE"):
+                    else_body = self.parse_statements(("END_CASE",))
+                    break
+                labels = self.parse_case_labels()
+                self.expect("OP", ":")
+                body = []
+                while not (self.at_kw("END_CASE", "ELSE") or self.at("EOF") or self.at_case_label()):
+                    stmt = self.parse_statement()
+                    if stmt is not None:
+                        body.append(stmt)
+                entries.append((labels, body))
+            self.expect("KW", "END_CASE")
+            self.accept("OP", ";")
+            return Node("case", line, selector=selector, entries=entries, else_body=else_body)
+
+        if self.accept("KW", "FOR"):
+            var = self.expect_id()
+            self.expect("OP", ":=")
+            start = self.parse_expression()
+            self.expect("KW", "TO")
+            end = self.parse_expression()
+            step = self.parse_expression() if self.accept("KW", "BY") else None
+            self.expect("KW", "DO")
+            body = self.parse_statements(("END_FOR",))
+            self.expect("KW", "END_FOR")
+            self.accept("OP", ";")
+            return Node("for", line, var=var, start=start, end=end, step=step, body=body)
+
+        if self.accept("KW", "WHILE"):
+            cond = self.parse_expression()
+            self.expect("KW", "DO")
+            body = self.parse_statements(("END_WHILE",))
+            self.expect("KW", "END_WHILE")
+            self.accept("OP", ";")
+            return Node("while", line, cond=cond, body=body)
+
+        if self.accept("KW", "REPEAT"):
+            body = self.parse_statements(("UNTIL",))
+            self.expect("KW", "UNTIL")
+            cond = self.parse_expression()
+            self.expect("KW", "END_REPEAT")
+            self.accept("OP", ";")
+            return Node("repeat", line, cond=cond, body=body)
+
+        for keyword in ("EXIT", "CONTINUE", "RETURN"):
+            if self.accept("KW", keyword):
+                self.accept("OP", ";")
+                return Node(keyword.lower(), line)
+
+        target = self.parse_postfix(self.parse_primary())
+        if self.accept("OP", ":="):
+            value = self.parse_expression()
+            self.expect("OP", ";")
+            return Node("assign", line, target=target, value=value)
+        if target.kind == "call":
+            self.expect("OP", ";")
+            return Node("call_stmt", line, call=target)
+        raise STSyntaxError(f"comando inválido próximo de {self.tok.value!r}", line)
+
+    def parse_case_labels(self):
+        labels = []
+        while True:
+            low = self.parse_expression()
+            if self.accept("OP", ".."):
+                labels.append(("range", low, self.parse_expression()))
+            else:
+                labels.append(("value", low))
+            if not self.accept("OP", ","):
+                return labels
+
+    def at_case_label(self):
+        """Verifica (sem consumir) se começa um novo rótulo 'valor[, ...]:' do CASE."""
+        start = self.pos
+        try:
+            self.parse_case_labels()
+            return self.at_op(":")
+        except STSyntaxError:
+            return False
+        finally:
+            self.pos = start
+
+    # -- expressões -----------------------------------------------------------
+
+    _BINARY_LEVELS = [
+        ("KW", ("OR",)),
+        ("KW", ("XOR",)),
+        ("AND", ("AND", "&")),
+        ("OP", ("=", "<>")),
+        ("OP", ("<", ">", "<=", ">=")),
+        ("OP", ("+", "-")),
+        ("MUL", ("*", "/", "MOD")),
+        ("OP", ("**",)),
+    ]
+
+    def parse_expression(self, level=0):
+        if level == len(self._BINARY_LEVELS):
+            return self.parse_unary()
+        _, ops = self._BINARY_LEVELS[level]
+        left = self.parse_expression(level + 1)
+        while self.tok.kind in ("OP", "KW") and self.tok.value in ops:
+            line = self.tok.line
+            op = self.advance().value
+            if op == "&":
+                op = "AND"
+            right = self.parse_expression(level + 1)
+            left = Node("binop", line, op=op, left=left, right=right)
+        return left
+
+    def parse_unary(self):
+        line = self.tok.line
+        if self.accept("KW", "NOT"):
+            return Node("unop", line, op="NOT", operand=self.parse_unary())
+        if self.accept("OP", "-"):
+            operand = self.parse_unary()
+            if operand.kind == "lit" and isinstance(operand.value, (int, float)) and not isinstance(operand.value, bool):
+                return Node("lit", line, value=-operand.value)
+            return Node("unop", line, op="-", operand=operand)
+        if self.accept("OP", "+"):
+            return self.parse_unary()
+        return self.parse_postfix(self.parse_primary())
+
+    def parse_primary(self):
+        tok = self.tok
+        if tok.kind in ("INT", "REAL", "BOOL", "TIME", "STRING"):
+            self.advance()
+            return Node("lit", tok.line, value=tok.value)
+        if tok.kind == "ADDR":
+            self.advance()
+            return Node("addr", tok.line, address=tok.value)
+        if self.accept("OP", "("):
+            expr = self.parse_expression()
+            self.expect("OP", ")")
+            return expr
+        if tok.kind == "ID" or (tok.kind == "KW" and tok.value in ("ON",)):
+            self.advance()
+            return Node("var", tok.line, name=tok.value)
+        raise STSyntaxError(f"expressão inválida próximo de {tok.value!r}", tok.line)
+
+    def parse_postfix(self, node):
+        while True:
+            line = self.tok.line
+            if self.at_op("(") and node.kind in ("var", "member"):
+                self.advance()
+                args = []
+                while not self.accept("OP", ")"):
+                    if self.tok.kind in ("ID", "KW") and self.peek().kind == "OP" and self.peek().value in (":=", "=>"):
+                        name = self.advance().value
+                        output = self.advance().value == "=>"
+                        value = self.parse_expression()
+                        args.append((name, value, output))
+                    else:
+                        args.append((None, self.parse_expression(), False))
+                    if not self.accept("OP", ","):
+                        self.expect("OP", ")")
+                        break
+                node = Node("call", line, func=node, args=args)
+            elif self.accept("OP", "["):
+                indices = [self.parse_expression()]
+                while self.accept("OP", ","):
+                    indices.append(self.parse_expression())
+                self.expect("OP", "]")
+                node = Node("index", line, obj=node, indices=indices)
+            elif self.at_op(".") and self.peek().kind in ("ID", "KW", "INT"):
+                self.advance()
+                member = self.advance()
+                if member.kind == "INT":
+                    # Acesso a bit: var.3
+                    node = Node("bit", line, obj=node, bit=member.value)
+                else:
+                    node = Node("member", line, obj=node, name=member.value)
+            else:
+                return node
+
+
+def parse(source):
+    """Analisa um código ST e retorna a árvore sintática (nó 'unit')."""
+    return Parser(source).parse()
+
+
+# ---------------------------------------------------------------------------
+# Valores
+# ---------------------------------------------------------------------------
+
+def coerce(type_name, value):
+    """Converte um valor para o tipo declarado (inteiros com estouro como no CLP)."""
+    if type_name is None:
+        return value
+    if type_name == "BOOL":
+        return bool(value)
+    spec = INT_TYPES.get(type_name)
+    if spec:
+        bits, signed = spec
+        value = int(value)
+        mask = (1 << bits) - 1
+        value &= mask
+        if signed and value >> (bits - 1):
+            value -= 1 << bits
+        return value
+    if type_name in REAL_TYPES:
+        return float(value)
+    if type_name in TIME_TYPES:
+        return int(value)
+    if type_name in STRING_TYPES:
+        return str(value)
+    return value
+
+
+def address_type(address):
+    """Tipo elementar de um endereço direto (%IX -> BOOL, %IW -> INT...)."""
+    return {"X": "BOOL", "B": "BYTE", "W": "INT", "D": "DINT", "L": "LINT"}[address[2]]
+
+
+class STArray:
+    """Array ST com limites arbitrários (ARRAY[1..10, 0..3] OF INT)."""
+
+    def __init__(self, dims, elem_type, factory):
+        self.dims = dims
+        self.elem_type = elem_type
+        size = 1
+        for low, high in dims:
+            size *= high - low + 1
+        self.data = [factory() for _ in range(size)]
+
+    def offset(self, indices):
+        if len(indices) != len(self.dims):
+            raise STRuntimeError(f"array com {len(self.dims)} dimensões acessado com {len(indices)} índices")
+        offset = 0
+        for index, (low, high) in zip(indices, self.dims):
+            index = int(index)
+            if not low <= index <= high:
+                raise STRuntimeError(f"índice {index} fora dos limites [{low}..{high}]")
+            offset = offset * (high - low + 1) + (index - low)
+        return offset
+
+    def get(self, indices):
+        return self.data[self.offset(indices)]
+
+    def set(self, indices, value):
+        self.data[self.offset(indices)] = value
+
+
+class Scope:
+    """Variáveis de uma instância de PROGRAM/FUNCTION_BLOCK ou de uma chamada de FUNCTION."""
+
+    def __init__(self, pou=None):
+        self.pou = pou
+        self.vars = {}
+        self.types = {}
+        self.located = {}   # nome -> endereço direto (AT %IX0.0)
+        self.inputs = []    # ordem dos VAR_INPUT (chamadas posicionais)
+        self.in_outs = []
+
+    def __repr__(self):
+        return f"Scope({self.pou.name if self.pou else 'global'})"
+
+
+# ---------------------------------------------------------------------------
+# Blocos funcionais padrão
+# ---------------------------------------------------------------------------
+
+class StandardFB(Scope):
+    """Base dos blocos padrão: as variáveis ficam em 'vars' como nos FBs do usuário."""
+
+    NAME = None
+    INPUTS = {}
+    OUTPUTS = {}
+
+    def __init__(self):
+        super().__init__()
+        for name, type_name in list(self.INPUTS.items()) + list(self.OUTPUTS.items()):
+            self.vars[name] = coerce(type_name, 0)
+            self.types[name] = type_name
+        self.inputs = list(self.INPUTS)
+
+    def __repr__(self):
+        return f"{self.NAME}({self.vars})"
+
+    def execute(self, now):
+        raise NotImplementedError
+
+
+class TON(StandardFB):
+    NAME = "TON"
+    INPUTS = {"IN": "BOOL", "PT": "TIME"}
+    OUTPUTS = {"Q": "BOOL", "ET": "TIME"}
+
+    def __init__(self):
+        super().__init__()
+        self._start = None
+
+    def execute(self, now):
+        v = self.vars
+        if not v["IN"]:
+            self._start = None
+            v["Q"], v["ET"] = False, 0
+            return
+        if self._start is None:
+            self._start = now
+        v["ET"] = min(now - self._start, v["PT"])
+        v["Q"] = v["ET"] >= v["PT"]
+
+
+class TOF(StandardFB):
+    NAME = "TOF"
+    INPUTS = {"IN": "BOOL", "PT": "TIME"}
+    OUTPUTS = {"Q": "BOOL", "ET": "TIME"}
+
+    def __init__(self):
+        super().__init__()
+        self._start = None
+
+    def execute(self, now):
+        v = self.vars
+        if v["IN"]:
+            self._start = None
+            v["Q"], v["ET"] = True, 0
+            return
+        if self._start is None and v["Q"]:
+            self._start = now
+        if self._start is not None:
+            v["ET"] = min(now - self._start, v["PT"])
+            if v["ET"] >= v["PT"]:
+                v["Q"] = False
+
+
+class TP(StandardFB):
+    NAME = "TP"
+    INPUTS = {"IN": "BOOL", "PT": "TIME"}
+    OUTPUTS = {"Q": "BOOL", "ET": "TIME"}
+
+    def __init__(self):
+        super().__init__()
+        self._start = None
+        self._prev_in = False
+
+    def execute(self, now):
+        v = self.vars
+        if self._start is None:
+            if v["IN"] and not self._prev_in:
+                self._start = now
+                v["Q"], v["ET"] = True, 0
+        else:
+            v["ET"] = min(now - self._start, v["PT"])
+            if v["ET"] >= v["PT"]:
+                v["Q"] = False
+                if not v["IN"]:
+                    self._start = None
+                    v["ET"] = 0
+        self._prev_in = v["IN"]
+
+
+class CTU(StandardFB):
+    NAME = "CTU"
+    INPUTS = {"CU": "BOOL", "R": "BOOL", "PV": "INT"}
+    OUTPUTS = {"Q": "BOOL", "CV": "INT"}
+
+    def __init__(self):
+        super().__init__()
+        self._prev_cu = False
+
+    def execute(self, now):
+        v = self.vars
+        if v["R"]:
+            v["CV"] = 0
+        elif v["CU"] and not self._prev_cu and v["CV"] < 32767:
+            v["CV"] += 1
+        self._prev_cu = v["CU"]
+        v["Q"] = v["CV"] >= v["PV"]
+
+
+class CTD(StandardFB):
+    NAME = "CTD"
+    INPUTS = {"CD": "BOOL", "LD": "BOOL", "PV": "INT"}
+    OUTPUTS = {"Q": "BOOL", "CV": "INT"}
+
+    def __init__(self):
+        super().__init__()
+        self._prev_cd = False
+
+    def execute(self, now):
+        v = self.vars
+        if v["LD"]:
+            v["CV"] = v["PV"]
+        elif v["CD"] and not self._prev_cd and v["CV"] > -32768:
+            v["CV"] -= 1
+        self._prev_cd = v["CD"]
+        v["Q"] = v["CV"] <= 0
+
+
+class CTUD(StandardFB):
+    NAME = "CTUD"
+    INPUTS = {"CU": "BOOL", "CD": "BOOL", "R": "BOOL", "LD": "BOOL", "PV": "INT"}
+    OUTPUTS = {"QU": "BOOL", "QD": "BOOL", "CV": "INT"}
+
+    def __init__(self):
+        super().__init__()
+        self._prev_cu = False
+        self._prev_cd = False
+
+    def execute(self, now):
+        v = self.vars
+        if v["R"]:
+            v["CV"] = 0
+        elif v["LD"]:
+            v["CV"] = v["PV"]
+        else:
+            up = v["CU"] and not self._prev_cu
+            down = v["CD"] and not self._prev_cd
+            if up and not down and v["CV"] < 32767:
+                v["CV"] += 1
+            elif down and not up and v["CV"] > -32768:
+                v["CV"] -= 1
+        self._prev_cu, self._prev_cd = v["CU"], v["CD"]
+        v["QU"] = v["CV"] >= v["PV"]
+        v["QD"] = v["CV"] <= 0
+
+
+class SR(StandardFB):
+    NAME = "SR"
+    INPUTS = {"S1": "BOOL", "R": "BOOL"}
+    OUTPUTS = {"Q1": "BOOL"}
+
+    def execute(self, now):
+        v = self.vars
+        v["Q1"] = v["S1"] or (not v["R"] and v["Q1"])
+
+
+class RS(StandardFB):
+    NAME = "RS"
+    INPUTS = {"S": "BOOL", "R1": "BOOL"}
+    OUTPUTS = {"Q1": "BOOL"}
+
+    def execute(self, now):
+        v = self.vars
+        v["Q1"] = not v["R1"] and (v["S"] or v["Q1"])
+
+
+class R_TRIG(StandardFB):
+    NAME = "R_TRIG"
+    INPUTS = {"CLK": "BOOL"}
+    OUTPUTS = {"Q": "BOOL"}
+
+    def __init__(self):
+        super().__init__()
+        self._m = False
+
+    def execute(self, now):
+        v = self.vars
+        v["Q"] = v["CLK"] and not self._m
+        self._m = v["CLK"]
+
+
+class F_TRIG(StandardFB):
+    NAME = "F_TRIG"
+    INPUTS = {"CLK": "BOOL"}
+    OUTPUTS = {"Q": "BOOL"}
+
+    def __init__(self):
+        super().__init__()
+        self._m = False
+
+    def execute(self, now):
+        v = self.vars
+        v["Q"] = not v["CLK"] and not self._m
+        self._m = not v["CLK"]
+
+
+STANDARD_FBS = {cls.NAME: cls for cls in (TON, TOF, TP, CTU, CTD, CTUD, SR, RS, R_TRIG, F_TRIG)}
+
+
+# ---------------------------------------------------------------------------
+# Funções padrão
+# ---------------------------------------------------------------------------
+
+def _round_half_away(value):
+    return int(math.floor(abs(value) + 0.5)) * (1 if value >= 0 else -1)
+
+
+def _rotate(bits):
+    mask = (1 << bits) - 1
+
+    def rol(value, n):
+        value &= mask
+        n %= bits
+        return ((value << n) | (value >> (bits - n))) & mask
+
+    def ror(value, n):
+        value &= mask
+        n %= bits
+        return ((value >> n) | (value << (bits - n))) & mask
+
+    return rol, ror
+
+
+_ROL32, _ROR32 = _rotate(32)
+
+STANDARD_FUNCTIONS = {
+    "ABS": abs,
+    "SQRT": math.sqrt,
+    "LN": math.log,
+    "LOG": math.log10,
+    "EXP": math.exp,
+    "SIN": math.sin,
+    "COS": math.cos,
+    "TAN": math.tan,
+    "ASIN": math.asin,
+    "ACOS": math.acos,
+    "ATAN": math.atan,
+    "EXPT": lambda a, b: a ** b,
+    "MIN": min,
+    "MAX": max,
+    "LIMIT": lambda mn, value, mx: max(mn, min(value, mx)),
+    "SEL": lambda g, in0, in1: in1 if g else in0,
+    "MUX": lambda k, *values: values[int(k)],
+    "MOVE": lambda value: value,
+    "TRUNC": lambda value: int(value),
+    "ADD": lambda *values: sum(values),
+    "MUL": lambda *values: math.prod(values),
+    "SUB": lambda a, b: a - b,
+    "SHL": lambda value, n: value << int(n),
+    "SHR": lambda value, n: value >> int(n),
+    "ROL": _ROL32,
+    "ROR": _ROR32,
+    "LEN": len,
+    "CONCAT": lambda *values: "".join(values),
+    "LEFT": lambda s, n: s[:int(n)],
+    "RIGHT": lambda s, n: s[len(s) - int(n):],
+    "MID": lambda s, n, p: s[int(p) - 1:int(p) - 1 + int(n)],
+}
+
+
+def convert(target, value):
+    """Conversão explícita X_TO_Y / TO_Y: REAL -> inteiro arredonda (IEC 61131-3)."""
+    if target in INT_TYPES or target in TIME_TYPES:
+        if isinstance(value, float):
+            value = _round_half_away(value)
+        elif isinstance(value, str):
+            value = int(value.strip() or 0)
+    elif target in STRING_TYPES:
+        if isinstance(value, bool):
+            return "TRUE" if value else "FALSE"
+        return str(value)
+    elif target == "BOOL" and isinstance(value, str):
+        return value.strip().upper() in ("TRUE", "1")
+    return coerce(target, value)
+
+
+def conversion_target(name):
+    """Tipo de destino de uma função de conversão (INT_TO_REAL -> REAL), ou None."""
+    if "_TO_" in name:
+        target = name.split("_TO_", 1)[1]
+    elif name.startswith("TO_"):
+        target = name[3:]
+    else:
+        return None
+    return target if target in ELEMENTARY_TYPES else None
+
+
+def st_div(a, b):
+    if b == 0:
+        raise STRuntimeError("divisão por zero")
+    if isinstance(a, int) and isinstance(b, int):
+        q = abs(a) // abs(b)
+        return q if (a >= 0) == (b >= 0) else -q
+    return a / b
+
+
+def st_mod(a, b):
+    if b == 0:
+        raise STRuntimeError("MOD por zero")
+    return a - b * st_div(a, b)
+
+
+# ---------------------------------------------------------------------------
+# Programa analisado e simulação
+# ---------------------------------------------------------------------------
+
+class STProgram:
+    """
+    Programa ST analisado: POUs, tipos, globais e a unidade de entrada.
+
+    A entrada é o PROGRAM associado a uma tarefa na CONFIGURATION; sem ela, o
+    último PROGRAM do arquivo; sem PROGRAM, o último FUNCTION_BLOCK (ou
+    FUNCTION) é executado como se fosse o programa principal.
+    """
+
+    DEFAULT_SCAN_CYCLE_MS = 20
+
+    def __init__(self, source):
+        self.source = source
+        self.unit = parse(source)
+        self.pous = {}
+        for pou in self.unit.pous:
+            self.pous[pou.name] = pou
+        self.types = {t.name: t for t in self.unit.types}
+        self.enum_values = {}
+        for t in self.unit.types:
+            if t.kind == "enum":
+                for value in t.values:
+                    self.enum_values[value] = value
+
+        self.entry, self.scan_cycle_ms = self._find_entry()
+
+    def _find_entry(self):
+        config = self.unit.config
+        for instance in config["instances"]:
+            pou = self.pous.get(instance["pou"])
+            if pou:
+                interval = config["tasks"].get(instance["task"])
+                return pou, interval or self.DEFAULT_SCAN_CYCLE_MS
+
+        for kind in ("PROGRAM", "FUNCTION_BLOCK", "FUNCTION"):
+            candidates = [p for p in self.unit.pous if p.pou_type == kind]
+            if candidates:
+                return candidates[-1], self.DEFAULT_SCAN_CYCLE_MS
+        raise STSyntaxError("nenhuma unidade executável encontrada")
+
+
+class _Exit(Exception):
+    pass
+
+
+class _Continue(Exception):
+    pass
+
+
+class _Return(Exception):
+    pass
+
+
+class Simulation:
+    """
+    Executa um STProgram em ciclos de varredura com relógio simulado.
+
+    As áreas de E/S ficam em 'image' (endereço direto -> valor). Variáveis
+    declaradas com AT são apelidos dessas posições. Cada scan executa a
+    unidade de entrada uma vez e avança o relógio em scan_cycle_ms.
+    """
+
+    MAX_LOOP_ITERATIONS = 1_000_000
+
+    def __init__(self, program, scan_cycle_ms=None):
+        self.program = program
+        self.scan_cycle_ms = scan_cycle_ms or program.scan_cycle_ms
+        self.clock_ms = 0
+        self.scans = 0
+        self.image = {}
+        self.globals = Scope()
+        for decl in program.unit.globals:
+            self.declare(self.globals, decl)
+        self.main = self.instantiate(program.entry)
+
+    # -- criação de variáveis -------------------------------------------------
+
+    def instantiate(self, pou):
+        scope = Scope(pou)
+        for decl in pou.decls:
+            if decl.block != "VAR_EXTERNAL":
+                self.declare(scope, decl)
+        if pou.pou_type == "FUNCTION" and pou.return_type is not None:
+            scope.vars[pou.name] = self.default_value(pou.return_type)
+            scope.types[pou.name] = self.type_name(pou.return_type)
+        return scope
+
+    def declare(self, scope, decl):
+        type_name = self.type_name(decl.type)
+        scope.types[decl.name] = type_name
+        if decl.block == "VAR_INPUT":
+            scope.inputs.append(decl.name)
+        elif decl.block == "VAR_IN_OUT":
+            scope.in_outs.append(decl.name)
+
+        value = self.default_value(decl.type)
+        if decl.init is not None:
+            value = self.initial_value(decl.type, decl.init, value)
+
+        if decl.address:
+            scope.located[decl.name] = decl.address
+            self.image.setdefault(decl.address, coerce(address_type(decl.address), value if decl.init is not None else 0))
+        else:
+            scope.vars[decl.name] = value
+
+    def type_name(self, type_spec):
+        if type_spec.kind == "array_type":
+            return None
+        name = type_spec.name
+        alias = self.program.types.get(name)
+        if alias is not None and alias.kind == "alias":
+            return self.type_name(alias.type)
+        return name
+
+    def default_value(self, type_spec):
+        if type_spec.kind == "array_type":
+            dims = [(int(self.eval_const(low)), int(self.eval_const(high))) for low, high in type_spec.dims]
+            return STArray(dims, self.type_name(type_spec.elem), lambda: self.default_value(type_spec.elem))
+
+        name = type_spec.name
+        if name in ELEMENTARY_TYPES:
+            return coerce(name, 0)
+        if name in STANDARD_FBS:
+            return STANDARD_FBS[name]()
+        if name in self.program.types:
+            t = self.program.types[name]
+            if t.kind == "enum":
+                return t.default
+            if t.kind == "struct":
+                scope = Scope()
+                for field in t.fields:
+                    self.declare(scope, field)
+                return scope
+            value = self.default_value(t.type)
+            return self.initial_value(t.type, t.init, value) if t.init is not None else value
+        pou = self.program.pous.get(name)
+        if pou is not None and pou.pou_type == "FUNCTION_BLOCK":
+            return self.instantiate(pou)
+        raise STRuntimeError(f"tipo desconhecido: {name}")
+
+    def initial_value(self, type_spec, init, default):
+        if init.kind == "array_init":
+            if not isinstance(default, STArray):
+                raise STRuntimeError("inicializador de array em variável que não é array")
+            for i, item in enumerate(init.items[:len(default.data)]):
+                if item is not None:
+                    default.data[i] = coerce(default.elem_type, self.eval_const(item))
+            return default
+        if init.kind == "struct_init":
+            if not isinstance(default, Scope):
+                raise STRuntimeError("inicializador estruturado em variável simples")
+            for key, item in init.fields.items():
+                default.vars[key] = coerce(default.types.get(key), self.eval_const(item))
+            return default
+        return coerce(self.type_name(type_spec), self.eval_const(init))
+
+    def eval_const(self, expr):
+        return self.eval(expr, self.globals)
+
+    # -- acesso a variáveis ---------------------------------------------------
+
+    def _find_scope(self, name, scope):
+        if name in scope.vars or name in scope.located:
+            return scope
+        if name in self.globals.vars or name in self.globals.located:
+            return self.globals
+        return None
+
+    def lookup(self, name, scope):
+        owner = self._find_scope(name, scope)
+        if owner is not None:
+            address = owner.located.get(name)
+            if address is not None:
+                return self.image.get(address, coerce(address_type(address), 0))
+            return owner.vars[name]
+        if name in self.program.enum_values:
+            return self.program.enum_values[name]
+        raise STRuntimeError(f"variável não declarada: {name}")
+
+    def store(self, name, value, scope):
+        owner = self._find_scope(name, scope)
+        if owner is None:
+            raise STRuntimeError(f"variável não declarada: {name}")
+        address = owner.located.get(name)
+        if address is not None:
+            self.image[address] = coerce(address_type(address), value)
+        else:
+            owner.vars[name] = coerce(owner.types.get(name), value)
+
+    def assign(self, target, value, scope):
+        kind = target.kind
+        if kind == "var":
+            self.store(target.name, value, scope)
+        elif kind == "addr":
+            self.image[target.address] = coerce(address_type(target.address), value)
+        elif kind == "member":
+            obj = self.eval(target.obj, scope)
+            if not isinstance(obj, Scope):
+                raise STRuntimeError(f"'{target.name}' não é membro de uma estrutura ou bloco")
+            obj.vars[target.name] = coerce(obj.types.get(target.name), value)
+        elif kind == "index":
+            arr = self.eval(target.obj, scope)
+            if not isinstance(arr, STArray):
+                raise STRuntimeError("indexação de variável que não é array")
+            arr.set([self.eval(i, scope) for i in target.indices], coerce(arr.elem_type, value))
+        elif kind == "bit":
+            current = int(self.eval(target.obj, scope))
+            if value:
+                current |= 1 << target.bit
+            else:
+                current &= ~(1 << target.bit)
+            self.assign(target.obj, current, scope)
+        else:
+            raise STRuntimeError(f"destino de atribuição inválido: {kind}")
+
+    # -- expressões -----------------------------------------------------------
+
+    def eval(self, expr, scope):
+        kind = expr.kind
+        if kind == "lit":
+            return expr.value
+        if kind == "var":
+            return self.lookup(expr.name, scope)
+        if kind == "binop":
+            return self.binop(expr.op, self.eval(expr.left, scope), self.eval(expr.right, scope))
+        if kind == "unop":
+            value = self.eval(expr.operand, scope)
+            if expr.op == "NOT":
+                return (not value) if isinstance(value, bool) else ~value
+            return -value
+        if kind == "addr":
+            return self.image.get(expr.address, coerce(address_type(expr.address), 0))
+        if kind == "member":
+            obj = self.eval(expr.obj, scope)
+            if not isinstance(obj, Scope) or expr.name not in obj.vars:
+                raise STRuntimeError(f"membro inexistente: {expr.name}")
+            return obj.vars[expr.name]
+        if kind == "index":
+            arr = self.eval(expr.obj, scope)
+            if not isinstance(arr, STArray):
+                raise STRuntimeError("indexação de variável que não é array")
+            return arr.get([self.eval(i, scope) for i in expr.indices])
+        if kind == "bit":
+            return bool((int(self.eval(expr.obj, scope)) >> expr.bit) & 1)
+        if kind == "call":
+            return self.call(expr, scope)
+        raise STRuntimeError(f"expressão não suportada: {kind}")
+
+    @staticmethod
+    def binop(op, a, b):
+        if op == "AND":
+            return (a and b) if isinstance(a, bool) else a & b
+        if op == "OR":
+            return (a or b) if isinstance(a, bool) else a | b
+        if op == "XOR":
+            return (a != b) if isinstance(a, bool) else a ^ b
+        if op == "=":
+            return a == b
+        if op == "<>":
+            return a != b
+        if op == "<":
+            return a < b
+        if op == ">":
+            return a > b
+        if op == "<=":
+            return a <= b
+        if op == ">=":
+            return a >= b
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if op == "/":
+            return st_div(a, b)
+        if op == "MOD":
+            return st_mod(a, b)
+        if op == "**":
+            return float(a) ** b
+        raise STRuntimeError(f"operador não suportado: {op}")
+
+    # -- chamadas -------------------------------------------------------------
+
+    def call(self, expr, scope):
+        func = expr.func
+        if func.kind == "var" and func.name not in scope.vars and func.name not in self.globals.vars:
+            name = func.name
+            pou = self.program.pous.get(name)
+            if pou is not None and pou.pou_type == "FUNCTION":
+                return self.call_function(pou, expr.args, scope)
+            args = [self.eval(value, scope) for _, value, _ in expr.args]
+            if name in STANDARD_FUNCTIONS:
+                try:
+                    return STANDARD_FUNCTIONS[name](*args)
+                except (ValueError, TypeError, IndexError, ZeroDivisionError) as e:
+                    raise STRuntimeError(f"erro em {name}: {e}")
+            target = conversion_target(name)
+            if target and len(args) == 1:
+                return convert(target, args[0])
+            raise STRuntimeError(f"função desconhecida: {name}")
+
+        instance = self.eval(func, scope)
+        if not isinstance(instance, Scope):
+            raise STRuntimeError("chamada de algo que não é função nem bloco funcional")
+        self.call_block(instance, expr.args, scope)
+        return None
+
+    def _bind_inputs(self, callee, args, scope):
+        outputs = []
+        positional = 0
+        for name, value, output in args:
+            if output:
+                outputs.append((name, value))
+                continue
+            if name is None:
+                order = callee.inputs + callee.in_outs
+                if positional >= len(order):
+                    raise STRuntimeError("argumentos posicionais demais na chamada")
+                name = order[positional]
+                positional += 1
+            if name in callee.in_outs:
+                outputs.append((name, value))
+            if name not in callee.vars and name not in callee.located:
+                raise STRuntimeError(f"parâmetro inexistente: {name}")
+            callee.vars[name] = coerce(callee.types.get(name), self.eval(value, scope))
+        return outputs
+
+    def _bind_outputs(self, callee, outputs, scope):
+        for name, target in outputs:
+            if name not in callee.vars:
+                raise STRuntimeError(f"saída inexistente: {name}")
+            self.assign(target, callee.vars[name], scope)
+
+    def call_block(self, instance, args, scope):
+        outputs = self._bind_inputs(instance, args, scope)
+        if isinstance(instance, StandardFB):
+            instance.execute(self.clock_ms)
+        else:
+            self.run_body(instance.pou.body, instance)
+        self._bind_outputs(instance, outputs, scope)
+
+    def call_function(self, pou, args, scope):
+        frame = self.instantiate(pou)
+        outputs = self._bind_inputs(frame, args, scope)
+        self.run_body(pou.body, frame)
+        self._bind_outputs(frame, outputs, scope)
+        return frame.vars.get(pou.name)
+
+    # -- comandos -------------------------------------------------------------
+
+    def run_body(self, body, scope):
+        try:
+            self.exec_block(body, scope)
+        except _Return:
+            pass
+
+    def exec_block(self, body, scope):
+        for stmt in body:
+            self.exec_stmt(stmt, scope)
+
+    def exec_stmt(self, stmt, scope):
+        kind = stmt.kind
+        if kind == "assign":
+            self.assign(stmt.target, self.eval(stmt.value, scope), scope)
+        elif kind == "call_stmt":
+            self.call(stmt.call, scope)
+        elif kind == "if":
+            for cond, body in stmt.branches:
+                if self.eval(cond, scope):
+                    self.exec_block(body, scope)
+                    return
+            self.exec_block(stmt.else_body, scope)
+        elif kind == "case":
+            selector = self.eval(stmt.selector, scope)
+            for labels, body in stmt.entries:
+                for label in labels:
+                    if label[0] == "value":
+                        hit = selector == self.eval(label[1], scope)
+                    else:
+                        hit = self.eval(label[1], scope) <= selector <= self.eval(label[2], scope)
+                    if hit:
+                        self.exec_block(body, scope)
+                        return
+            self.exec_block(stmt.else_body, scope)
+        elif kind == "for":
+            self.exec_for(stmt, scope)
+        elif kind == "while":
+            iterations = 0
+            while self.eval(stmt.cond, scope):
+                iterations = self._guard(iterations)
+                try:
+                    self.exec_block(stmt.body, scope)
+                except _Continue:
+                    continue
+                except _Exit:
+                    break
+        elif kind == "repeat":
+            iterations = 0
+            while True:
+                iterations = self._guard(iterations)
+                try:
+                    self.exec_block(stmt.body, scope)
+                except _Continue:
+                    pass
+                except _Exit:
+                    break
+                if self.eval(stmt.cond, scope):
+                    break
+        elif kind == "exit":
+            raise _Exit()
+        elif kind == "continue":
+            raise _Continue()
+        elif kind == "return":
+            raise _Return()
+        else:
+            raise STRuntimeError(f"comando não suportado: {kind}")
+
+    def exec_for(self, stmt, scope):
+        value = self.eval(stmt.start, scope)
+        end = self.eval(stmt.end, scope)
+        step = self.eval(stmt.step, scope) if stmt.step is not None else 1
+        if step == 0:
+            raise STRuntimeError("FOR com passo zero")
+        self.store(stmt.var, value, scope)
+        iterations = 0
+        while (value <= end) if step > 0 else (value >= end):
+            iterations = self._guard(iterations)
+            try:
+                self.exec_block(stmt.body, scope)
+            except _Continue:
+                pass
+            except _Exit:
+                break
+            value = self.lookup(stmt.var, scope) + step
+            self.store(stmt.var, value, scope)
+
+    def _guard(self, iterations):
+        iterations += 1
+        if iterations > self.MAX_LOOP_ITERATIONS:
+            raise STRuntimeError("laço excedeu o limite de iterações (possível laço infinito)")
+        return iterations
+
+    # -- ciclo de varredura ---------------------------------------------------
+
+    def scan(self):
+        """Executa um ciclo de varredura e avança o relógio simulado."""
+        # Uma FUNCTION como unidade principal também mantém suas variáveis entre scans
+        self.run_body(self.program.entry.body, self.main)
+        self.scans += 1
+        self.clock_ms += self.scan_cycle_ms
+
+    def run_for(self, duration_ms):
+        """Executa os scans que cabem em duration_ms (ao menos um)."""
+        scans = max(1, -(-int(duration_ms) // self.scan_cycle_ms))
+        for _ in range(scans):
+            self.scan()
+        return scans
+
+    def read_var(self, name):
+        """Lê uma variável da unidade principal (ou global) pelo nome."""
+        return self.lookup(name.upper(), self.main)
+
+    def write_var(self, name, value):
+        name = name.upper()
+        if self._find_scope(name, self.main) is None:
+            raise STRuntimeError(f"variável não declarada: {name}")
+        self.store(name, value, self.main)
@@ -0,0 +1,129 @@
+"""
+Carga de programas pela interface web do OpenPLC_v3 (webserver.py).
+
+O webserver não tem API REST: as páginas ficam atrás do flask_login e a
+carga de um programa segue a mesma sequência da interface:
+
+1. POST /login com usuário e senha (padrão openplc/openplc, ou
+   OPENPLC_USER/OPENPLC_PASSWORD);
+2. POST /upload-program com o .st: o webserver o grava em st_files/ com
+   um nome aleatório e devolve o formulário com prog_file e epoch_time;
+3. POST /upload-program-action: registra o programa na tabela Programs;
+4. GET /compile-program?file=...: para o runtime e roda o
+   compile_program.sh (MatIEC + build do core); /compilation-logs acumula
+   a saída até a linha "Compilation finished ...";
+5. GET /start_plc: inicia o core com o programa novo.
+
+Uma resposta que termina na página de login (senha errada, sessão
+expirada) é erro, não sucesso: sem sessão o webserver redireciona todas
+as páginas para /login com HTTP 200.
+"""
+import os
+import re
+import time
+from pathlib import Path
+
+_INPUT = re.compile(r"<input\b[^>]*>", re.IGNORECASE)
+_ATTRIBUTE = re.compile(r"""(\w+)\s*=\s*(['"])(.*?)\2""", re.DOTALL)
+
+COMPILE_DONE = "Compilation finished"
+COMPILE_OK = "Compilation finished successfully"
+
+
+class WebInterfaceError(RuntimeError):
+    """Passo da carga pela interface web que falhou (com a página ou o log do webserver)."""
+
+
+def form_fields(html):
+    """{name: value} dos <input> de uma página (os campos ocultos do formulário de upload)."""
+    fields = {}
+    for tag in _INPUT.findall(html):
+        attrs = {name.lower(): value for name, _, value in _ATTRIBUTE.findall(tag)}
+        if "name" in attrs:
+            fields[attrs["name"]] = attrs.get("value", "")
+    return fields
+
+
+class OpenPLCWebClient:
+    """Sessão autenticada em um webserver.py, usada para carregar programas."""
+
+    REQUEST_TIMEOUT = 10.0
+    COMPILE_TIMEOUT = 180.0   # MatIEC + build do core em C++ (s)
+    POLL_INTERVAL = 0.5       # intervalo entre leituras de /compilation-logs (s)
+
+    def __init__(self, base_url, username=None, password=None):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.username = username or os.environ.get("OPENPLC_USER", "openplc")
+        self.password = password or os.environ.get("OPENPLC_PASSWORD", "openplc")
+        self.session = requests.Session()
+        self.logged_in = False
+
+    @staticmethod
+    def _is_login_page(response):
+        return response.url.split("?")[0].rstrip("/").endswith("/login")
+
+    def _request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.REQUEST_TIMEOUT)
+        response = self.session.request(method, f"{self.base_url}/{path}", **kwargs)
+        if response.status_code != 200:
+            raise WebInterfaceError(f"/{path} respondeu HTTP {response.status_code}")
+        if self._is_login_page(response):
+            self.logged_in = False
+            raise WebInterfaceError(f"/{path} redirecionou para o login (sessão não autenticada)")
+        return response
+
+    def login(self):
+        response = self.session.post(
+            f"{self.base_url}/login",
+            data={"username": self.username, "password": self.password},
+            timeout=self.REQUEST_TIMEOUT
+        )
+        if response.status_code != 200 or self._is_login_page(response):
+            raise WebInterfaceError(
+                f"login recusado para o usuário {self.username!r} "
+                f"(defina OPENPLC_USER/OPENPLC_PASSWORD)"
+            )
+        self.logged_in = True
+
+    def upload(self, st_code_path, name):
+        """Envia o .st e o registra em Programs. Retorna o nome dado pelo webserver (prog_file)."""
+        content = Path(st_code_path).read_bytes()
+        response = self._request("POST", "upload-program", files={"file": ("program.st", content, "text/plain")})
+        fields = form_fields(response.text)
+        if not fields.get("prog_file"):
+            raise WebInterfaceError("/upload-program não devolveu o formulário com prog_file")
+        self._request("POST", "upload-program-action", data={
+            "prog_name": name,
+            "prog_descr": "Carregado pelo plc benchmark",
+            "prog_file": fields["prog_file"],
+            "epoch_time": fields.get("epoch_time") or str(int(time.time())),
+        })
+        return fields["prog_file"]
+
+    def compile(self, prog_file, timeout=None):
+        """Compila o programa enviado e espera o fim. Retorna o log da compilação."""
+        self._request("GET", "compile-program", params={"file": prog_file})
+        deadline = time.perf_counter() + (self.COMPILE_TIMEOUT if timeout is None else timeout)
+        while True:
+            output = self._request("GET", "compilation-logs").text
+            if COMPILE_DONE in output:
+                if COMPILE_OK not in output:
+                    raise WebInterfaceError(f"compilação no runtime falhou:\n{output[-2000:]}")
+                return output
+            if time.perf_counter() >= deadline:
+                raise WebInterfaceError(f"compilação no runtime não terminou em {self.COMPILE_TIMEOUT}s")
+            time.sleep(self.POLL_INTERVAL)
+
+    def start_run(self):
+        self._request("GET", "start_plc")
+
+    def load_program(self, st_code_path, name="plc_benchmark"):
+        """Envia, compila e inicia o programa (login na primeira chamada ou após a sessão cair)."""
+        if not self.logged_in:
+            self.login()
+        prog_file = self.upload(st_code_path, name)
+        self.compile(prog_file)
+        self.start_run()
+        return prog_file
@@ -3,9 +3,10 @@ Script de teste para verificar conexão com OpenRouter e listar modelos disponí
 """
 import os
 import yaml
-import requests
 from dotenv import load_dotenv
 
+from ai.openrouter_client import OpenRouterClient
+
 load_dotenv()
 
 api_key = os.getenv("OPENROUTER_API_KEY")
@@ -17,16 +18,14 @@ if not api_key:
 print(f"[INFO] Testando conexão com OpenRouter...")
 print(f"[INFO] API Key: {api_key[:10]}...{api_key[-4:] if len(api_key) > 14 else '****'}")
 
+# Reutiliza a sessão HTTP persistente do cliente (mesmos headers e pool keep-alive)
+client = OpenRouterClient()
+session = client.session
+
 # Teste 1: Listar modelos disponíveis
 print("\n[TESTE 1] Listando modelos disponíveis...")
 try:
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "HTTP-Referer": "https://github.com/PLC_Ai_Code",
-        "X-Title": "PLC Benchmark"
-    }
-    
-    response = requests.get("https://openrouter.ai/api/v1/models", headers=headers, timeout=30)
+    response = session.get(client.models_url, timeout=30)
     
     if response.status_code == 200:
         models_data = response.json()
@@ -79,23 +78,15 @@ if test_models:
     for model_name in test_models:
         print(f"\n  Testando: {model_name}")
         try:
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://github.com/PLC_Ai_Code",
-                "X-Title": "PLC Benchmark"
-            }
-            
             body = {
                 "model": model_name,
                 "messages": [{"role": "user", "content": "Hello"}],
                 "max_tokens": 10
             }
             
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
+            response = session.post(
+                client.base_url,
                 json=body,
-                headers=headers,
                 timeout=30
             )
             
@@ -132,5 +123,6 @@ if test_models:
 else:
     print("  [AVISO] Nenhum modelo para testar")
 
+client.log_connection_stats()
 print("\n[INFO] Teste concluído!")
 
@@ -0,0 +1,177 @@
+"""
+Spans de tempo por fase (geração, extração, gravação, compilação, runtime,
+Modbus, passos de teste).
+
+Um span é registrado com tracing.span("fase", **atributos) em volta do
+trecho medido, ou com tracing.record(...) para intervalos medidos em outro
+lugar (ex.: compilação em outro processo). Atributos como task e model
+podem ser definidos uma vez por thread com tracing.context(task=..., model=...).
+
+Desligado (padrão), span() é um contexto vazio e nada é guardado. Com
+--trace o benchmark liga o Tracer e, ao final, exporta results/trace.jsonl
+(um span por linha), results/trace.json (formato Chrome trace-event, abre em
+chrome://tracing ou no Perfetto) e a tabela de latências agregada no
+summary.json.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _latency_table(durations):
+    """{fase: lista de durações em s} -> contagem, total e percentis em ms."""
+    table = {}
+    for name, values in sorted(durations.items()):
+        values = sorted(values)
+        table[name] = {
+            "count": len(values),
+            "total_s": round(sum(values), 3),
+            "avg_ms": round(1000 * sum(values) / len(values), 2),
+            "p50_ms": round(1000 * _percentile(values, 0.5), 2),
+            "p95_ms": round(1000 * _percentile(values, 0.95), 2),
+            "max_ms": round(1000 * values[-1], 2),
+        }
+    return table
+
+
+class Tracer:
+    """Coleta os spans de todas as threads em memória."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread_ids = {}
+
+    def current_attrs(self):
+        """Atributos de contexto da thread atual (para repassar a outra thread)."""
+        return dict(getattr(self._local, "attrs", {}))
+
+    def _attrs(self, attrs):
+        merged = dict(getattr(self._local, "attrs", {}))
+        merged.update({k: v for k, v in attrs.items() if v is not None})
+        return merged
+
+    @contextlib.contextmanager
+    def context(self, **attrs):
+        """Atributos herdados pelos spans desta thread enquanto o bloco executa."""
+        previous = getattr(self._local, "attrs", {})
+        self._local.attrs = dict(previous, **attrs)
+        try:
+            yield
+        finally:
+            self._local.attrs = previous
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), **attrs)
+
+    def record(self, name, start, end, **attrs):
+        """Registra um span já medido (start/end em time.perf_counter())."""
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        with self._lock:
+            tid = self._thread_ids.setdefault(thread.ident, len(self._thread_ids) + 1)
+            self.spans.append({
+                "name": name,
+                "start_s": round(start - self._origin, 6),
+                "dur_s": round(end - start, 6),
+                "thread": thread.name,
+                "tid": tid,
+                "attrs": self._attrs(attrs),
+            })
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.spans)
+
+    # -- exportação -----------------------------------------------------------
+
+    def export_jsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for span in self.snapshot():
+                f.write(json.dumps(span, ensure_ascii=False) + "\n")
+
+    def export_chrome(self, path):
+        """Arquivo trace-event do Chrome: um evento completo ('X') por span, em microssegundos."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": span["name"],
+                "cat": span["name"].split(".")[0],
+                "ph": "X",
+                "ts": round(span["start_s"] * 1e6, 1),
+                "dur": round(span["dur_s"] * 1e6, 1),
+                "pid": pid,
+                "tid": span["tid"],
+                "args": span["attrs"],
+            }
+            for span in self.snapshot()
+        ]
+        threads = {span["tid"]: span["thread"] for span in self.snapshot()}
+        events += [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def latency_summary(self):
+        """Tabela de latências por fase, e por fase dentro de cada modelo e de cada tarefa."""
+        phases, by_model, by_task = {}, {}, {}
+        for span in self.snapshot():
+            phases.setdefault(span["name"], []).append(span["dur_s"])
+            model = span["attrs"].get("model")
+            task = span["attrs"].get("task")
+            if model:
+                by_model.setdefault(model, {}).setdefault(span["name"], []).append(span["dur_s"])
+            if task:
+                by_task.setdefault(task, {}).setdefault(span["name"], []).append(span["dur_s"])
+        return {
+            "phases": _latency_table(phases),
+            "models": {model: _latency_table(d) for model, d in sorted(by_model.items())},
+            "tasks": {task: _latency_table(d) for task, d in sorted(by_task.items())},
+        }
+
+
+# Tracer global: desligado até o benchmark chamar enable()
+_tracer = Tracer(enabled=False)
+
+
+def enable():
+    global _tracer
+    _tracer = Tracer(enabled=True)
+    return _tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, **attrs):
+    return _tracer.span(name, **attrs)
+
+
+def record(name, start, end, **attrs):
+    _tracer.record(name, start, end, **attrs)
+
+
+def context(**attrs):
+    return _tracer.context(**attrs)